@@ -0,0 +1,201 @@
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import draw
+from output_writer import GZIP_SUFFIX, JSONL_SUFFIX
+from ticket_store import TICKET_STORE_SUFFIX, file_sha256
+
+# 可能是抽獎輸入資料的副檔名
+INPUT_SUFFIXES = (".json", JSONL_SUFFIX, GZIP_SUFFIX, TICKET_STORE_SUFFIX)
+
+def find_result_files(paths):
+    """展開指定的結果檔與目錄 (遞迴搜尋目錄中的 .json)，依路徑排序"""
+    result_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                result_files.extend(os.path.join(root, name) for name in files if name.endswith(".json"))
+        else:
+            result_files.append(path)
+    return sorted(set(result_files))
+
+def load_transcripts(result_files):
+    """讀取結果檔中的抽獎紀錄，回傳 (可驗證的項目, 無法驗證的項目)
+
+    不含 winners 的 JSON (例如輸入資料本身) 會被略過
+    """
+    entries = []
+    failures = []
+    for result_file in result_files:
+        try:
+            with open(result_file, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            failures.append((result_file, [f"無法讀取結果檔: {str(e)}"]))
+            continue
+
+        if not isinstance(result, dict) or "winners" not in result:
+            continue
+        transcript = result.get("transcript")
+        if not isinstance(transcript, dict):
+            failures.append((result_file, ["結果檔沒有抽獎紀錄 (transcript)，無法重現"]))
+            continue
+
+        winner_ids = [winner.get("id") for winner in result.get("winners", [])]
+        entries.append((result_file, transcript, winner_ids))
+    return entries, failures
+
+def index_inputs(search_dirs):
+    """計算搜尋目錄中所有可能的輸入資料檔的 SHA-256，回傳 {雜湊: 路徑}"""
+    index = {}
+    for search_dir in search_dirs:
+        try:
+            names = sorted(os.listdir(search_dir))
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(search_dir, name)
+            if name.endswith(INPUT_SUFFIXES) and os.path.isfile(path):
+                index.setdefault(file_sha256(path), path)
+    return index
+
+def locate_inputs(entries, search_dirs):
+    """依抽獎紀錄中的檔名與 SHA-256 找出每份輸入資料，回傳 {雜湊: 路徑}
+
+    先在結果檔所在目錄與搜尋目錄 (未指定時為目前目錄) 中找同名檔案，
+    找不到時才計算這些目錄中所有資料檔的雜湊進行比對
+    """
+    search_dirs = list(search_dirs) or ["."]
+    all_dirs = list(dict.fromkeys([os.path.dirname(entry[0]) or "." for entry in entries] + search_dirs))
+    located = {}
+    full_index = None
+    for result_file, transcript, _ in entries:
+        input_sha256 = transcript.get("input_sha256")
+        if not input_sha256 or input_sha256 in located:
+            continue
+
+        input_file = transcript.get("input_file") or ""
+        for search_dir in [os.path.dirname(result_file) or "."] + search_dirs:
+            candidate = os.path.join(search_dir, input_file)
+            if input_file and os.path.isfile(candidate) and file_sha256(candidate) == input_sha256:
+                located[input_sha256] = candidate
+                break
+        else:
+            if full_index is None:
+                full_index = index_inputs(all_dirs)
+            if input_sha256 in full_index:
+                located[input_sha256] = full_index[input_sha256]
+    return located
+
+def replay_group(job):
+    """進程池工作函式：載入一份輸入資料，重現所有使用該資料的抽獎"""
+    input_file, entries, use_cache = job
+    with contextlib.redirect_stdout(io.StringIO()):
+        draw_table, _ = draw.load_processed_data(input_file, use_cache)
+
+    outcomes = []
+    for result_file, transcript, winner_ids in entries:
+        problems = draw.replay_draw(draw_table, transcript)
+        recorded_ids = [record.get("id") for record in transcript.get("draws", [])]
+        if not problems and winner_ids != recorded_ids:
+            problems.append("結果檔中的得主與抽獎紀錄不符")
+        outcomes.append((result_file, problems))
+    return outcomes
+
+def audit(paths, search_dirs=(), workers=0, use_cache=True):
+    """重現指定結果檔或目錄中的所有抽獎，回傳 [(結果檔, 不一致的項目)]
+
+    使用相同輸入資料的抽獎分成一組，每組只載入一次抽獎表，
+    各組分配到不同進程平行驗證
+    """
+    entries, outcomes = load_transcripts(find_result_files(paths))
+    located = locate_inputs(entries, search_dirs)
+
+    groups = {}
+    for entry in entries:
+        input_file = located.get(entry[1].get("input_sha256"))
+        if input_file is None:
+            outcomes.append((entry[0], [f"找不到 SHA-256 相符的輸入資料 '{entry[1].get('input_file')}'"]))
+            continue
+        groups.setdefault(input_file, []).append(entry)
+
+    jobs = [(input_file, group, use_cache) for input_file, group in groups.items()]
+    if not workers or workers < 1:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+
+    if workers == 1:
+        for job in jobs:
+            outcomes.extend(replay_group(job))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for group_outcomes in executor.map(replay_group, jobs):
+                outcomes.extend(group_outcomes)
+
+    outcomes.sort(key=lambda outcome: outcome[0])
+    return outcomes
+
+def print_audit(outcomes):
+    for result_file, problems in outcomes:
+        if problems:
+            print(f"✗ {result_file}")
+            for problem in problems:
+                print(f"    {problem}")
+        else:
+            print(f"✓ {result_file}")
+
+def save_audit_report(outcomes, report_file):
+    """保存驗證報告到 JSON 檔案"""
+    try:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "verified": sum(1 for _, problems in outcomes if not problems),
+            "failed": sum(1 for _, problems in outcomes if problems),
+            "results": [
+                {"result_file": result_file, "verified": not problems, "problems": problems}
+                for result_file, problems in outcomes
+            ]
+        }
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"驗證報告已保存至 {report_file}")
+        return True
+    except Exception as e:
+        print(f"保存驗證報告時發生錯誤: {str(e)}")
+        return False
+
+def add_replay_arguments(parser):
+    parser.add_argument("paths", nargs="+", help="抽獎結果檔或存放結果檔的目錄 (遞迴搜尋)")
+    parser.add_argument("--data-dir", action="append", default=[],
+                        help="輸入資料的搜尋目錄，可重複指定；結果檔所在目錄一定會搜尋 (預設另搜尋目前目錄)")
+    parser.add_argument("--workers", type=int, default=0, help="使用的進程數，0 表示全部 CPU 核心 (預設: 0)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用也不更新編譯後的抽獎表快取")
+    parser.add_argument("--report", default=None, help="將驗證結果保存為 JSON 的路徑")
+
+def run_replay(args):
+    """執行批次驗證，全部通過時回傳 True"""
+    start = time.perf_counter()
+    outcomes = audit(args.paths, args.data_dir, args.workers, use_cache=not args.no_cache)
+    elapsed = time.perf_counter() - start
+
+    print_audit(outcomes)
+    failed = sum(1 for _, problems in outcomes if problems)
+    print(f"共驗證 {len(outcomes)} 份抽獎結果，{len(outcomes) - failed} 份通過，{failed} 份不符，耗時 {elapsed:.2f} 秒")
+
+    if args.report and not save_audit_report(outcomes, args.report):
+        return False
+    return bool(outcomes) and not failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由抽獎紀錄重現歷次抽獎並驗證得主")
+    add_replay_arguments(parser)
+    return 0 if run_replay(parser.parse_args(argv)) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
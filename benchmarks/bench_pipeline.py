@@ -0,0 +1,182 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import draw
+import fairness
+import parse_data
+from generate_guild import SIZE_PRESETS, parse_size, write_exports
+
+# 預設的資料與結果位置
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# 隨原始碼一起提交的參考基準，預設每次量測後都與它比較
+BASELINE_FILE = os.path.join(BENCH_DIR, "reference_baseline.json")
+
+# 比基準慢超過此比例即視為效能退步
+DEFAULT_TOLERANCE = 0.25
+
+# 只有幾毫秒的項目受雜訊影響很大，慢的秒數也要超過此值才視為退步
+MIN_REGRESSION_SECONDS = 0.02
+
+def size_label(count):
+    for label, preset in SIZE_PRESETS.items():
+        if preset == count:
+            return label
+    return str(count)
+
+def ensure_exports(count, seed):
+    """取得指定規模的模擬匯出檔，已存在時直接沿用"""
+    output_dir = os.path.join(DATA_DIR, f"{size_label(count)}-{seed}")
+    member_file = os.path.join(output_dir, "raffle_member.json")
+    roles_file = os.path.join(output_dir, "member_role.json")
+    if not (os.path.exists(member_file) and os.path.exists(roles_file)):
+        print(f"  產生 {count} 名會員的模擬匯出檔...")
+        write_exports(output_dir, count, seed=seed)
+    return member_file, roles_file
+
+def measure(repeat, function, *args, **kwargs):
+    """執行 repeat 次並回傳 (最短秒數, 最後一次的回傳值)，過程中的輸出會被丟棄"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_size(count, seed, simulations, repeat):
+    """量測單一規模下各熱點的耗時"""
+    member_file, roles_file = ensure_exports(count, seed)
+    timings = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        previous_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            timings["parse_member_data"], members = measure(repeat, parse_data.parse_member_data, member_file)
+            timings["parse_roles_data"], roles = measure(repeat, parse_data.parse_roles_data, roles_file)
+            timings["parse_exports"], _ = measure(repeat, parse_data.parse_exports, member_file, roles_file)
+
+            role_mapping = parse_data.create_role_mapping()
+            timings["combine_data"], result = measure(repeat, parse_data.combine_data, members, roles, role_mapping)
+            timings["save_data"], _ = measure(repeat, parse_data.save_data, result, "lottery_data.json")
+            del members, roles, result
+
+            # 冷啟動：不使用快取；暖啟動：由編譯後的抽獎表快取載入
+            timings["load_processed_data"], _ = measure(repeat, draw.load_processed_data, "lottery_data.json", False)
+            measure(1, draw.load_processed_data, "lottery_data.json")
+            timings["load_processed_data_cached"], loaded = measure(repeat, draw.load_processed_data, "lottery_data.json")
+            draw_table, true_duplicates = loaded
+
+            timings["verify_fairness"], _ = measure(repeat, fairness.verify_fairness, draw_table, simulations, seed=seed)
+
+            def full_draw():
+                unique_participants = draw.collect_unique_participants(draw_table)
+                draw.save_lottery_info(draw_table, unique_participants, true_duplicates)
+                winners, transcript = draw.run_draw(draw_table, 1, animate=False)
+                draw.save_lottery_result(winners, draw_table, len(unique_participants), transcript=transcript)
+
+            timings["full_draw"], _ = measure(repeat, full_draw)
+        finally:
+            os.chdir(previous_dir)
+
+    return timings
+
+def compare_with_baseline(results, baseline, tolerance):
+    """與基準比較，回傳效能退步的項目列表"""
+    regressions = []
+    for label, timings in results["sizes"].items():
+        baseline_timings = baseline.get("sizes", {}).get(label, {})
+        for name, seconds in timings.items():
+            reference = baseline_timings.get(name)
+            if not reference:
+                continue
+            if name == "verify_fairness" and baseline.get("simulations") != results["simulations"]:
+                # 模擬次數不同時無法比較
+                continue
+            ratio = seconds / reference
+            marker = ""
+            if ratio > 1 + tolerance and seconds - reference > MIN_REGRESSION_SECONDS:
+                regressions.append((label, name, reference, seconds, ratio))
+                marker = "  ← 退步"
+            print(f"  {label:>6} {name:<28} 基準 {reference:10.4f}s  目前 {seconds:10.4f}s  ({ratio:5.2f}x){marker}")
+    return regressions
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量測解析與抽獎熱點在不同規模下的耗時")
+    parser.add_argument("--sizes", default="1k,100k",
+                        help="以逗號分隔的會員數，可使用 1k、100k、1M、10M (預設: 1k,100k)")
+    parser.add_argument("--simulations", type=int, default=100000, help="公平性驗證的模擬次數 (預設: 100000)")
+    parser.add_argument("--repeat", type=int, default=3, help="每個項目重複次數，取最短時間 (預設: 3)")
+    parser.add_argument("--seed", type=int, default=20250519, help="模擬資料與驗證的亂數種子")
+    parser.add_argument("--baseline", default=BASELINE_FILE,
+                        help=f"比較或保存的基準檔案 (預設: {os.path.relpath(BASELINE_FILE)})")
+    parser.add_argument("--save-baseline", action="store_true", help="將結果保存為基準")
+    parser.add_argument("--no-compare", action="store_true", help="不與基準比較 (預設會比較，有退步時以代碼 1 結束)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"允許比基準慢的比例 (預設: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": fairness.np is not None,
+        "simulations": args.simulations,
+        "repeat": args.repeat,
+        "sizes": {}
+    }
+
+    for size in args.sizes.split(","):
+        count = parse_size(size.strip())
+        label = size_label(count)
+        print(f"量測 {label} ({count} 名會員)...")
+        timings = bench_size(count, args.seed, args.simulations, args.repeat)
+        results["sizes"][label] = timings
+        for name, seconds in timings.items():
+            print(f"  {name:<28} {seconds:10.4f}s")
+
+    result_file = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d_%H%M%S", time.localtime()) + ".json")
+    save_json(result_file, results)
+    print(f"量測結果已保存至 {result_file}")
+
+    if args.save_baseline:
+        save_json(args.baseline, results)
+        print(f"基準已保存至 {args.baseline}")
+    elif not args.no_compare:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"錯誤：找不到基準檔案 '{args.baseline}'，請先使用 --save-baseline")
+            return 1
+
+        print(f"與基準比較 ({baseline.get('timestamp')}，Python {baseline.get('python')}，"
+              f"{baseline.get('platform')}，{'有' if baseline.get('numpy') else '無'} NumPy):")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"發現 {len(regressions)} 個項目比基準慢超過 {args.tolerance:.0%}")
+            return 1
+        print("沒有發現效能退步")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# 預設的結果位置
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# 冷啟動的匯入時間預算 (毫秒，python -X importtime 的累計時間，取多次中最短者)
+IMPORT_BUDGETS_MS = {
+    "draw": 60,
+    "draw_service": 150,
+    "lottery_cli": 60
+}
+
+# 匯入 draw 時不應載入的模組：網路、CSV/壓縮輸出、NumPy 模擬、命令列解析與服務相關的依賴
+LAZY_MODULES = (
+    "numpy", "urllib.request", "csv", "gzip", "concurrent.futures", "argparse",
+    "tracemalloc", "platform", "asyncio", "sqlite3", "fairness", "btc_price"
+)
+
+def import_time_us(module, python=sys.executable):
+    """在新的直譯器中匯入模組，回傳 (該模組的累計匯入微秒數, 各模組的自身微秒數)"""
+    completed = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT_DIR,
+                               capture_output=True, text=True, check=True)
+    total = None
+    self_times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        self_times[name.strip()] = int(self_us)
+        if name.strip() == module:
+            total = int(cumulative_us)
+    if total is None:
+        raise RuntimeError(f"無法從 -X importtime 的輸出找到 {module}")
+    return total, self_times
+
+def loaded_modules(module, python=sys.executable):
+    """匯入模組後 sys.modules 中的模組名稱"""
+    completed = subprocess.run(
+        [python, "-c", f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    return set(json.loads(completed.stdout))
+
+def bench_module(module, repeat):
+    """量測單一模組的冷啟動：匯入時間 (取最短)、整個直譯器的牆上時間與最慢的匯入項目"""
+    best = None
+    slowest = None
+    best_wall = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        total, self_times = import_time_us(module)
+        wall = time.perf_counter() - start
+        if best is None or total < best:
+            best = total
+            slowest = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:10]
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+    return {
+        "import_ms": best / 1000,
+        "process_ms": best_wall * 1000,
+        "slowest_imports": [{"module": name, "self_ms": us / 1000} for name, us in slowest]
+    }
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量測各入口模組的冷啟動匯入時間，並檢查是否超出預算")
+    parser.add_argument("--modules", default=",".join(IMPORT_BUDGETS_MS),
+                        help=f"以逗號分隔的模組 (預設: {','.join(IMPORT_BUDGETS_MS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="每個模組重複次數，取最短時間 (預設: 5)")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="預算的倍率，較慢的機器可放寬 (預設: 1.0)")
+    parser.add_argument("--no-save", action="store_true", help="不保存量測結果")
+    args = parser.parse_args(argv)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "modules": {}
+    }
+
+    failures = []
+    for module in args.modules.split(","):
+        module = module.strip()
+        timing = bench_module(module, args.repeat)
+        results["modules"][module] = timing
+
+        budget = IMPORT_BUDGETS_MS.get(module)
+        marker = ""
+        if budget is not None and timing["import_ms"] > budget * args.budget_scale:
+            failures.append(f"{module} 匯入耗時 {timing['import_ms']:.1f} ms，超出預算 {budget * args.budget_scale:.0f} ms")
+            marker = "  ← 超出預算"
+        budget_text = f"預算 {budget * args.budget_scale:6.0f} ms" if budget is not None else "無預算"
+        print(f"{module:<14} 匯入 {timing['import_ms']:7.1f} ms  {budget_text}  "
+              f"整個進程 {timing['process_ms']:7.1f} ms{marker}")
+        for item in timing["slowest_imports"][:5]:
+            print(f"    {item['module']:<36} {item['self_ms']:6.2f} ms")
+
+    # 無畫面的抽獎路徑只需要 draw，其他依賴應在第一次使用時才載入
+    eager = sorted(name for name in loaded_modules("draw") if name in LAZY_MODULES)
+    results["draw_eager_modules"] = eager
+    if eager:
+        failures.append(f"匯入 draw 時載入了應延後載入的模組: {', '.join(eager)}")
+
+    if not args.no_save:
+        result_file = os.path.join(RESULTS_DIR, "startup_" + time.strftime("%Y%m%d_%H%M%S", time.localtime()) + ".json")
+        save_json(result_file, results)
+        print(f"量測結果已保存至 {result_file}")
+
+    for failure in failures:
+        print(f"錯誤：{failure}")
+    if failures:
+        return 1
+    print("冷啟動時間都在預算內")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
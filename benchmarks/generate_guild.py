@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parse_data import create_role_mapping, TICKET_MAPPING
+
+# 常用規模的簡寫
+SIZE_PRESETS = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "1M": 1_000_000,
+    "10M": 10_000_000
+}
+
+# 預設的最高角色分布，參考實際快照的比例；None 表示沒有任何抽獎角色
+DEFAULT_ROLE_DISTRIBUTION = {
+    None: 1,
+    "呢喃貓": 183,
+    "雙貓流": 14,
+    "三隻小貓": 42,
+    "四貓打麻將": 4,
+    "五貓戰隊": 1,
+    "六親不認貓": 1,
+    "七貓亂彈琴": 1,
+    "八貓大逃殺": 1,
+    "九mint怪貓": 1,
+    "十二金貓": 1
+}
+
+# 與抽獎無關、但實際匯出中常見的其他角色
+OTHER_ROLE_IDS = ["1100000000000000001", "1100000000000000002", "1100000000000000003"]
+
+def parse_size(value):
+    """解析會員數，可使用 1k、100k、1M、10M 等簡寫"""
+    if value in SIZE_PRESETS:
+        return SIZE_PRESETS[value]
+    return int(value.replace("_", ""))
+
+def parse_distribution(value):
+    """解析角色分布設定，格式為 角色名稱=權重,... ，none 代表沒有抽獎角色"""
+    distribution = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        role = None if name.lower() == "none" else name
+        if role is not None and role not in TICKET_MAPPING:
+            raise argparse.ArgumentTypeError(f"未知的角色名稱: {name}")
+        distribution[role] = float(weight)
+    return distribution
+
+def build_role_ladder():
+    """依籤數排序的 (角色名稱, 角色ID) 列表；擁有高階角色的會員也擁有所有較低階的角色"""
+    role_ids = {name: role_id for role_id, name in create_role_mapping().items()}
+    return sorted(((name, role_ids[name]) for name in TICKET_MAPPING), key=lambda item: TICKET_MAPPING[item[0]])
+
+def iter_members(count, distribution, duplicate_rate, missing_role_rate, seed):
+    """產生每位會員的 (使用者物件, 角色ID列表, 是否重複出現, 是否缺少角色資料)"""
+    rng = random.Random(seed)
+    ladder = build_role_ladder()
+    ladder_index = {name: index for index, (name, _) in enumerate(ladder)}
+    choices = list(distribution)
+    weights = [distribution[choice] for choice in choices]
+
+    for index in range(count):
+        user_id = str(900_000_000_000_000_000 + index * 7919)
+        user = {
+            "id": user_id,
+            "username": f"member_{index:08d}",
+            "global_name": f"喵友 {index}" if rng.random() < 0.9 else None,
+            "avatar": f"{rng.getrandbits(128):032x}",
+            "discriminator": "0",
+            "public_flags": 0,
+            "flags": 0,
+            "banner": None,
+            "accent_color": None,
+            "avatar_decoration_data": None
+        }
+
+        max_role = rng.choices(choices, weights)[0]
+        roles = []
+        if max_role is not None:
+            roles = [role_id for _, role_id in ladder[:ladder_index[max_role] + 1]]
+            rng.shuffle(roles)
+        if rng.random() < 0.3:
+            roles.append(rng.choice(OTHER_ROLE_IDS))
+
+        yield user, roles, rng.random() < duplicate_rate, rng.random() < missing_role_rate
+
+def write_exports(output_dir, count, distribution=None, duplicate_rate=0.001,
+                  missing_role_rate=0.005, seed=20250519):
+    """寫出兩個匯出檔，回傳 (會員資料路徑, 角色資料路徑)"""
+    distribution = distribution or DEFAULT_ROLE_DISTRIBUTION
+    os.makedirs(output_dir, exist_ok=True)
+    member_file = os.path.join(output_dir, "raffle_member.json")
+    roles_file = os.path.join(output_dir, "member_role.json")
+
+    with open(member_file, "w", encoding="utf-8") as members_out, \
+            open(roles_file, "w", encoding="utf-8") as roles_out:
+        members_out.write("[")
+        roles_out.write('{"page_results_size": %d, "total_results": %d, "members": [' % (count, count))
+
+        first_member = True
+        first_role = True
+        for user, roles, is_duplicate, missing_roles in iter_members(
+                count, distribution, duplicate_rate, missing_role_rate, seed):
+            user_json = json.dumps(user, ensure_ascii=False)
+            for _ in range(2 if is_duplicate else 1):
+                members_out.write(("\n" if first_member else ",\n") + user_json)
+                first_member = False
+
+            if missing_roles:
+                continue
+
+            entry = {
+                "member": {
+                    "avatar": None,
+                    "banner": None,
+                    "communication_disabled_until": None,
+                    "flags": 0,
+                    "joined_at": "2024-01-01T00:00:00.000000+00:00",
+                    "nick": None,
+                    "pending": False,
+                    "premium_since": None,
+                    "roles": roles,
+                    "user": user,
+                    "mute": False,
+                    "deaf": False
+                },
+                "source_invite_code": None,
+                "join_source_type": 5,
+                "inviter_id": None
+            }
+            roles_out.write(("\n" if first_role else ",\n") + json.dumps(entry, ensure_ascii=False))
+            first_role = False
+
+        members_out.write("\n]\n")
+        roles_out.write("\n]}\n")
+
+    return member_file, roles_file
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="產生模擬的 Discord 伺服器匯出檔")
+    parser.add_argument("--members", type=parse_size, default=SIZE_PRESETS["1k"],
+                        help="會員數，可使用 1k、100k、1M、10M (預設: 1k)")
+    parser.add_argument("--output-dir", default="benchmarks/data/1k", help="輸出資料夾 (預設: benchmarks/data/1k)")
+    parser.add_argument("--roles", type=parse_distribution, default=None,
+                        help="最高角色分布，例如 'none=1,呢喃貓=180,十二金貓=1' (預設參考實際快照)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.001, help="會員資料中重複出現的比例 (預設: 0.001)")
+    parser.add_argument("--missing-role-rate", type=float, default=0.005,
+                        help="沒有出現在角色資料中的會員比例 (預設: 0.005)")
+    parser.add_argument("--seed", type=int, default=20250519, help="亂數種子，相同設定會產生相同資料")
+    args = parser.parse_args(argv)
+
+    member_file, roles_file = write_exports(args.output_dir, args.members, args.roles,
+                                            args.duplicate_rate, args.missing_role_rate, args.seed)
+    print(f"已產生 {args.members} 名會員的匯出檔: {member_file}, {roles_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import http.server
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+# 預設的BTC價格來源
+DEFAULT_PRICE_SOURCES = [
+    "https://api.coindesk.com/v1/bpi/currentprice.json",
+    "https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT",
+    "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
+]
+
+# 以逗號分隔的價格來源網址，可指向本機的替身伺服器以便離線彩排
+PRICE_SOURCES_ENV = "MURMURCAT_PRICE_SOURCES"
+
+# 所有來源共用的等待期限（秒）
+PRICE_DEADLINE = 2.0
+
+# 最後一次成功取得的價格
+PRICE_CACHE_FILE = "btc_price_cache.json"
+
+def configured_price_sources():
+    """取得目前設定的價格來源，環境變數優先於預設來源"""
+    configured = os.environ.get(PRICE_SOURCES_ENV, "")
+    sources = [url.strip() for url in configured.split(",") if url.strip()]
+    return sources or list(DEFAULT_PRICE_SOURCES)
+
+def parse_price(data):
+    """根據不同API的回應格式解析價格"""
+    if "bpi" in data:  # Coindesk API
+        return float(data["bpi"]["USD"]["rate_float"])
+    if "price" in data:  # Binance API 或本機替身
+        return float(data["price"])
+    if "bitcoin" in data:  # CoinGecko API
+        return float(data["bitcoin"]["usd"])
+    raise ValueError("無法辨識的價格格式")
+
+def fetch_price(api_url, timeout=PRICE_DEADLINE):
+    """從單一來源取得BTC價格"""
+    with urllib.request.urlopen(api_url, timeout=timeout) as response:
+        return parse_price(json.loads(response.read().decode()))
+
+def _fetch_into(api_url, timeout, results):
+    try:
+        results.put((api_url, fetch_price(api_url, timeout), None))
+    except Exception as e:
+        results.put((api_url, None, e))
+
+def fetch_first_price(sources=None, deadline=PRICE_DEADLINE):
+    """同時查詢所有來源，在期限內回傳最先取得的有效價格 (價格, 來源)，失敗時回傳 None
+
+    查詢在背景執行緒進行，逾時後不再等待仍在連線中的來源
+    """
+    sources = sources or configured_price_sources()
+    results = queue.Queue()
+    for api_url in sources:
+        threading.Thread(target=_fetch_into, args=(api_url, deadline, results), daemon=True).start()
+
+    end_time = time.monotonic() + deadline
+    pending = len(sources)
+    while pending:
+        remaining = end_time - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            api_url, price, error = results.get(timeout=remaining)
+        except queue.Empty:
+            break
+
+        pending -= 1
+        if error is None:
+            return price, api_url
+        print(f"從 {api_url} 獲取BTC價格失敗: {str(error)}")
+
+    if pending:
+        print(f"等待BTC價格逾時 ({deadline} 秒)")
+    return None
+
+def save_cached_price(price, source, cache_file=PRICE_CACHE_FILE):
+    """保存最後一次成功取得的價格與時間"""
+    temp_file = f"{cache_file}.tmp{os.getpid()}"
+    try:
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({"price": price, "source": source, "timestamp": time.time()}, f)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"無法保存BTC價格快取: {str(e)}")
+
+def load_cached_price(cache_file=PRICE_CACHE_FILE):
+    """讀取快取的價格，回傳 (價格, 時間戳記)，沒有快取時回傳 None"""
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        return float(cached["price"]), float(cached["timestamp"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def price_to_seed(price):
+    """提取價格的微小變動部分作為種子
+
+    取小數點後10位，並乘以10^10以獲得足夠大的整數
+    """
+    return int((price - int(price)) * 10**10)
+
+def get_btc_price(sources=None, deadline=PRICE_DEADLINE, cache_file=PRICE_CACHE_FILE):
+    """獲取當前比特幣價格作為隨機種子
+
+    所有來源同時查詢並共用一個期限；都失敗時改用磁碟上最後一次成功的價格
+    """
+    try:
+        fetched = fetch_first_price(sources, deadline)
+        if fetched:
+            price, api_url = fetched
+            save_cached_price(price, api_url, cache_file)
+            price_seed = price_to_seed(price)
+            print(f"成功獲取BTC當前價格: ${price:.2f}")
+            print(f"價格種子值: {price_seed}")
+            return price_seed
+
+        cached = load_cached_price(cache_file)
+        if cached:
+            price, timestamp = cached
+            age = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+            price_seed = price_to_seed(price)
+            print(f"無法即時獲取BTC價格，使用 {age} 快取的價格: ${price:.2f}")
+            print(f"價格種子值: {price_seed}")
+            return price_seed
+
+        print("無法獲取BTC價格，使用備用隨機源")
+        return None
+
+    except Exception as e:
+        print(f"獲取BTC價格時發生錯誤: {str(e)}")
+        return None
+
+def serve_stub_price(port, price, host="127.0.0.1"):
+    """啟動回應固定價格的本機替身伺服器，供離線彩排與測試使用"""
+    body = json.dumps({"symbol": "BTCUSDT", "price": f"{price:.8f}"}).encode()
+
+    class StubPriceHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), StubPriceHandler)
+    print(f"BTC價格替身伺服器已啟動: http://{host}:{server.server_port}/ (價格 ${price:.2f})")
+    print(f"設定 {PRICE_SOURCES_ENV}=http://{host}:{server.server_port}/ 以使用此來源")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BTC價格本機替身伺服器")
+    parser.add_argument("--port", type=int, default=8765, help="監聽的連接埠 (預設 8765)")
+    parser.add_argument("--price", type=float, default=67890.12345678, help="回應的BTC價格")
+    args = parser.parse_args()
+
+    stub_server = serve_stub_price(args.port, args.price)
+    try:
+        stub_server.serve_forever()
+    except KeyboardInterrupt:
+        stub_server.shutdown()
@@ -3,333 +3,727 @@ import time
 import os
 import sys
 import json
-import csv
 import hashlib
-import uuid
 import secrets
-import datetime
-import urllib.request
+import bisect
+import contextlib
+
+import profiling
+from entropy_pool import shared_pool
+from parse_data import create_role_mapping, default_role_index, ROLE_RULES, TICKET_MAPPING
+from member_record import MemberRecord
+from output_writer import (CsvRowWriter, JsonDocumentWriter, atomic_output, is_jsonl, read_document,
+                           stream_outputs)
+from terminal_renderer import TerminalRenderer, CLEAR_SCREEN, enable_ansi, is_interactive
+from ticket_store import (StoredParticipants, open_ticket_store, write_ticket_store,
+                          is_ticket_store, mapping_fingerprint, file_sha256)
+from verifiable_draw import (DrawStream, STREAM_ALGORITHM, TRANSCRIPT_VERSION,
+                             commit_seed, new_seed, parse_seed)
+
+# 編譯後抽獎表快取檔的副檔名（存放於資料檔旁）
+TABLE_CACHE_SUFFIX = ".drawtable"
+
+# 不放回抽選時連續抽到已中獎會員的次數上限，超過時以其餘會員重建權重表
+DRAW_REBUILD_MISSES = 32
+
+# 權重調整以百分比表示，未調整的會員為 100
+WEIGHT_SCALE = 100
 
 def clear_screen():
-    """清除螢幕"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    """清除螢幕（輸出不是終端機或無法啟用 ANSI 控制碼時不做任何事）"""
+    if not is_interactive() or not enable_ansi():
+        return
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
 
-def get_btc_price():
-    """獲取當前比特幣價格作為隨機種子"""
-    try:
-        # 嘗試從多個API獲取BTC價格，增加可靠性
-        apis = [
-            "https://api.coindesk.com/v1/bpi/currentprice.json",
-            "https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT",
-            "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin&vs_currencies=usd"
-        ]
+@profiling.profiled()
+def build_draw_table(participants):
+    """建立加權抽獎表
 
-        for api_url in apis:
-            try:
-                # 設置超時，避免長時間等待
-                response = urllib.request.urlopen(api_url, timeout=2)
-                data = json.loads(response.read().decode())
-
-                # 根據不同API解析價格
-                if "bpi" in data:  # Coindesk API
-                    price = data["bpi"]["USD"]["rate_float"]
-                elif "price" in data:  # Binance API
-                    price = float(data["price"])
-                elif "bitcoin" in data:  # CoinGecko API
-                    price = float(data["bitcoin"]["usd"])
-                else:
-                    continue
-
-                # 提取價格的微小變動部分，增加隨機性
-                # 取小數點後10位，並乘以10^10以獲得足夠大的整數
-                price_seed = int((price - int(price)) * 10**10)
-
-                print(f"成功獲取BTC當前價格: ${price:.2f}")
-                print(f"價格種子值: {price_seed}")
-                return price_seed
-
-            except Exception as e:
-                print(f"從 {api_url} 獲取BTC價格失敗: {str(e)}")
-                continue
+    每位會員只佔一筆資料，並記錄累積籤數，抽籤時以二分搜尋定位得主，
+    記憶體用量與會員數成正比，而非與總籤數成正比
+    """
+    cumulative = []
+    total_tickets = 0
+    for record in participants:
+        total_tickets += record.tickets
+        cumulative.append(total_tickets)
+
+    return {
+        "participants": participants,
+        "cumulative": cumulative,
+        "total_tickets": total_tickets
+    }
+
+def pick_participant(draw_table, ticket_index):
+    """根據籤號 (0 ~ 總籤數-1) 找出持有該籤的會員，時間複雜度 O(log n)"""
+    index = bisect.bisect_right(draw_table["cumulative"], ticket_index)
+    return draw_table["participants"][index]
+
+def draw_participant(draw_table, enhanced_random=True):
+    """依籤數權重抽出一位會員"""
+    if enhanced_random:
+        # 使用密碼學安全的隨機選擇
+        ticket_index = secrets.randbelow(draw_table["total_tickets"])
+    else:
+        ticket_index = random.randrange(draw_table["total_tickets"])
+    return pick_participant(draw_table, ticket_index)
 
-        print("無法獲取BTC價格，使用備用隨機源")
-        return None
+def participant_columns(participants):
+    """取得名單的 (籤數, 角色遮罩) 逐筆序列與依位置取會員ID的函式
 
-    except Exception as e:
-        print(f"獲取BTC價格時發生錯誤: {str(e)}")
-        return None
+    二進位抽獎表直接走訪欄位，不組出 MemberRecord 也不解碼字串
+    """
+    if isinstance(participants, StoredParticipants):
+        columns = participants.columns
+        return zip(columns["tickets"], columns["role_masks"]), participants.member_id
+    rows = ((record.tickets, record.role_mask) for record in participants)
+    return rows, lambda index: participants[index].id
+
+def build_weight_table(draw_table, accept=None, equal_weight=False, excluded_ids=(), adjustments=None):
+    """建立抽選用的權重表 (名單位置, 累積權重, 總權重)
+
+    accept 為 (籤數, 角色遮罩) 的資格判斷函式；adjustments 為 {會員ID: 百分比}，
+    指定時所有權重乘上 WEIGHT_SCALE，列出的會員改乘上其百分比 (例如冷卻期間降低權重)。
+    沒有任何條件時直接沿用抽獎表的累積籤數 (名單位置為 None)，不複製任何資料
+    """
+    if accept is None and not equal_weight and not excluded_ids and not adjustments:
+        return None, draw_table["cumulative"], draw_table["total_tickets"]
+
+    rows, member_id = participant_columns(draw_table["participants"])
+    positions = []
+    cumulative = []
+    total = 0
+    for index, (tickets, role_mask) in enumerate(rows):
+        if tickets <= 0 or (accept is not None and not accept(tickets, role_mask)):
+            continue
+        if excluded_ids and member_id(index) in excluded_ids:
+            continue
+        weight = 1 if equal_weight else tickets
+        if adjustments:
+            weight *= adjustments.get(member_id(index), WEIGHT_SCALE)
+            if weight <= 0:
+                continue
+        total += weight
+        positions.append(index)
+        cumulative.append(total)
+    return positions, cumulative, total
 
-def enhance_randomness(use_btc=True):
-    """增強隨機性，使用多種方法初始化隨機數生成器"""
-    # 方法1: 使用系統熵源初始化
-    # 這使用操作系統提供的加密強隨機數生成器
-    random_seed = secrets.randbits(256)
-
-    # 方法2: 混合時間因素
-    # 添加當前時間的微秒部分增加不可預測性
-    current_time = datetime.datetime.now()
-    time_seed = int(current_time.timestamp() * 1000000)
-
-    # 方法3: 添加唯一標識符
-    # 使用UUID增加熵源
-    uuid_seed = int(uuid.uuid4().hex, 16) % (2**32)
-
-    # 方法4: 添加BTC價格作為種子（如果啟用）
-    btc_seed = None
-    if use_btc:
-        btc_seed = get_btc_price()
-
-    # 方法5: 哈希混合以上因素
-    # 使用SHA-256哈希以上所有種子值，進一步增加熵
-    if btc_seed:
-        combined_seed = f"{random_seed}-{time_seed}-{uuid_seed}-{btc_seed}-{os.getpid()}"
-        source_desc = "加密級隨機源 + 時間因素 + UUID + BTC價格 + 進程ID"
-    else:
-        combined_seed = f"{random_seed}-{time_seed}-{uuid_seed}-{os.getpid()}"
-        source_desc = "加密級隨機源 + 時間因素 + UUID + 進程ID"
+def sample_winners(draw_table, stream, count, accept=None, equal_weight=False, excluded_ids=(), adjustments=None):
+    """以確定性串流依權重不放回地抽出 count 位不重複的會員，回傳 [(名單位置, 抽出的號碼)]
 
-    hash_seed = int(hashlib.sha256(combined_seed.encode()).hexdigest(), 16) % (2**32)
+    每次由串流取一個號碼並以二分搜尋定位；抽到已中獎或已排除的會員時重抽，
+    結果等同於只從其餘會員中依權重抽選。連續重抽 DRAW_REBUILD_MISSES 次時
+    改以其餘會員重建權重表，避免得主佔去大部分權重時反覆重抽
+    """
+    _, member_id = participant_columns(draw_table["participants"])
+    taken = set(excluded_ids)
+    positions, cumulative, total = build_weight_table(draw_table, accept, equal_weight, taken, adjustments)
+    picks = []
+    misses = 0
+    while len(picks) < count and total > 0:
+        if misses >= DRAW_REBUILD_MISSES:
+            positions, cumulative, total = build_weight_table(draw_table, accept, equal_weight, taken, adjustments)
+            misses = 0
+            continue
+
+        number = stream.randbelow(total)
+        slot = bisect.bisect_right(cumulative, number)
+        index = slot if positions is None else positions[slot]
+        if member_id(index) in taken:
+            misses += 1
+            continue
+
+        misses = 0
+        taken.add(member_id(index))
+        picks.append((index, number))
+    return picks
+
+def play_drawing_animation(draw_table, duration=3, enhanced_random=True):
+    """播放抽獎進行中的滾動名單動畫
+
+    以 ANSI 控制碼就地更新畫面，並依單調時鐘排定每一幀的時間，
+    不會因繪製耗時而累積誤差；輸出不是終端機時直接略過動畫
+    """
+    renderer = TerminalRenderer()
+    if not renderer.enabled:
+        return
 
-    # 設置 random 模組的種子
-    random.seed(hash_seed)
+    # 設定動畫速度
+    speed = 0.1
+    start_time = time.monotonic()
+    end_time = start_time + duration
+    next_frame = start_time
 
-    # 顯示增強隨機性的信息
-    print(f"隨機系統已增強：使用{source_desc}的混合哈希種子")
+    # 動畫效果
+    with renderer:
+        while time.monotonic() < end_time:
+            # 從加權抽獎表中選擇
+            display_name = draw_participant(draw_table, enhanced_random).name
+
+            renderer.render([
+                "", "", "", "",
+                f"{'🎯 抽獎進行中 🎯':^40}",
+                "",
+                f"{'正在選擇...':^40}",
+                "",
+                f"{display_name:^40}",
+                "", "",
+                "*" * 40
+            ])
+
+            # 慢慢減緩速度
+            next_frame += speed
+            if end_time - next_frame < 1:
+                speed += 0.03
+            time.sleep(max(0.0, min(next_frame, end_time) - time.monotonic()))
+
+def animate_drawing(draw_table, winner, duration=3, enhanced_random=True):
+    """動畫效果的抽獎，播放動畫後公布已抽出的得主"""
+    play_drawing_animation(draw_table, duration, enhanced_random)
 
-    return hash_seed
+    print("\n" + "=" * 50)
+    print(f"{'🎉 恭喜！抽獎結果 🎉':^46}")
+    print("=" * 50)
+    print(f"\n\n{'🏆 獲獎者 🏆':^46}")
+    print(f"\n{winner.name:^46}\n")
+    print(f"{'ID: ' + (winner.id or 'N/A'):^46}\n")
+    print("=" * 50)
 
-def animate_drawing(participants, duration=3, enhanced_random=True):
-    """動畫效果的抽獎"""
-    # 如果啟用增強隨機性，先洗牌參與者列表
-    if enhanced_random:
-        # 使用多次洗牌進一步提高隨機性
-        for _ in range(7):  # 洗牌7次
-            random.shuffle(participants)
+    return winner
 
-    # 設定動畫速度
-    speed = 0.1
-    end_time = time.time() + duration
+def animate_multi_drawing(draw_table, winners, duration=3, enhanced_random=True):
+    """動畫效果的多人抽獎，播放動畫後依抽出順序公布得主"""
+    play_drawing_animation(draw_table, duration, enhanced_random)
 
-    print("抽獎開始！")
-    print("-" * 30)
+    print("\n" + "=" * 50)
+    print(f"{'🎉 恭喜！抽獎結果 🎉':^46}")
+    print("=" * 50)
+    print(f"\n{'🏆 獲獎者 🏆':^46}\n")
+    for rank, winner in enumerate(winners, 1):
+        print(f"{rank:>4}. {winner.name:<24} ID: {winner.id or 'N/A'}")
+    print("\n" + "=" * 50)
 
-    # 動畫效果
-    while time.time() < end_time:
-        clear_screen()
-        # 從加權列表中選擇
-        if enhanced_random:
-            # 使用密碼學安全的隨機選擇
-            random_index = secrets.randbelow(len(participants))
-            current_selection = participants[random_index]
-        else:
-            current_selection = random.choice(participants)
+    return winners
 
-        if isinstance(current_selection, tuple):
-            display_name = current_selection[0]  # 顯示名稱
-        else:
-            display_name = current_selection
+def load_prize_plan(plan_file):
+    """載入分級獎項設定檔，格式錯誤時回傳 None
 
-        print(f"\n\n\n\n{'🎯 抽獎進行中 🎯':^40}")
-        print(f"\n{'正在選擇...':^40}")
-        print(f"\n{display_name:^40}")
-        print(f"\n\n{'*' * 40}")
-        time.sleep(speed)
+    設定檔為 JSON，包含依序抽出的 tiers 列表，每個獎項可設定：
+    name (名稱)、winners (得主人數)、min_role (最低角色)、min_tickets /
+    max_tickets (籤數範圍)、roles_any (需擁有其中之一的角色)、
+    weight ("tickets" 依籤數加權，"equal" 每人機率相同)。
+    allow_repeat_winners 為 true 時同一會員可在多個獎項中獎
+    """
+    try:
+        with open(plan_file, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+    except FileNotFoundError:
+        print(f"錯誤：找不到檔案 '{plan_file}'")
+        return None
+    except json.JSONDecodeError:
+        print(f"錯誤：檔案 '{plan_file}' 不是有效的JSON格式")
+        return None
 
-        # 慢慢減緩速度
-        if end_time - time.time() < 1:
-            speed += 0.03
+    problem = validate_prize_plan(plan)
+    if problem:
+        print(f"錯誤：{problem}")
+        return None
+    return plan
 
-    # 最終結果
-    clear_screen()
-    if enhanced_random:
-        # 使用密碼學安全的隨機選擇
-        random_index = secrets.randbelow(len(participants))
-        winner = participants[random_index]
-    else:
-        winner = random.choice(participants)
+def validate_prize_plan(plan):
+    """檢查分級獎項設定並補上預設的獎項名稱，回傳問題說明，沒有問題時回傳 None
 
-    if isinstance(winner, tuple):
-        display_winner = winner[0]  # 顯示名稱
-        winner_info = winner[1]     # 其他資訊
-    else:
-        display_winner = winner
-        winner_info = None
+    load_prize_plan 與抽獎服務收到的內嵌設定都經過這裡，抽獎前就能發現設定錯誤
+    """
+    tiers = plan.get("tiers") if isinstance(plan, dict) else None
+    if not isinstance(tiers, list) or not tiers:
+        return "獎項設定檔格式不正確，應包含非空的 'tiers' 列表"
+
+    for number, tier in enumerate(tiers, 1):
+        if not isinstance(tier, dict) or type(tier.get("winners")) is not int or tier["winners"] < 1:
+            return f"第 {number} 個獎項必須指定大於 0 的 'winners' 得主人數"
+        if "min_role" in tier and (not isinstance(tier["min_role"], str) or tier["min_role"] not in TICKET_MAPPING):
+            return f"第 {number} 個獎項的最低角色 '{tier['min_role']}' 不存在"
+        if "roles_any" in tier:
+            roles_any = tier["roles_any"]
+            if not isinstance(roles_any, list) or not roles_any:
+                return f"第 {number} 個獎項的 roles_any 必須是非空的角色名稱列表"
+            unknown_roles = [role for role in roles_any if not isinstance(role, str) or role not in TICKET_MAPPING]
+            if unknown_roles:
+                return f"第 {number} 個獎項的 roles_any 包含不存在的角色: {', '.join(map(str, unknown_roles))}"
+        for key in ("min_tickets", "max_tickets"):
+            if key in tier and (type(tier[key]) is not int or tier[key] < 0):
+                return f"第 {number} 個獎項的 {key} 必須是不小於 0 的整數"
+        if tier.get("max_tickets") is not None and tier["max_tickets"] < tier.get("min_tickets", 1):
+            return (f"第 {number} 個獎項的 max_tickets ({tier['max_tickets']}) "
+                    f"小於 min_tickets ({tier.get('min_tickets', 1)})")
+        if tier.get("weight", "tickets") not in ("tickets", "equal"):
+            return f"第 {number} 個獎項的 weight 只能是 'tickets' 或 'equal'"
+        tier.setdefault("name", f"獎項 {number}")
+    return None
+
+def tier_filter(tier):
+    """將獎項的資格條件編譯成 (籤數, 角色遮罩) 的判斷函式"""
+    role_index = default_role_index()
+    min_tickets = tier.get("min_tickets", 1)
+    max_tickets = tier.get("max_tickets")
+    # 角色依籤數排列，遮罩不小於最低角色的位元即擁有不低於該等級的角色
+    min_mask = role_index.name_bits[tier["min_role"]] if "min_role" in tier else 0
+    any_mask = role_index.mask_for_names(tier["roles_any"]) if "roles_any" in tier else None
+
+    def accepts(tickets, role_mask):
+        if tickets < min_tickets or (max_tickets is not None and tickets > max_tickets):
+            return False
+        if role_mask < min_mask:
+            return False
+        return any_mask is None or bool(role_mask & any_mask)
+
+    return accepts
+
+def run_prize_plan(draw_table, plan, stream, adjustments=None):
+    """依序抽出設定檔中的每個獎項，回傳各獎項的名稱、得主與抽選紀錄"""
+    participants = draw_table["participants"]
+    excluded_ids = set()
+    results = []
+
+    for tier in plan["tiers"]:
+        picks = sample_winners(draw_table, stream, tier["winners"],
+                               accept=tier_filter(tier),
+                               equal_weight=tier.get("weight", "tickets") == "equal",
+                               excluded_ids=excluded_ids, adjustments=adjustments)
+        winners = [participants[index] for index, _ in picks]
+
+        if len(winners) < tier["winners"]:
+            print(f"注意：{tier['name']} 符合資格的人數不足，只抽出 {len(winners)} 位")
+
+        if not plan.get("allow_repeat_winners", False):
+            excluded_ids.update(record.id for record in winners)
+
+        results.append({"name": tier["name"], "winners": winners, "picks": picks})
+
+    return results
+
+def animate_prize_plan(draw_table, tier_results, duration=3, enhanced_random=True):
+    """動畫效果的分級獎項抽獎，播放動畫後依獎項公布得主"""
+    play_drawing_animation(draw_table, duration, enhanced_random)
 
     print("\n" + "=" * 50)
     print(f"{'🎉 恭喜！抽獎結果 🎉':^46}")
     print("=" * 50)
-    print(f"\n\n{'🏆 獲獎者 🏆':^46}")
-    print(f"\n{display_winner:^46}\n")
-    if winner_info:
-        print(f"{'ID: ' + winner_info.get('id', 'N/A'):^46}\n")
-    print("=" * 50)
+    for tier_result in tier_results:
+        print(f"\n{'🏆 ' + tier_result['name'] + ' 🏆':^46}\n")
+        for rank, winner in enumerate(tier_result["winners"], 1):
+            print(f"{rank:>4}. {winner.name:<24} ID: {winner.id or 'N/A'}")
+    print("\n" + "=" * 50)
 
-    return winner
+    return tier_results
+
+def table_cache_key(data_sha256):
+    """由資料檔內容雜湊與角色規則計算快取鍵"""
+    fingerprint = mapping_fingerprint(create_role_mapping(), TICKET_MAPPING,
+                                      {"combine": ROLE_RULES["combine"], "cap": ROLE_RULES["cap"]})
+    return hashlib.sha256(f"{data_sha256}-{fingerprint}".encode()).hexdigest()
+
+def draw_table_from_store(header, columns):
+    """由記憶體映射的欄位建立抽獎表，不複製會員資料"""
+    if header.get("role_names") != list(default_role_index().names):
+        raise ValueError("抽獎表的角色對應與目前的設定不同，請重新解析")
+    return {
+        "participants": StoredParticipants(header, columns),
+        "cumulative": columns["cumulative"],
+        "total_tickets": header["total_tickets"]
+    }
+
+def load_table_cache(cache_file, cache_key):
+    """載入快取的抽獎表，快取不存在或已失效時回傳 None"""
+    try:
+        header, columns = open_ticket_store(cache_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"抽獎表快取無法使用，將重新解析: {str(e)}")
+        return None
+
+    if header.get("cache_key") != cache_key:
+        return None
 
-def load_processed_data(data_file):
-    """從處理後的JSON檔案載入抽獎資料"""
+    return draw_table_from_store(header, columns), set(header["true_duplicates"]), header
+
+@profiling.profiled("write_table_cache")
+def save_table_cache(data_file, data_sha256, records, eligible_members, role_index=None):
+    """將資料檔所有會員的紀錄寫成編譯後的抽獎表快取，下次載入同樣內容時略過 JSON 解析"""
+    try:
+        write_ticket_store(data_file + TABLE_CACHE_SUFFIX, records, role_index or default_role_index(), {
+            "cache_key": table_cache_key(data_sha256),
+            "source": os.path.basename(data_file),
+            "eligible_members": eligible_members
+        })
+    except Exception as e:
+        print(f"無法寫入抽獎表快取: {str(e)}")
+
+def load_processed_data(data_file, use_cache=True):
+    """從處理後的資料檔載入抽獎資料，回傳加權抽獎表與重複ID集合
+
+    資料檔可以是 JSON / JSON Lines (可為 gzip 壓縮)，或由 parse_data 輸出的二進位抽獎表 (.tickets)；
+    後者以記憶體映射開啟，抽籤時只讀取用到的分頁。
+    JSON 編譯後的抽獎表會以資料檔內容的 SHA-256 與角色/籤數對應表為鍵，
+    快取在資料檔旁；內容未變時直接載入快取，略過 JSON 解析
+    """
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if is_ticket_store(data_file):
+            with profiling.stage("open_ticket_store"):
+                header, columns = open_ticket_store(data_file)
+                draw_table = draw_table_from_store(header, columns)
+            draw_table["source_file"] = data_file
+            print(f"從抽獎表 {data_file} 載入了 {draw_table['total_tickets']} 張籤，共 {header.get('eligible_members', 0)} 名符合資格的會員")
+            return draw_table, set(header["true_duplicates"])
+
+        with profiling.stage("read_data_file"):
+            with open(data_file, 'rb') as f:
+                raw_data = f.read()
+
+            cache_file = data_file + TABLE_CACHE_SUFFIX
+            data_sha256 = hashlib.sha256(raw_data).hexdigest()
+            cache_key = table_cache_key(data_sha256)
+
+        if use_cache:
+            with profiling.stage("load_table_cache"):
+                cached = load_table_cache(cache_file, cache_key)
+            if cached:
+                draw_table, true_duplicates, header = cached
+                draw_table.update(source_file=data_file, source_sha256=data_sha256)
+                print(f"從快取 {cache_file} 載入了 {draw_table['total_tickets']} 張籤，共 {header.get('eligible_members', 0)} 名符合資格的會員")
+                return draw_table, true_duplicates
+
+        with profiling.stage("json_decode"):
+            data = read_document(raw_data)
 
         if not isinstance(data, dict) or "members" not in data:
             print(f"錯誤：資料檔案格式不正確，應包含 'members' 欄位")
-            return [], set()
+            return build_draw_table([]), set()
 
         # 獲取會員列表
         members = data.get("members", [])
 
-        # 建立加權名單
-        weighted_participants = []
+        # 建立抽獎名單（每位會員一筆，籤數作為權重）
+        participants = []
         true_duplicates = set()
 
         # 處理每個會員
-        for member in members:
-            user_id = member.get("id", "")
-            tickets = member.get("tickets", 0)
-            is_duplicate = member.get("is_duplicate", False)
+        with profiling.stage("build_draw_table"):
+            role_index = default_role_index()
+            records = [MemberRecord.from_dict(member, role_index) for member in members]
+            del data["members"], members
 
-            if is_duplicate and user_id:
-                true_duplicates.add(user_id)
+            for record in records:
+                if record.is_duplicate and record.id:
+                    true_duplicates.add(record.id)
 
-            # 跳過沒有籤數的會員
-            if tickets <= 0:
-                continue
+                # 跳過沒有籤數的會員
+                if record.tickets > 0:
+                    participants.append(record)
 
-            # 取得會員顯示名稱
-            display_name = member.get("display_name", "") or member.get("global_name", "") or member.get("username", "")
+            draw_table = build_draw_table(participants)
+            draw_table.update(source_file=data_file, source_sha256=data_sha256)
 
-            # 添加會員到加權抽獎列表
-            for _ in range(tickets):
-                weighted_participants.append((display_name, member))
+        print(f"從 {data_file} 載入了 {draw_table['total_tickets']} 張籤，共 {data.get('eligible_members', 0)} 名符合資格的會員")
 
-        print(f"從 {data_file} 載入了 {len(weighted_participants)} 張籤，共 {data.get('eligible_members', 0)} 名符合資格的會員")
+        # 保存編譯後的抽獎表，供下次啟動直接載入
+        if use_cache:
+            save_table_cache(data_file, data_sha256, records, data.get("eligible_members", 0), role_index)
 
-        return weighted_participants, true_duplicates
+        return draw_table, true_duplicates
 
     except FileNotFoundError:
         print(f"錯誤：找不到檔案 '{data_file}'")
-        return [], set()
+        return build_draw_table([]), set()
     except json.JSONDecodeError:
         print(f"錯誤：檔案 '{data_file}' 不是有效的JSON格式")
-        return [], set()
+        return build_draw_table([]), set()
     except Exception as e:
         print(f"錯誤：{str(e)}")
-        return [], set()
+        return build_draw_table([]), set()
+
+@profiling.profiled()
+def collect_unique_participants(draw_table):
+    """依會員ID取得唯一的參與者，保留第一次出現的資料"""
+    unique_participants = {}
+    for record in draw_table["participants"]:
+        if record.id not in unique_participants:
+            unique_participants[record.id] = record
+    return unique_participants
+
+def participant_info(record, role_index):
+    """抽籤資訊檔中單一會員的資料"""
+    return {
+        "id": record.id,
+        "display_name": record.display_name,
+        "username": record.username,
+        "global_name": record.global_name,
+        "tickets": record.tickets,
+        "max_role": role_index.max_role(record.role_mask),
+        "all_roles": role_index.role_labels(record.role_mask),
+        "is_duplicate": record.is_duplicate  # 使用來源標記
+    }
+
+@profiling.profiled()
+def save_lottery_info(draw_table, unique_participants, true_duplicates,
+                      info_file="lottery_info.json", csv_file="lottery_tickets.csv"):
+    """輸出抽籤資訊與會員籤數到檔案
+
+    只走訪一次參與者，同時串流寫出精簡 JSON (副檔名為 .jsonl 時每行一位) 與 CSV，
+    檔名以 .gz 結尾時以 gzip 壓縮
+    """
+    role_index = default_role_index()
+    try:
+        # 籤數多的排前面，只排序會員紀錄的參照
+        ordered = sorted(unique_participants.values(), key=lambda record: record.tickets, reverse=True)
 
-def verify_fairness(weighted_participants, simulations=10000):
-    """驗證抽獎機率的公平性
+        with contextlib.ExitStack() as stack:
+            info_writer = JsonDocumentWriter(stack.enter_context(atomic_output(info_file)), {
+                "total_participants": len(unique_participants),
+                "total_tickets": draw_table["total_tickets"]
+            }, "participants", jsonl=is_jsonl(info_file))
+            csv_writer = CsvRowWriter(stack.enter_context(atomic_output(csv_file, newline='')),
+                                      ["會員名稱", "DC ID", "籤數"])
+
+            stream_outputs(ordered, [
+                lambda record: info_writer.write(participant_info(record, role_index)),
+                # 使用 global_name 作為會員名稱
+                lambda record: csv_writer.write([record.global_name or record.display_name or "",
+                                                 record.username or "", record.tickets])
+            ])
+
+            # 儲存真正的重複會員資訊
+            duplicates = []
+            for user_id in true_duplicates:
+                if user_id in unique_participants:
+                    duplicate_info = participant_info(unique_participants[user_id], role_index)
+                    del duplicate_info["is_duplicate"]
+                    duplicates.append(duplicate_info)
+            info_writer.close({"duplicates": duplicates})
 
-    通過大量模擬抽獎來檢查每個會員被抽中的機率是否符合其籤數比例
-    """
-    if not weighted_participants:
-        print("沒有參與者，無法驗證公平性")
-        return
+        print(f"抽籤資訊已保存至 {info_file}\n")
+        print(f"會員籤數已保存至 {csv_file}\n")
+    except Exception as e:
+        print(f"保存抽籤資訊時發生錯誤: {str(e)}\n")
 
-    # 初始化隨機性（不使用BTC價格以加快模擬速度）
-    enhance_randomness(use_btc=False)
-
-    # 獲取唯一會員和他們的籤數
-    members = {}
-    for name, info in weighted_participants:
-        if info["id"] not in members:
-            members[info["id"]] = {
-                "name": name,
-                "id": info["id"],
-                "tickets": info["tickets"],
-                "wins": 0
-            }
-
-    # 計算總籤數
-    total_tickets = len(weighted_participants)
-
-    # 模擬多次抽獎，使用增強的隨機性
-    for _ in range(simulations):
-        # 使用密碼學安全的隨機選擇
-        random_index = secrets.randbelow(len(weighted_participants))
-        winner = weighted_participants[random_index]
-        winner_id = winner[1]["id"]
-        members[winner_id]["wins"] += 1
-
-    # 分析結果
-    print(f"\n公平性驗證 (模擬 {simulations} 次抽獎):")
-    print("-" * 80)
-    print(f"{'會員名稱':<20} {'預期機率':<15} {'實際中獎次數':<15} {'實際機率':<15} {'誤差'}")
-    print("-" * 80)
-
-    fairness_results = []
-
-    for member_id, data in members.items():
-        expected_prob = data["tickets"] / total_tickets
-        actual_prob = data["wins"] / simulations
-        error = (actual_prob - expected_prob) / expected_prob * 100 if expected_prob > 0 else 0
-
-        print(f"{data['name']:<20} {expected_prob:.4f} ({data['tickets']}張) {data['wins']:<15} {actual_prob:.4f} {error:+.2f}%")
-
-        fairness_results.append({
-            "id": member_id,
-            "name": data["name"],
-            "tickets": data["tickets"],
-            "expected_probability": expected_prob,
-            "actual_wins": data["wins"],
-            "actual_probability": actual_prob,
-            "error_percentage": error
-        })
+def print_participants(draw_table, unique_participants, true_duplicates):
+    """顯示參與者名單及其籤數"""
+    print(f"共有 {len(unique_participants)} 人參與抽獎：")
+    if true_duplicates:
+        print(f"在來源資料中發現 {len(true_duplicates)} 個重複ID")
 
-    # 計算平均絕對誤差
-    total_error = sum(abs(data["error_percentage"]) for data in fairness_results)
-    avg_error = total_error / len(fairness_results) if fairness_results else 0
+    print("-" * 60)
+    print(f"{'名稱':<20} {'ID':<20} {'籤數':<5} {'最高等級角色'} {'重複'}")
+    print("-" * 60)
 
-    print("-" * 80)
-    print(f"平均絕對誤差: {avg_error:.2f}%")
+    role_index = default_role_index()
+    for user_id, record in unique_participants.items():
+        duplicate_mark = "✓" if record.is_duplicate else ""
+        print(f"{record.display_name:<20} {user_id:<20} {record.tickets:<5} {role_index.max_role(record.role_mask)} {duplicate_mark}")
+
+    print("-" * 60)
+    print(f"總籤數: {draw_table['total_tickets']}")
+
+def create_draw_seed(use_btc=True, enhanced_random=True, pool=None):
+    """從熵池取出本次抽獎的種子，BTC價格只作為額外混入的熵"""
+    pool = pool or shared_pool(use_btc)
+    if enhanced_random:
+        return pool.seed("draw")
+    return new_seed(pool.seed("draw"), random.randbytes)
+
+def source_sha256(draw_table):
+    """抽獎表來源資料檔的 SHA-256；二進位抽獎表在第一次需要時才計算"""
+    if "source_sha256" not in draw_table and draw_table.get("source_file"):
+        draw_table["source_sha256"] = file_sha256(draw_table["source_file"])
+    return draw_table.get("source_sha256", "")
+
+def execute_draw(draw_table, seed, winner_count=1, prize_plan=None, adjustments=None):
+    """以種子決定的串流直接由加權抽獎表抽出得主
+
+    回傳 (得主列表, 抽選紀錄)：得主為 (獎項名稱, 名次, 會員紀錄)，
+    抽選紀錄包含每位得主的名單位置與抽出的號碼，供事後重現與驗證。
+    adjustments 為 {會員ID: 百分比} 的權重調整，見 build_weight_table
+    """
+    stream = DrawStream(seed, source_sha256(draw_table))
+    participants = draw_table["participants"]
+
+    if prize_plan is not None:
+        tier_results = run_prize_plan(draw_table, prize_plan, stream, adjustments)
+        picks = [
+            (tier_result["name"], rank, index, number)
+            for tier_result in tier_results
+            for rank, (index, number) in enumerate(tier_result["picks"], 1)
+        ]
+    else:
+        picks = [
+            (None, rank, index, number)
+            for rank, (index, number) in enumerate(
+                sample_winners(draw_table, stream, winner_count, adjustments=adjustments), 1)
+        ]
+
+    winners = [(tier_name, rank, participants[index]) for tier_name, rank, index, _ in picks]
+    draws = [
+        {"tier": tier_name, "rank": rank, "index": index, "number": number, "id": participants[index].id}
+        for tier_name, rank, index, number in picks
+    ]
+    return winners, draws
+
+def build_transcript(draw_table, seed, draws, winner_count=1, prize_plan=None, adjustments=None):
+    """整理可重現的抽獎紀錄：種子承諾、公開的種子、輸入資料雜湊與每位得主的位置"""
+    return {
+        "version": TRANSCRIPT_VERSION,
+        "algorithm": STREAM_ALGORITHM,
+        "seed_commitment": commit_seed(seed),
+        "seed": seed.hex(),
+        "input_file": os.path.basename(draw_table.get("source_file") or ""),
+        "input_sha256": source_sha256(draw_table),
+        "participants": len(draw_table["participants"]),
+        "total_tickets": draw_table["total_tickets"],
+        "winner_count": winner_count if prize_plan is None else None,
+        "prize_plan": prize_plan,
+        "weight_adjustments": adjustments or None,
+        "draws": draws
+    }
+
+def replay_draw(draw_table, transcript):
+    """以抽獎紀錄中的種子重新抽選並逐項比對，回傳不一致的項目列表 (空列表表示驗證通過)"""
+    if transcript.get("version") != TRANSCRIPT_VERSION or transcript.get("algorithm") != STREAM_ALGORITHM:
+        return [f"不支援的抽獎紀錄格式: 版本 {transcript.get('version')}，演算法 {transcript.get('algorithm')}"]
 
-    # 保存驗證結果到檔案
     try:
-        # 準備JSON格式數據
-        fairness_data = {
-            "simulation_count": simulations,
-            "total_tickets": total_tickets,
-            "total_members": len(members),
-            "average_absolute_error": avg_error,
-            "results": fairness_results
+        seed = parse_seed(transcript.get("seed", ""))
+    except ValueError as e:
+        return [str(e)]
+
+    problems = []
+    if commit_seed(seed) != transcript.get("seed_commitment"):
+        problems.append("種子與抽獎前公布的承諾值不符")
+    if source_sha256(draw_table) != transcript.get("input_sha256"):
+        problems.append("輸入資料檔的 SHA-256 與抽獎紀錄不符")
+    if len(draw_table["participants"]) != transcript.get("participants"):
+        problems.append(f"參與筆數不符: 紀錄 {transcript.get('participants')}，目前 {len(draw_table['participants'])}")
+    if draw_table["total_tickets"] != transcript.get("total_tickets"):
+        problems.append(f"總籤數不符: 紀錄 {transcript.get('total_tickets')}，目前 {draw_table['total_tickets']}")
+    if problems:
+        return problems
+
+    _, draws = execute_draw(draw_table, seed, transcript.get("winner_count") or 1, transcript.get("prize_plan"),
+                            transcript.get("weight_adjustments"))
+    recorded = transcript.get("draws", [])
+    if len(draws) != len(recorded):
+        problems.append(f"得主人數不符: 紀錄 {len(recorded)} 位，重現 {len(draws)} 位")
+    for replayed, original in zip(draws, recorded):
+        if replayed != original:
+            problems.append(f"{original.get('tier') or ''}第 {original.get('rank')} 位不符: "
+                            f"紀錄 {original.get('id')} (位置 {original.get('index')})，"
+                            f"重現 {replayed['id']} (位置 {replayed['index']})")
+    return problems
+
+@profiling.profiled()
+def run_draw(draw_table, winner_count=1, prize_plan=None, duration=3, enhanced_random=True, animate=True, seed=None,
+             adjustments=None):
+    """執行抽獎，回傳 (得主列表, 抽獎紀錄)，得主為 (獎項名稱, 名次, 會員紀錄)
+
+    得主由種子決定的串流直接從加權抽獎表抽出，抽獎前先公布種子承諾值，
+    抽獎紀錄可供任何人重現。seed 為 None 時產生新種子；adjustments 為
+    {會員ID: 百分比} 的權重調整 (例如近期得主的冷卻)，會一併記錄在抽獎紀錄中；
+    animate 為 False 時完全略過動畫，直接抽出得主
+    """
+    if seed is None:
+        seed = create_draw_seed(use_btc=False, enhanced_random=enhanced_random)
+    print(f"本次抽獎的種子承諾 (SHA-256): {commit_seed(seed)}")
+
+    winners, draws = execute_draw(draw_table, seed, winner_count, prize_plan, adjustments)
+    transcript = build_transcript(draw_table, seed, draws, winner_count, prize_plan, adjustments)
+
+    if animate:
+        if prize_plan is not None:
+            tier_results = [
+                {"name": tier["name"], "winners": [winner for tier_name, _, winner in winners if tier_name == tier["name"]]}
+                for tier in prize_plan["tiers"]
+            ]
+            animate_prize_plan(draw_table, tier_results, duration, enhanced_random)
+        elif winner_count > 1:
+            animate_multi_drawing(draw_table, [winner for _, _, winner in winners], duration, enhanced_random)
+        elif winners:
+            animate_drawing(draw_table, winners[0][2], duration, enhanced_random)
+
+    return winners, transcript
+
+def print_winners(winners):
+    """顯示勝利者詳細資訊"""
+    role_index = default_role_index()
+    for tier_name, rank, winner in winners:
+        if tier_name:
+            print(f"\n勝利者資訊 ({tier_name} 第 {rank} 位):")
+        else:
+            print(f"\n勝利者資訊{f' (第 {rank} 位)' if len(winners) > 1 else ''}:")
+        print(f"名稱: {winner.name}")
+        print(f"ID: {winner.id}")
+        print(f"使用者名稱: {winner.username}")
+        if winner.role_mask:
+            print(f"角色: {', '.join(role_index.role_labels(winner.role_mask))}")
+        print(f"籤數: {winner.tickets}")
+
+def winner_records(winners):
+    """將 (獎項名稱, 名次, 會員紀錄) 列表轉為結果檔的得主格式"""
+    role_index = default_role_index()
+    return [
+        {
+            "tier": tier_name,
+            "rank": rank,
+            "name": winner.name,
+            "id": winner.id,
+            "username": winner.username,
+            "global_name": winner.global_name,
+            "tickets": winner.tickets,
+            "max_role": role_index.max_role(winner.role_mask),
+            "all_roles": role_index.role_labels(winner.role_mask),
+            "is_duplicate": winner.is_duplicate
         }
+        for tier_name, rank, winner in winners
+    ]
+
+@profiling.profiled()
+def save_lottery_result(winners, draw_table, total_participants, result_file="lottery_result.json", transcript=None):
+    """保存抽獎結果到檔案，transcript 為可重現抽獎的紀錄"""
+    try:
+        records = winner_records(winners)
+
+        result = {
+            "winner": records[0] if records else None,
+            "winners": records,
+            "total_participants": total_participants,
+            "total_tickets": draw_table["total_tickets"],
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        }
+        if transcript is not None:
+            result["transcript"] = transcript
+
+        with atomic_output(result_file) as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
 
-        # 輸出JSON檔案
-        with open("fairness_verification.json", "w", encoding="utf-8") as f:
-            json.dump(fairness_data, f, ensure_ascii=False, indent=2)
-
-        # 輸出CSV檔案
-        with open("fairness_verification.csv", "w", encoding="utf-8", newline='') as f:
-            csv_writer = csv.writer(f)
-            # 寫入標題
-            csv_writer.writerow(["會員名稱", "ID", "籤數", "預期機率", "實際中獎次數", "實際機率", "誤差百分比"])
-
-            # 寫入每個會員的驗證結果
-            for result in fairness_results:
-                csv_writer.writerow([
-                    result["name"],
-                    result["id"],
-                    result["tickets"],
-                    f"{result['expected_probability']:.6f}",
-                    result["actual_wins"],
-                    f"{result['actual_probability']:.6f}",
-                    f"{result['error_percentage']:.2f}%"
-                ])
-
-            # 寫入摘要資訊
-            csv_writer.writerow([])
-            csv_writer.writerow(["模擬次數", simulations])
-            csv_writer.writerow(["總籤數", total_tickets])
-            csv_writer.writerow(["參與會員數", len(members)])
-            csv_writer.writerow(["平均絕對誤差", f"{avg_error:.2f}%"])
-
-        print("公平性驗證結果已保存至 fairness_verification.json 和 fairness_verification.csv")
+        print(f"\n抽獎結果已保存至 {result_file}")
+        return True
     except Exception as e:
-        print(f"保存驗證結果時發生錯誤: {str(e)}")
+        print(f"\n保存結果時發生錯誤: {str(e)}")
+        return False
 
-    return avg_error < 5  # 如果平均誤差小於5%，認為是公平的
+def parse_args(argv=None):
+    """解析命令列參數"""
+    import argparse
 
-def main():
+    parser = argparse.ArgumentParser(description="喵喵抽獎程式")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="公平性驗證使用的進程數 (0 表示使用全部 CPU 核心，預設 1)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="公平性驗證的根種子，指定後可重現模擬結果")
+    return parser.parse_args(argv)
+
+def main(workers=1, seed=None):
     try:
         # 詢問是否使用BTC價格作為隨機種子
         use_btc = True
@@ -340,8 +734,8 @@ def main():
         # else:
         #     print("將使用BTC價格作為隨機種子，增加不可預測性")
 
-        # 初始化增強隨機性
-        random_seed = enhance_randomness(use_btc)
+        # 產生本次抽獎的種子，抽獎前會公布其承諾值
+        draw_seed = create_draw_seed(use_btc)
 
         # 檔案路徑設定
         processed_data_file = input("請輸入處理後的抽獎資料JSON檔案路徑 (預設為 lottery_data.json): ")
@@ -349,114 +743,22 @@ def main():
             processed_data_file = "lottery_data.json"
 
         # 載入處理後的資料
-        weighted_participants, true_duplicates = load_processed_data(processed_data_file)
+        draw_table, true_duplicates = load_processed_data(processed_data_file)
 
-        if not weighted_participants:
+        if not draw_table["participants"]:
             print("錯誤：沒有找到符合條件的參與者或檔案讀取錯誤！")
             return
 
-        # 使用增強的洗牌方法進一步提高隨機性
-        print("正在進行高強度隨機洗牌...")
-        # 多次洗牌以增強隨機性
-        for i in range(10):
-            # 每次使用不同的種子洗牌
-            shuffle_seed = random_seed + i + int(time.time() * 1000) % 10000
-            random.seed(shuffle_seed)
-            random.shuffle(weighted_participants)
-            time.sleep(0.01)  # 短暫延遲確保時間因素變化
-
-        print(f"完成隨機洗牌，參與抽獎的籤數總共有 {len(weighted_participants)} 張")
-
         # 顯示參與者名單及其籤數
         clear_screen()
 
         # 使用集合來獲取唯一的參與者
-        unique_participants = {}
-        for participant, info in weighted_participants:
-            user_id = info["id"]
-            if user_id not in unique_participants:
-                unique_participants[user_id] = info
+        unique_participants = collect_unique_participants(draw_table)
 
         # 輸出抽籤資訊到檔案
-        try:
-            lottery_info = {
-                "total_participants": len(unique_participants),
-                "total_tickets": len(weighted_participants),
-                "participants": [],
-                "duplicates": []  # 儲存真正的重複會員資訊
-            }
-
-            # 添加所有參與者的資訊
-            for user_id, info in unique_participants.items():
-                participant_info = {
-                    "id": user_id,
-                    "display_name": info["display_name"],
-                    "username": info["username"],
-                    "global_name": info["global_name"],
-                    "tickets": info["tickets"],
-                    "max_role": info.get("max_role", "無特殊角色"),
-                    "all_roles": info["roles"],
-                    "is_duplicate": info.get("is_duplicate", False)  # 使用來源標記
-                }
-                lottery_info["participants"].append(participant_info)
-
-            # 添加重複會員的資訊
-            for user_id in true_duplicates:
-                if user_id in unique_participants:
-                    info = unique_participants[user_id]
-                    duplicate_info = {
-                        "id": user_id,
-                        "display_name": info["display_name"],
-                        "username": info["username"],
-                        "global_name": info["global_name"],
-                        "tickets": info["tickets"],
-                        "max_role": info.get("max_role", "無特殊角色"),
-                        "all_roles": info["roles"]
-                    }
-                    lottery_info["duplicates"].append(duplicate_info)
-
-            # 排序參與者列表，籤數多的排前面
-            lottery_info["participants"].sort(key=lambda x: x["tickets"], reverse=True)
-
-            # 輸出 JSON 檔案
-            with open("lottery_info.json", "w", encoding="utf-8") as f:
-                json.dump(lottery_info, f, ensure_ascii=False, indent=2)
-
-            # 輸出 CSV 檔案
-            with open("lottery_tickets.csv", "w", encoding="utf-8") as f:
-                # 寫入標題
-                f.write("會員名稱,DC ID,籤數\n")
-
-                # 寫入每位會員資料
-                for participant_info in lottery_info["participants"]:
-                    # 使用 global_name 作為會員名稱
-                    global_name = participant_info.get("global_name") or participant_info["display_name"]
-                    # 處理名稱中的逗號，避免CSV格式錯誤
-                    global_name = global_name.replace(",", "，") if global_name else ""
-                    username = participant_info["username"].replace(",", "，") if participant_info["username"] else ""
-
-                    f.write(f"{global_name},{username},{participant_info['tickets']}\n")
-
-            print("抽籤資訊已保存至 lottery_info.json\n")
-            print("會員籤數已保存至 lottery_tickets.csv\n")
-        except Exception as e:
-            print(f"保存抽籤資訊時發生錯誤: {str(e)}\n")
-
-        print(f"共有 {len(unique_participants)} 人參與抽獎：")
-        if true_duplicates:
-            print(f"在來源資料中發現 {len(true_duplicates)} 個重複ID")
-
-        print("-" * 60)
-        print(f"{'名稱':<20} {'ID':<20} {'籤數':<5} {'最高等級角色'} {'重複'}")
-        print("-" * 60)
-
-        for user_id, info in unique_participants.items():
-            is_duplicate = info.get("is_duplicate", False)
-            duplicate_mark = "✓" if is_duplicate else ""
-            print(f"{info['display_name']:<20} {user_id:<20} {info['tickets']:<5} {info.get('max_role', '無特殊角色')} {duplicate_mark}")
-
-        print("-" * 60)
-        print(f"總籤數: {len(weighted_participants)}")
+        save_lottery_info(draw_table, unique_participants, true_duplicates)
+
+        print_participants(draw_table, unique_participants, true_duplicates)
 
         # 驗證抽獎公平性
         choice = input("\n是否要進行抽獎公平性驗證？(y/n): ")
@@ -469,7 +771,9 @@ def main():
             except ValueError:
                 print(f"輸入無效，使用預設模擬次數 {simulations}")
 
-            verify_fairness(weighted_participants, simulations)
+            # 模擬 (與 NumPy) 只在需要時才載入
+            from fairness import verify_fairness
+            verify_fairness(draw_table, simulations, seed=seed, workers=workers)
 
         input("\n按下 Enter 開始抽獎...")
 
@@ -483,6 +787,24 @@ def main():
         #     print("使用加密級隨機性進行抽獎，提高不可預測性")
         print("使用加密級隨機性進行抽獎，提高不可預測性")
 
+        # 詢問是否使用分級獎項設定檔
+        prize_plan = None
+        plan_file = input("請輸入分級獎項設定檔路徑 (留空則進行單一獎項抽獎): ").strip()
+        if plan_file:
+            prize_plan = load_prize_plan(plan_file)
+            if prize_plan is None:
+                return
+
+        # 詢問得主人數（多位得主時一次抽出，不會重複）
+        winner_count = 1
+        if prize_plan is None:
+            try:
+                count_input = input(f"請輸入得主人數 (預設為 {winner_count} 位): ")
+                if count_input.strip():
+                    winner_count = max(1, min(int(count_input), len(draw_table["participants"])))
+            except ValueError:
+                print(f"輸入無效，使用預設得主人數 {winner_count} 位")
+
         # 詢問抽獎動畫持續時間
         duration = 3
         try:
@@ -497,46 +819,14 @@ def main():
             print(f"輸入無效，使用預設時間 {duration} 秒")
 
         # 執行抽獎動畫
-        winner = animate_drawing(weighted_participants, duration, use_enhanced_random)
+        winners, transcript = run_draw(draw_table, winner_count, prize_plan, duration, use_enhanced_random,
+                                       seed=draw_seed)
 
         # 顯示勝利者詳細資訊
-        if isinstance(winner, tuple):
-            winner_name, winner_info = winner
-            print(f"\n勝利者資訊:")
-            print(f"名稱: {winner_name}")
-            print(f"ID: {winner_info['id']}")
-            print(f"使用者名稱: {winner_info['username']}")
-            if winner_info['roles']:
-                print(f"角色: {', '.join(winner_info['roles'])}")
-            print(f"籤數: {winner_info['tickets']}")
-        else:
-            print(f"\n再次恭喜 {winner}！")
+        print_winners(winners)
 
         # 保存抽獎結果到檔案
-        try:
-            if isinstance(winner, tuple):
-                result = {
-                    "winner": {
-                        "name": winner_name,
-                        "id": winner_info['id'],
-                        "username": winner_info['username'],
-                        "global_name": winner_info.get('global_name', ''),
-                        "tickets": winner_info['tickets'],
-                        "max_role": winner_info.get('max_role', '無特殊角色'),
-                        "all_roles": winner_info['roles'],
-                        "is_duplicate": winner_info.get('is_duplicate', False)
-                    },
-                    "total_participants": len(unique_participants),
-                    "total_tickets": len(weighted_participants),
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-                }
-
-                with open("lottery_result.json", "w", encoding="utf-8") as f:
-                    json.dump(result, f, ensure_ascii=False, indent=2)
-
-                print("\n抽獎結果已保存至 lottery_result.json")
-        except Exception as e:
-            print(f"\n保存結果時發生錯誤: {str(e)}")
+        save_lottery_result(winners, draw_table, len(unique_participants), transcript=transcript)
 
     except KeyboardInterrupt:
         print("\n\n抽獎已取消。")
@@ -546,4 +836,5 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(workers=args.workers, seed=args.seed)
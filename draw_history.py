@@ -0,0 +1,171 @@
+import datetime
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from draw import WEIGHT_SCALE, participant_columns
+
+# 預設的抽獎歷史資料庫
+DEFAULT_HISTORY_FILE = "draw_history.sqlite3"
+
+# 資料庫結構版本 (PRAGMA user_version)
+SCHEMA_VERSION = 1
+
+# 時間欄位格式，與 lottery_result.json 的 timestamp 相同，可直接以字串比較先後
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 只能新增的紀錄：抽獎與得主不允許修改或刪除，每份快照的籤數只寫入一次
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    input_sha256 TEXT PRIMARY KEY,
+    input_file TEXT,
+    participants INTEGER NOT NULL,
+    total_tickets INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot_entries (
+    input_sha256 TEXT NOT NULL REFERENCES snapshots(input_sha256),
+    member_id TEXT NOT NULL,
+    tickets INTEGER NOT NULL,
+    PRIMARY KEY (input_sha256, member_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS draws (
+    id INTEGER PRIMARY KEY,
+    drawn_at TEXT NOT NULL,
+    input_sha256 TEXT NOT NULL,
+    seed_commitment TEXT,
+    total_tickets INTEGER NOT NULL,
+    result_file TEXT,
+    transcript TEXT
+);
+CREATE TABLE IF NOT EXISTS winners (
+    draw_id INTEGER NOT NULL REFERENCES draws(id),
+    tier TEXT,
+    rank INTEGER NOT NULL,
+    member_id TEXT NOT NULL,
+    name TEXT,
+    tickets INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshot_entries_member ON snapshot_entries (member_id);
+CREATE INDEX IF NOT EXISTS draws_drawn_at ON draws (drawn_at);
+CREATE INDEX IF NOT EXISTS winners_member ON winners (member_id, draw_id);
+CREATE TRIGGER IF NOT EXISTS draws_no_update BEFORE UPDATE ON draws
+    BEGIN SELECT RAISE(ABORT, '抽獎歷史只能新增，不能修改'); END;
+CREATE TRIGGER IF NOT EXISTS draws_no_delete BEFORE DELETE ON draws
+    BEGIN SELECT RAISE(ABORT, '抽獎歷史只能新增，不能刪除'); END;
+CREATE TRIGGER IF NOT EXISTS winners_no_update BEFORE UPDATE ON winners
+    BEGIN SELECT RAISE(ABORT, '抽獎歷史只能新增，不能修改'); END;
+CREATE TRIGGER IF NOT EXISTS winners_no_delete BEFORE DELETE ON winners
+    BEGIN SELECT RAISE(ABORT, '抽獎歷史只能新增，不能刪除'); END;
+"""
+
+def open_history(history_file: str = DEFAULT_HISTORY_FILE) -> sqlite3.Connection:
+    """開啟 (必要時建立) 抽獎歷史資料庫"""
+    conn = sqlite3.connect(history_file)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        conn.close()
+        raise ValueError(f"抽獎歷史資料庫 '{history_file}' 的版本 ({version}) 比程式支援的新")
+    conn.executescript(_SCHEMA)
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+def _record_snapshot(conn: sqlite3.Connection, draw_table: Dict[str, Any], transcript: Dict[str, Any]) -> None:
+    """寫入快照中每位會員的籤數 (同一ID出現多筆時合併)，同一份快照只寫一次"""
+    input_sha256 = transcript["input_sha256"]
+    if not input_sha256:
+        # 沒有來源資料檔的抽獎表無法識別快照，不記錄籤數
+        return
+    if conn.execute("SELECT 1 FROM snapshots WHERE input_sha256 = ?", (input_sha256,)).fetchone():
+        return
+
+    rows, member_id = participant_columns(draw_table["participants"])
+    member_tickets: Dict[str, int] = {}
+    for index, (tickets, _) in enumerate(rows):
+        key = member_id(index)
+        member_tickets[key] = member_tickets.get(key, 0) + tickets
+
+    conn.execute("INSERT INTO snapshots VALUES (?, ?, ?, ?)",
+                 (input_sha256, transcript.get("input_file"), transcript["participants"], transcript["total_tickets"]))
+    conn.executemany("INSERT INTO snapshot_entries VALUES (?, ?, ?)",
+                     ((input_sha256, key, tickets) for key, tickets in member_tickets.items()))
+
+def record_draw(conn: sqlite3.Connection, draw_table: Dict[str, Any], winners: List[tuple],
+                transcript: Dict[str, Any], result_file: Optional[str] = None,
+                drawn_at: Optional[str] = None) -> int:
+    """新增一次抽獎的紀錄 (快照籤數、得主與完整的抽獎紀錄)，回傳抽獎編號"""
+    drawn_at = drawn_at or datetime.datetime.now().strftime(TIME_FORMAT)
+    with conn:
+        _record_snapshot(conn, draw_table, transcript)
+        cursor = conn.execute(
+            "INSERT INTO draws (drawn_at, input_sha256, seed_commitment, total_tickets, result_file, transcript) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (drawn_at, transcript["input_sha256"], transcript.get("seed_commitment"), transcript["total_tickets"],
+             result_file, json.dumps(transcript, ensure_ascii=False)))
+        draw_id = cursor.lastrowid
+        conn.executemany("INSERT INTO winners VALUES (?, ?, ?, ?, ?, ?)",
+                         ((draw_id, tier_name, rank, winner.id, winner.name, winner.tickets)
+                          for tier_name, rank, winner in winners))
+    return draw_id
+
+def _since_clause(since: Optional[str], until: Optional[str]) -> tuple:
+    clauses = []
+    params = []
+    if since:
+        clauses.append("d.drawn_at >= ?")
+        params.append(since)
+    if until:
+        clauses.append("d.drawn_at < ?")
+        params.append(until)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+def member_wins(conn: sqlite3.Connection, member_id: str, since: Optional[str] = None,
+                until: Optional[str] = None) -> List[sqlite3.Row]:
+    """會員在期間內的中獎紀錄，依時間排列"""
+    clause, params = _since_clause(since, until)
+    return conn.execute(
+        "SELECT d.id AS draw_id, d.drawn_at, w.tier, w.rank, w.name, w.tickets "
+        "FROM winners w JOIN draws d ON d.id = w.draw_id "
+        f"WHERE w.member_id = ?{clause} ORDER BY d.drawn_at, d.id", [member_id] + params).fetchall()
+
+def member_entries(conn: sqlite3.Connection, member_id: str, since: Optional[str] = None,
+                   until: Optional[str] = None) -> sqlite3.Row:
+    """會員在期間內參加的抽獎次數與籤數合計"""
+    clause, params = _since_clause(since, until)
+    return conn.execute(
+        "SELECT COUNT(*) AS draws, COALESCE(SUM(e.tickets), 0) AS tickets "
+        "FROM snapshot_entries e JOIN draws d ON d.input_sha256 = e.input_sha256 "
+        f"WHERE e.member_id = ?{clause}", [member_id] + params).fetchone()
+
+def top_winners(conn: sqlite3.Connection, limit: int = 20, since: Optional[str] = None,
+                until: Optional[str] = None) -> List[sqlite3.Row]:
+    """期間內中獎次數最多的會員"""
+    clause, params = _since_clause(since, until)
+    return conn.execute(
+        "SELECT w.member_id, MAX(w.name) AS name, COUNT(*) AS wins, MAX(d.drawn_at) AS last_won_at "
+        "FROM winners w JOIN draws d ON d.id = w.draw_id "
+        f"WHERE 1 = 1{clause} GROUP BY w.member_id ORDER BY wins DESC, last_won_at DESC LIMIT ?",
+        params + [limit]).fetchall()
+
+def recent_draws(conn: sqlite3.Connection, limit: int = 20) -> List[sqlite3.Row]:
+    """最近的抽獎與得主人數"""
+    return conn.execute(
+        "SELECT d.id, d.drawn_at, d.input_sha256, d.total_tickets, d.result_file, COUNT(w.member_id) AS winners "
+        "FROM draws d LEFT JOIN winners w ON w.draw_id = d.id "
+        "GROUP BY d.id ORDER BY d.drawn_at DESC, d.id DESC LIMIT ?", (limit,)).fetchall()
+
+def cooldown_adjustments(conn: sqlite3.Connection, days: float, percent: int,
+                         now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+    """冷卻規則：最近 days 天內中獎的會員，權重調整為原本的 percent% (0 表示不參加)
+
+    回傳 {會員ID: 百分比}，可直接傳給 draw.run_draw 的 adjustments
+    """
+    if not 0 <= percent <= WEIGHT_SCALE:
+        raise ValueError(f"冷卻百分比必須介於 0 ~ {WEIGHT_SCALE}")
+    since = ((now or datetime.datetime.now()) - datetime.timedelta(days=days)).strftime(TIME_FORMAT)
+    rows = conn.execute(
+        "SELECT DISTINCT w.member_id FROM winners w JOIN draws d ON d.id = w.draw_id WHERE d.drawn_at >= ?",
+        (since,)).fetchall()
+    return {row["member_id"]: percent for row in rows}
@@ -0,0 +1,504 @@
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import hmac
+import importlib
+import json
+import os
+import re
+import secrets
+import sys
+import time
+import urllib.parse
+
+import draw
+import draw_history
+import watch_exports
+from entropy_pool import EntropyPool
+from verifiable_draw import commit_seed, parse_seed
+
+# 預設的監聽位址
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 單一請求的標頭與內容上限
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# 閒置連線的等待秒數
+KEEP_ALIVE_TIMEOUT = 30
+
+# 單次公平性驗證的模擬次數上限，避免一個請求長時間佔住執行緒
+MAX_SIMULATIONS = 1000000
+
+# 未指定 --token 時讀取的環境變數
+TOKEN_ENV = "MURMURCAT_DRAW_TOKEN"
+
+# 抽獎名稱會用於報告檔名，只允許英數字、底線與連字號
+RAFFLE_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+                405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+                415: "Unsupported Media Type", 500: "Internal Server Error"}
+
+class RequestError(Exception):
+    """回傳給用戶端的錯誤，附帶 HTTP 狀態碼"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def check_raffle_name(name):
+    if not RAFFLE_NAME_PATTERN.fullmatch(name):
+        raise RequestError(400, f"抽獎名稱 '{name}' 只能包含英數字、底線與連字號 (最多 64 字元)")
+
+class Raffle:
+    """常駐記憶體中的一場抽獎：編譯好的抽獎表與該場抽獎專用的鎖"""
+
+    __slots__ = ("name", "data_file", "draw_table", "true_duplicates", "unique_participants", "loaded_at", "lock")
+
+    def __init__(self, name, data_file, draw_table, true_duplicates, unique_participants):
+        self.name = name
+        self.data_file = data_file
+        self.draw_table = draw_table
+        self.true_duplicates = true_duplicates
+        self.unique_participants = unique_participants
+        self.loaded_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        self.lock = asyncio.Lock()
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "data_file": self.data_file,
+            "participants": len(self.draw_table["participants"]),
+            "unique_participants": self.unique_participants,
+            "total_tickets": self.draw_table["total_tickets"],
+            "input_sha256": draw.source_sha256(self.draw_table),
+            "loaded_at": self.loaded_at
+        }
+
+class DrawService:
+    """常駐的抽獎服務
+
+    抽獎表載入一次後保留在記憶體中；熵池在啟動時建立 (BTC 價格在背景取得)，
+    每次抽獎與公平性驗證都從熵池取出新的種子並留下紀錄。
+    載入、驗證與抽獎都在執行緒池中進行，不阻塞事件迴圈；
+    同一場抽獎的請求依序處理，不同場抽獎互不等待。
+
+    除了 /health 以外的請求都必須帶 Authorization: Bearer <token>，有內容的請求必須是
+    application/json；請求中的資料檔、獎項設定檔與結果檔路徑都必須位於 data_dir 之內，
+    用戶端指定的種子只在 allow_client_seed 為 True 時接受
+    """
+
+    def __init__(self, token, data_dir=".", use_btc=True, history_file=draw_history.DEFAULT_HISTORY_FILE,
+                 workers=None, entropy_log=None, allow_client_seed=False):
+        self.token = token
+        self.data_dir = os.path.realpath(data_dir)
+        self.allow_client_seed = allow_client_seed
+        self.raffles = {}
+        self.history_file = history_file
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.pool = EntropyPool(use_btc=use_btc, audit_file=entropy_log)
+        self._loading = {}
+
+    async def run_blocking(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: function(*args, **kwargs))
+
+    def raffle(self, name):
+        raffle = self.raffles.get(name)
+        if raffle is None:
+            raise RequestError(404, f"找不到抽獎 '{name}'，請先載入資料")
+        return raffle
+
+    def resolve_path(self, path, field):
+        """把請求中的相對路徑解析到 data_dir 之下，超出 data_dir 時拒絕"""
+        if not isinstance(path, str) or not path:
+            raise RequestError(400, f"'{field}' 必須是 data_dir 之下的相對路徑")
+        resolved = os.path.realpath(os.path.join(self.data_dir, path))
+        if os.path.commonpath([resolved, self.data_dir]) != self.data_dir:
+            raise RequestError(403, f"'{field}' 的路徑 '{path}' 不在 data_dir 之內")
+        return resolved
+
+    def client_seed(self, body):
+        """用戶端指定的種子，未指定時回傳 None"""
+        if body.get("seed") is None:
+            return None
+        if not self.allow_client_seed:
+            raise RequestError(403, "服務未啟用 --allow-client-seed，不接受用戶端指定的種子")
+        return body["seed"]
+
+    async def load(self, name, body):
+        data_file = self.resolve_path(body.get("data"), "data")
+        return await self.load_file(name, data_file, body.get("use_cache", True))
+
+    async def load_file(self, name, data_file, use_cache=True):
+        """載入資料檔並換上新的抽獎表；data_file 不經過 data_dir 檢查，只供啟動參數使用"""
+        check_raffle_name(name)
+
+        # 同一場抽獎同時只進行一次載入，載入期間舊的抽獎表仍可使用
+        lock = self._loading.setdefault(name, asyncio.Lock())
+        async with lock:
+            raffle = await self.run_blocking(self._load, name, data_file, use_cache)
+            await self.install(raffle)
+        return raffle.summary()
+
+    async def install(self, raffle):
+        """放入或替換一場抽獎，替換時等待進行中的抽獎結束"""
+        previous = self.raffles.get(raffle.name)
+        if previous is not None:
+            async with previous.lock:
+                self.raffles[raffle.name] = raffle
+        else:
+            self.raffles[raffle.name] = raffle
+
+    async def watch(self, name, watcher, interval):
+        """持續監看一場抽獎的匯出檔，每次更新後換上新版抽獎表"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.run_blocking(watcher.poll):
+                    continue
+                draw_table, true_duplicates, _ = watcher.current()
+                await self.install(await self.run_blocking(
+                    self._prepare, name, watcher.output_file, draw_table, true_duplicates))
+            except Exception as e:
+                print(f"更新抽獎 '{name}' 時發生錯誤: {str(e)}")
+
+    async def unload(self, name):
+        raffle = self.raffle(name)
+        async with raffle.lock:
+            del self.raffles[name]
+        return {"name": name, "unloaded": True}
+
+    def _load(self, name, data_file, use_cache):
+        """在執行緒池中載入抽獎表，並先算好每次抽獎都會用到的雜湊與不重複人數"""
+        draw_table, true_duplicates = draw.load_processed_data(data_file, use_cache)
+        if not draw_table["participants"]:
+            raise RequestError(400, f"資料檔 '{data_file}' 沒有符合條件的參與者或無法讀取")
+        return self._prepare(name, data_file, draw_table, true_duplicates)
+
+    def _prepare(self, name, data_file, draw_table, true_duplicates):
+        draw.source_sha256(draw_table)
+        unique_participants = len(draw.collect_unique_participants(draw_table))
+        return Raffle(name, data_file, draw_table, true_duplicates, unique_participants)
+
+    def _draw(self, raffle, body):
+        """在執行緒池中執行的抽獎，回傳回應內容"""
+        draw_table = raffle.draw_table
+        prize_plan = body.get("plan")
+        if isinstance(prize_plan, str):
+            prize_plan = draw.load_prize_plan(self.resolve_path(prize_plan, "plan"))
+            if prize_plan is None:
+                raise RequestError(400, "無法載入分級獎項設定檔")
+        elif prize_plan is not None:
+            problem = draw.validate_prize_plan(prize_plan)
+            if problem:
+                raise RequestError(400, f"分級獎項設定不正確，{problem}")
+
+        winner_count = body.get("winners", 1)
+        if type(winner_count) is not int or winner_count < 1:
+            raise RequestError(400, "'winners' 必須是大於 0 的整數")
+        winner_count = min(winner_count, len(draw_table["participants"]))
+
+        cooldown_days = body.get("cooldown_days")
+        cooldown_percent = body.get("cooldown_percent", 50)
+        if cooldown_days is not None:
+            if type(cooldown_days) not in (int, float) or cooldown_days < 0:
+                raise RequestError(400, "'cooldown_days' 必須是不小於 0 的數字")
+            if type(cooldown_percent) is not int or not 0 <= cooldown_percent <= draw.WEIGHT_SCALE:
+                raise RequestError(400, f"'cooldown_percent' 必須是 0 到 {draw.WEIGHT_SCALE} 之間的整數")
+
+        # 結果檔路徑在抽獎前檢查，路徑不合法時不會抽出得主也不會寫入歷史紀錄
+        result_file = self.resolve_path(body["result"], "result") if body.get("result") is not None else None
+
+        client_seed = self.client_seed(body)
+        try:
+            seed = parse_seed(client_seed) if client_seed is not None else self.pool.seed(f"draw:{raffle.name}")
+        except (TypeError, ValueError) as e:
+            raise RequestError(400, str(e))
+
+        adjustments = None
+        if cooldown_days is not None:
+            try:
+                with contextlib.closing(draw_history.open_history(self.history_file)) as conn:
+                    adjustments = draw_history.cooldown_adjustments(conn, cooldown_days, cooldown_percent)
+            except (OverflowError, ValueError) as e:
+                raise RequestError(400, f"無法套用冷卻規則，{str(e)}")
+
+        winners, transcript = draw.run_draw(draw_table, winner_count, prize_plan, animate=False,
+                                            seed=seed, adjustments=adjustments)
+
+        if result_file and not draw.save_lottery_result(winners, draw_table, raffle.unique_participants,
+                                                        result_file, transcript):
+            raise RequestError(500, f"無法保存抽獎結果至 '{result_file}'")
+
+        draw_id = None
+        if body.get("history", True):
+            # sqlite 連線不能跨執行緒共用，每次抽獎在工作執行緒中各自開啟
+            with contextlib.closing(draw_history.open_history(self.history_file)) as conn:
+                draw_id = draw_history.record_draw(conn, draw_table, winners, transcript, result_file)
+
+        return {
+            "raffle": raffle.name,
+            "draw_id": draw_id,
+            "seed_commitment": commit_seed(seed),
+            "winners": draw.winner_records(winners),
+            "transcript": transcript
+        }
+
+    async def draw(self, name, body):
+        raffle = self.raffle(name)
+        async with raffle.lock:
+            return await self.run_blocking(self._draw, raffle, body)
+
+    def verify_options(self, body, fairness):
+        """檢查公平性驗證的參數，回傳 verify_fairness 的關鍵字參數"""
+        simulations = body.get("simulations", 10000)
+        if type(simulations) is not int or not 0 < simulations <= MAX_SIMULATIONS:
+            raise RequestError(400, f"'simulations' 必須是 1 到 {MAX_SIMULATIONS} 之間的整數")
+
+        significance = body.get("significance", 0.01)
+        if type(significance) not in (int, float) or not 0 < significance < 1:
+            raise RequestError(400, "'significance' 必須是介於 0 與 1 之間 (不含) 的數字")
+
+        cpu_count = os.cpu_count() or 1
+        workers = body.get("workers", 1)
+        if type(workers) is not int or not 0 <= workers <= cpu_count:
+            raise RequestError(400, f"'workers' 必須是 0 到 {cpu_count} 之間的整數，0 表示全部 CPU 核心")
+
+        engine = body.get("engine", "auto")
+        if engine not in ("auto", "numpy", "python"):
+            raise RequestError(400, "'engine' 必須是 auto、numpy 或 python")
+        if engine == "numpy" and fairness.np is None:
+            raise RequestError(400, "未安裝 NumPy，無法使用 numpy 模擬引擎")
+
+        seed = self.client_seed(body)
+        if seed is not None and (type(seed) is not int or seed < 0):
+            raise RequestError(400, "'seed' 必須是非負整數")
+
+        return {"simulations": simulations, "seed": seed, "engine": engine, "significance": significance,
+                "workers": workers}
+
+    async def verify(self, name, body):
+        import fairness
+
+        raffle = self.raffle(name)
+        options = self.verify_options(body, fairness)
+        async with raffle.lock:
+            # 每位會員的模擬結果只寫入報告檔，不逐筆顯示在服務的輸出中
+            is_fair = await self.run_blocking(
+                fairness.verify_fairness, raffle.draw_table, pool=self.pool, **options,
+                report_file=os.path.join(self.data_dir, f"fairness_{name}.json"),
+                csv_file=os.path.join(self.data_dir, f"fairness_{name}.csv"), quiet=True)
+        return {"raffle": name, "is_fair": is_fair, "report": f"fairness_{name}.json"}
+
+    async def replay(self, name, body):
+        raffle = self.raffle(name)
+        transcript = body.get("transcript", body)
+        problems = await self.run_blocking(draw.replay_draw, raffle.draw_table, transcript)
+        return {"raffle": name, "verified": not problems, "problems": problems}
+
+    def authorize(self, method, path, headers, raw_body):
+        """檢查存取權杖與內容類型，/health 不需要權杖"""
+        if method == "GET" and path.strip("/") == "health":
+            return
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), self.token.encode()):
+            raise RequestError(401, "缺少或錯誤的存取權杖 (Authorization: Bearer <token>)")
+        # 只接受 application/json，避免瀏覽器以 text/plain 表單送出跨站請求
+        content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        if (method == "POST" or raw_body) and content_type != "application/json":
+            raise RequestError(415, "請求內容類型必須是 application/json")
+
+    async def dispatch(self, method, path, body):
+        """依路徑分派請求，回傳 JSON 回應內容"""
+        parts = [urllib.parse.unquote(part) for part in path.strip("/").split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return {"status": "ok", "raffles": len(self.raffles)}
+        if parts == ["entropy"] and method == "GET":
+            return {"sources": self.pool.sources, "seeds": list(self.pool.records)}
+        if parts == ["raffles"] and method == "GET":
+            return {"raffles": [raffle.summary() for raffle in self.raffles.values()]}
+        if len(parts) == 2 and parts[0] == "raffles":
+            if method == "GET":
+                return self.raffle(parts[1]).summary()
+            if method == "DELETE":
+                return await self.unload(parts[1])
+        if len(parts) == 3 and parts[0] == "raffles":
+            actions = {"load": self.load, "draw": self.draw, "verify": self.verify, "replay": self.replay}
+            if parts[2] in actions:
+                if method != "POST":
+                    raise RequestError(405, f"'{parts[2]}' 只接受 POST")
+                return await actions[parts[2]](parts[1], body)
+        raise RequestError(404, f"找不到 {method} {path}")
+
+    async def handle_connection(self, reader, writer):
+        """處理一條連線上的 HTTP/1.1 請求，支援保持連線"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 413, {"error": "請求標頭過大"}, False)
+                    return
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                try:
+                    method, target, _ = request_line.split(" ", 2)
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_BYTES:
+                        raise RequestError(413, "請求內容過大")
+                    raw_body = await reader.readexactly(length) if length else b""
+                    path = urllib.parse.urlsplit(target).path
+                    self.authorize(method, path, headers, raw_body)
+                    body = json.loads(raw_body) if raw_body else {}
+                    if not isinstance(body, dict):
+                        raise RequestError(400, "請求內容必須是 JSON 物件")
+                    status, response = 200, await self.dispatch(method, path, body)
+                except RequestError as e:
+                    status, response = e.status, {"error": str(e)}
+                except (ValueError, json.JSONDecodeError) as e:
+                    status, response = 400, {"error": f"無效的請求: {str(e)}"}
+                except Exception as e:
+                    status, response = 500, {"error": str(e)}
+
+                await self.respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def respond(self, writer, status, response, keep_alive):
+        payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload)
+        await writer.drain()
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, preload=(), watches=(),
+                watch_interval=watch_exports.DEFAULT_INTERVAL):
+    """啟動服務並持續執行
+
+    preload 為啟動時先載入的 (名稱, 資料檔) 列表；watches 為 (名稱, ExportWatcher) 列表，
+    啟動時先建立第一版抽獎表，之後匯出檔變動時自動更新
+    """
+    # 公平性驗證的模擬模組 (與 NumPy) 在背景先載入，第一次驗證不必等待
+    asyncio.get_running_loop().run_in_executor(service.executor, importlib.import_module, "fairness")
+    for name, data_file in preload:
+        summary = await service.load_file(name, data_file)
+        print(f"已載入抽獎 '{name}': {summary['participants']} 筆資料，共 {summary['total_tickets']} 張籤")
+
+    watch_tasks = []
+    for name, watcher in watches:
+        check_raffle_name(name)
+        if not await service.run_blocking(watcher.start):
+            raise RequestError(400, f"無法建立抽獎 '{name}' 的抽獎表")
+        draw_table, true_duplicates, _ = watcher.current()
+        await service.install(await service.run_blocking(
+            service._prepare, name, watcher.output_file, draw_table, true_duplicates))
+        watch_tasks.append(asyncio.create_task(service.watch(name, watcher, watch_interval)))
+        print(f"監看抽獎 '{name}' 的匯出檔 {watcher.member_file} 與 {watcher.roles_file}")
+
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle_connection, unix_socket, limit=MAX_HEADER_BYTES)
+        print(f"抽獎服務已啟動: unix:{unix_socket}")
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        print(f"抽獎服務已啟動: http://{host}:{port}")
+
+    async with server:
+        await server.serve_forever()
+
+def add_service_arguments(parser):
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"監聽位址 (預設: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"監聽埠號 (預設: {DEFAULT_PORT})")
+    parser.add_argument("--unix-socket", default=None, help="改為監聽 Unix socket 路徑")
+    parser.add_argument("--load", action="append", default=[], metavar="NAME=DATA",
+                        help="啟動時預先載入的抽獎，格式為 名稱=資料檔，可重複指定")
+    parser.add_argument("--watch", action="append", default=[], metavar="NAME=MEMBERS,ROLES,OUTPUT",
+                        help="監看匯出檔的抽獎，變動時增量更新輸出檔與記憶體中的抽獎表，可重複指定")
+    parser.add_argument("--watch-interval", type=float, default=watch_exports.DEFAULT_INTERVAL,
+                        help=f"檢查匯出檔的間隔秒數 (預設: {watch_exports.DEFAULT_INTERVAL})")
+    parser.add_argument("--watch-debounce", type=float, default=watch_exports.DEFAULT_DEBOUNCE,
+                        help=f"匯出檔需維持不變多少秒才更新 (預設: {watch_exports.DEFAULT_DEBOUNCE})")
+    parser.add_argument("--history", default=draw_history.DEFAULT_HISTORY_FILE,
+                        help=f"抽獎歷史資料庫路徑 (預設: {draw_history.DEFAULT_HISTORY_FILE})")
+    parser.add_argument("--no-btc", action="store_true", help="不使用BTC價格作為額外熵源")
+    parser.add_argument("--entropy-log", default=None, help="將每個種子的用途與承諾值逐行附加到此 JSON Lines 檔案")
+    parser.add_argument("--threads", type=int, default=None, help="執行載入、驗證與抽獎的執行緒數")
+    parser.add_argument("--token", default=None,
+                        help=f"存取權杖，請求須帶 Authorization: Bearer <token> "
+                             f"(預設讀取環境變數 {TOKEN_ENV}，都未設定時於啟動時隨機產生並顯示)")
+    parser.add_argument("--data-dir", default=".",
+                        help="請求中的資料檔、獎項設定檔與結果檔都必須位於此目錄之內，公平性報告也寫在這裡 (預設: 目前目錄)")
+    parser.add_argument("--allow-client-seed", action="store_true",
+                        help="接受請求中指定的種子 (預設只使用服務熵池產生的種子)")
+
+def run_service(args):
+    """依命令列參數啟動服務，直到按下 Ctrl+C"""
+    preload = []
+    for item in args.load:
+        name, separator, data_file = item.partition("=")
+        if not separator or not name or not data_file:
+            print(f"錯誤：--load 的格式應為 名稱=資料檔，收到 '{item}'")
+            return False
+
+        preload.append((name, data_file))
+
+    watches = []
+    for item in args.watch:
+        name, separator, files = item.partition("=")
+        files = files.split(",")
+        if not separator or not name or len(files) != 3 or not all(files):
+            print(f"錯誤：--watch 的格式應為 名稱=會員資料檔,角色資料檔,輸出檔，收到 '{item}'")
+            return False
+
+        watches.append((name, watch_exports.ExportWatcher(*files, debounce=args.watch_debounce)))
+
+    if not os.path.isdir(args.data_dir):
+        print(f"錯誤：找不到資料目錄 '{args.data_dir}'")
+        return False
+
+    token = args.token or os.environ.get(TOKEN_ENV)
+    if not token:
+        token = secrets.token_urlsafe(32)
+        print(f"未指定存取權杖，本次啟動使用: {token}")
+
+    service = DrawService(token, args.data_dir, use_btc=not args.no_btc, history_file=args.history,
+                          workers=args.threads, entropy_log=args.entropy_log,
+                          allow_client_seed=args.allow_client_seed)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket, preload, watches, args.watch_interval))
+    except RequestError as e:
+        print(f"錯誤：{str(e)}")
+        return False
+    except KeyboardInterrupt:
+        print("\n抽獎服務已停止")
+    finally:
+        service.executor.shutdown(wait=False)
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常駐的本機抽獎服務，抽獎表載入後保留在記憶體中")
+    add_service_arguments(parser)
+    return 0 if run_service(parser.parse_args(argv)) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import collections
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from verifiable_draw import SEED_BYTES, commit_seed
+
+# 種子紀錄的時間格式
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 記憶體中保留的種子紀錄筆數，完整紀錄請使用 audit_file
+MAX_RECORDS = 10000
+
+class EntropyPool:
+    """收集並混合一次熵源，之後快速產生完整 256 位元的種子
+
+    建立時混入系統加密亂數、時間、UUID 與進程ID；BTC 價格可在背景執行緒取得後再混入，
+    不會拖慢第一次取種子。每個種子為 HMAC-SHA256(池狀態, 計數器 + 用途 + 新的系統亂數)，
+    取出後池狀態立即以雜湊推進，即使之後狀態外洩也推不回先前的種子。
+
+    每次取出種子都會留下紀錄 (用途、承諾值、當時已混入的熵源)，記憶體中保留最近
+    MAX_RECORDS 筆，指定 audit_file 時另外逐行附加到 JSON Lines 檔案
+    """
+
+    def __init__(self, use_btc: bool = False, background: bool = True, audit_file: Optional[str] = None,
+                 fetch_btc: Optional[Callable[[], Any]] = None):
+        self.audit_file = audit_file
+        self.records: Deque[Dict[str, Any]] = collections.deque(maxlen=MAX_RECORDS)
+        self.sources: List[str] = []
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._state = b"\x00" * SEED_BYTES
+        self._btc_thread: Optional[threading.Thread] = None
+        self._fetch_btc = fetch_btc
+        self.btc_attempted = False
+
+        # uuid 會連帶載入 platform，建立熵池時才載入以免拖慢啟動
+        import uuid
+
+        self.mix("secrets", secrets.token_bytes(SEED_BYTES))
+        self.mix("time", str(time.time_ns()).encode())
+        self.mix("uuid", uuid.uuid4().bytes)
+        self.mix("pid", str(os.getpid()).encode())
+
+        if use_btc:
+            if background:
+                self._btc_thread = threading.Thread(target=self.mix_btc, name="entropy-btc", daemon=True)
+                self._btc_thread.start()
+            else:
+                self.mix_btc()
+
+    def mix(self, source: str, data: bytes) -> None:
+        """把一份熵混入池中：新狀態 = SHA-256(舊狀態 + 來源名稱 + 資料)"""
+        with self._lock:
+            self._state = hashlib.sha256(self._state + source.encode() + b"\x00" + data).digest()
+            if source not in self.sources:
+                self.sources.append(source)
+
+    def mix_btc(self) -> None:
+        """取得 BTC 價格並混入池中，取得失敗時不影響池中已有的熵"""
+        self.btc_attempted = True
+        fetch_btc = self._fetch_btc
+        if fetch_btc is None:
+            from btc_price import get_btc_price
+            fetch_btc = get_btc_price
+        btc_price = fetch_btc()
+        if btc_price:
+            self.mix("btc", str(btc_price).encode())
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待背景的 BTC 價格混入完成，回傳是否已完成"""
+        if self._btc_thread is not None:
+            self._btc_thread.join(timeout)
+            return not self._btc_thread.is_alive()
+        return True
+
+    def seed(self, purpose: str = "draw") -> bytes:
+        """取出一個 32 位元組的種子，並記錄用途與承諾值"""
+        with self._lock:
+            self._counter += 1
+            message = self._counter.to_bytes(8, "big") + purpose.encode() + b"\x00" + secrets.token_bytes(SEED_BYTES)
+            seed = hmac.new(self._state, message, hashlib.sha256).digest()
+            self._state = hashlib.sha256(b"ratchet" + self._state).digest()
+            record = {
+                "issued_at": time.strftime(TIME_FORMAT, time.localtime()),
+                "counter": self._counter,
+                "purpose": purpose,
+                "seed_commitment": commit_seed(seed),
+                "sources": list(self.sources)
+            }
+            self.records.append(record)
+            if self.audit_file:
+                with open(self.audit_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return seed
+
+    def seed_int(self, purpose: str = "simulation") -> int:
+        """以整數形式取出種子，可直接交給 random.Random 或 numpy.random.default_rng"""
+        return int.from_bytes(self.seed(purpose), "big")
+
+_shared_pool: Optional[EntropyPool] = None
+_shared_lock = threading.Lock()
+
+def shared_pool(use_btc: bool = False) -> EntropyPool:
+    """進程內共用的熵池，第一次使用時建立
+
+    use_btc 為 True 且還沒嘗試過 BTC 價格時會同步取得並混入，每個進程只嘗試一次
+    """
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = EntropyPool(use_btc=use_btc, background=False)
+            return _shared_pool
+        pool = _shared_pool
+    if use_btc and not pool.btc_attempted:
+        pool.mix_btc()
+    return pool
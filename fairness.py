@@ -0,0 +1,362 @@
+import array
+import bisect
+import concurrent.futures
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import secrets
+
+import profiling
+from entropy_pool import shared_pool
+from output_writer import atomic_output
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 批量模擬時每批產生的籤號數量
+SIMULATION_BATCH_SIZE = 1 << 20
+
+# 卡方檢定每個分組的最小期望次數，低於此值時檢定結果不可靠
+MIN_EXPECTED_COUNT = 5
+
+def chi_square_p_value(statistic, degrees_of_freedom):
+    """計算卡方分布的右尾機率 (p 值)
+
+    即正則化上不完全伽瑪函數 Q(k/2, x/2)，小區間用級數展開、
+    大區間用連分數 (Lentz 演算法)，不需依賴 SciPy
+    """
+    if degrees_of_freedom <= 0 or statistic <= 0:
+        return 1.0
+
+    a = degrees_of_freedom / 2
+    x = statistic / 2
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    max_iterations = 10000 + 20 * int(math.sqrt(a))
+    epsilon = 1e-15
+    tiny = 1e-300
+
+    if x < a + 1:
+        # 級數展開計算下尾 P(a, x)，再取補數
+        term = 1 / a
+        total = term
+        for n in range(1, max_iterations):
+            term *= x / (a + n)
+            total += term
+            if abs(term) < abs(total) * epsilon:
+                break
+        return max(0.0, 1 - total * math.exp(log_prefix))
+
+    # 連分數直接計算上尾 Q(a, x)
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, max_iterations):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        if abs(d) < tiny:
+            d = tiny
+        c = b + an / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < epsilon:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+def simulate_wins(cumulative, simulations, seed=None, engine="auto"):
+    """模擬多次抽獎，回傳抽獎表中每一筆資料的中獎次數
+
+    engine 為 "numpy" 時一次批量產生籤號，以 searchsorted 定位得主並用
+    bincount 計數；為 "python" 時逐次以二分搜尋抽選；
+    "auto" 會在安裝了 NumPy 時自動使用批量模式。
+    seed 為 None 時使用密碼學安全的隨機源，否則可重現相同結果
+    """
+    if engine == "auto":
+        engine = "numpy" if np is not None else "python"
+
+    total_tickets = cumulative[-1] if len(cumulative) else 0
+
+    if engine == "numpy":
+        if np is None:
+            raise RuntimeError("未安裝 NumPy，無法使用批量模擬模式")
+
+        rng = np.random.default_rng(seed)
+        cumulative_array = np.asarray(cumulative, dtype=np.int64)
+        wins = np.zeros(len(cumulative_array), dtype=np.int64)
+
+        # 分批產生籤號，避免一次配置過大的陣列
+        remaining = simulations
+        while remaining > 0:
+            batch = min(remaining, SIMULATION_BATCH_SIZE)
+            tickets = rng.integers(0, total_tickets, size=batch)
+            indices = np.searchsorted(cumulative_array, tickets, side="right")
+            wins += np.bincount(indices, minlength=len(cumulative_array))
+            remaining -= batch
+
+        return wins.tolist()
+
+    rng = random.Random(seed) if seed is not None else secrets.SystemRandom()
+    wins = [0] * len(cumulative)
+    for _ in range(simulations):
+        ticket_index = rng.randrange(total_tickets)
+        wins[bisect.bisect_right(cumulative, ticket_index)] += 1
+    return wins
+
+def spawn_shard_seeds(root_seed, count, engine):
+    """由單一根種子衍生出各進程互相獨立的隨機串流種子"""
+    if engine == "numpy":
+        return np.random.SeedSequence(root_seed).spawn(count)
+
+    # 沒有 NumPy 時以 SHA-256 (根種子, 分片編號) 衍生子種子
+    return [
+        int.from_bytes(hashlib.sha256(f"{root_seed}-{index}".encode()).digest(), "big")
+        for index in range(count)
+    ]
+
+def _simulate_shard(shard):
+    """進程池工作函式：執行單一分片的模擬"""
+    cumulative, simulations, seed, engine = shard
+    return simulate_wins(cumulative, simulations, seed, engine)
+
+@profiling.profiled("fairness_simulation")
+def simulate_wins_parallel(cumulative, simulations, root_seed, engine="auto", workers=1):
+    """將模擬次數分配到多個進程執行，最後合併每一筆資料的中獎次數
+
+    每個分片使用由根種子衍生的獨立串流，相同的 (根種子, 進程數) 可重現相同結果
+    """
+    if engine == "auto":
+        engine = "numpy" if np is not None else "python"
+    if not workers or workers < 1:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, simulations))
+
+    # 平均分配模擬次數，餘數分給前幾個分片
+    base, extra = divmod(simulations, workers)
+    shard_seeds = spawn_shard_seeds(root_seed, workers, engine)
+    shards = [
+        (cumulative, base + (1 if index < extra else 0), shard_seeds[index], engine)
+        for index in range(workers)
+    ]
+
+    if workers == 1:
+        return _simulate_shard(shards[0])
+
+    # 記憶體映射的欄位視圖無法傳給其他進程，先複製成陣列
+    if isinstance(cumulative, memoryview):
+        cumulative = array.array(cumulative.format, cumulative.tobytes())
+        shards = [(cumulative,) + shard[1:] for shard in shards]
+
+    wins = [0] * len(cumulative)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard_wins in executor.map(_simulate_shard, shards):
+            for index, count in enumerate(shard_wins):
+                wins[index] += count
+    return wins
+
+def ticket_class_bins(members, total_tickets, simulations):
+    """依籤數將會員分組，並合併相鄰的分組直到每組的期望中獎次數都不低於 MIN_EXPECTED_COUNT
+
+    會員人數很多時每人的期望次數遠小於 1，逐人檢定會誤判；同籤數的會員中獎機率相同，
+    合併後仍能檢查中獎次數是否與籤數成正比。回傳 [(最少籤數, 最多籤數, 期望次數, 實際次數)]
+    """
+    classes = {}
+    for data in members.values():
+        counts = classes.setdefault(data["tickets"], [0, 0])
+        counts[0] += data["tickets"]
+        counts[1] += data["wins"]
+
+    bins = []
+    current = None
+    for tickets in sorted(classes):
+        class_tickets, class_wins = classes[tickets]
+        if current is None:
+            current = [tickets, tickets, 0.0, 0]
+        current[1] = tickets
+        current[2] += class_tickets / total_tickets * simulations
+        current[3] += class_wins
+        if current[2] >= MIN_EXPECTED_COUNT:
+            bins.append(tuple(current))
+            current = None
+
+    # 剩下不足的部分併入最後一組
+    if current is not None:
+        if bins:
+            low, _, expected, observed = bins.pop()
+            current = [low, current[1], expected + current[2], observed + current[3]]
+        bins.append(tuple(current))
+    return bins
+
+def binned_chi_square(bins):
+    """分組的卡方統計量與自由度；分組不足兩組或期望次數不足時自由度為 0 (無法判定)"""
+    if len(bins) < 2 or any(expected < MIN_EXPECTED_COUNT for _, _, expected, _ in bins):
+        return 0.0, 0
+    chi_square = sum((observed - expected) ** 2 / expected for _, _, expected, observed in bins)
+    return chi_square, len(bins) - 1
+
+@profiling.profiled()
+def verify_fairness(draw_table, simulations=10000, seed=None, engine="auto", significance=0.01, workers=1,
+                    pool=None, report_file="fairness_verification.json", csv_file="fairness_verification.csv",
+                    quiet=False):
+    """驗證抽獎機率的公平性
+
+    通過大量模擬抽獎來檢查每個會員被抽中的機率是否符合其籤數比例，
+    並以卡方適合度檢定判斷：會員依籤數分組 (見 ticket_class_bins)，p 值不低於顯著水準即視為公平。
+    分組後仍不足兩組 (例如所有會員籤數相同或模擬次數太少) 時無法判定，回傳 None。
+    workers 大於 1 (或為 0 表示全部核心) 時以多進程分片模擬，
+    使用的根種子會記錄在結果檔案中以便重現；未指定時由 pool (預設為共用熵池) 產生。
+    結果保存至 report_file 與 csv_file；quiet 為 True 時不顯示每位會員的模擬結果，只顯示摘要
+    """
+    if not draw_table["participants"]:
+        print("沒有參與者，無法驗證公平性")
+        return
+
+    # 未指定根種子時從熵池取出完整 256 位元的種子 (不使用BTC價格以加快模擬速度)
+    if seed is None:
+        seed = (pool or shared_pool()).seed_int("fairness")
+
+    if engine == "auto":
+        engine = "numpy" if np is not None else "python"
+
+    # 計算總籤數
+    total_tickets = draw_table["total_tickets"]
+
+    if not workers or workers < 1:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, simulations))
+
+    # 模擬多次抽獎
+    print(f"使用 {workers} 個進程進行模擬，根種子: {seed}")
+    wins = simulate_wins_parallel(draw_table["cumulative"], simulations, seed, engine, workers)
+
+    # 獲取唯一會員和他們的籤數（同一ID出現多筆時合併計算）
+    members = {}
+    for record, member_wins in zip(draw_table["participants"], wins):
+        if record.id not in members:
+            members[record.id] = {
+                "name": record.name,
+                "id": record.id,
+                "tickets": 0,
+                "wins": 0
+            }
+        members[record.id]["tickets"] += record.tickets
+        members[record.id]["wins"] += member_wins
+
+    # 分析結果
+    print(f"\n公平性驗證 (模擬 {simulations} 次抽獎):")
+    if not quiet:
+        print("-" * 80)
+        print(f"{'會員名稱':<20} {'預期機率':<15} {'實際中獎次數':<15} {'實際機率':<15} {'誤差'}")
+        print("-" * 80)
+
+    fairness_results = []
+
+    for member_id, data in members.items():
+        expected_prob = data["tickets"] / total_tickets
+        actual_prob = data["wins"] / simulations
+        error = (actual_prob - expected_prob) / expected_prob * 100 if expected_prob > 0 else 0
+
+        if not quiet:
+            print(f"{data['name']:<20} {expected_prob:.4f} ({data['tickets']}張) {data['wins']:<15} {actual_prob:.4f} {error:+.2f}%")
+
+        fairness_results.append({
+            "id": member_id,
+            "name": data["name"],
+            "tickets": data["tickets"],
+            "expected_probability": expected_prob,
+            "actual_wins": data["wins"],
+            "actual_probability": actual_prob,
+            "error_percentage": error
+        })
+
+    # 計算平均絕對誤差
+    total_error = sum(abs(data["error_percentage"]) for data in fairness_results)
+    avg_error = total_error / len(fairness_results) if fairness_results else 0
+
+    # 卡方適合度檢定 (依籤數分組)
+    bins = ticket_class_bins(members, total_tickets, simulations)
+    chi_square, degrees_of_freedom = binned_chi_square(bins)
+    if degrees_of_freedom:
+        p_value = chi_square_p_value(chi_square, degrees_of_freedom)
+        is_fair = p_value >= significance
+        verdict = "公平" if is_fair else "偏離預期機率"
+    else:
+        p_value = None
+        is_fair = None
+        verdict = f"無法判定 (依籤數分組後不足兩組期望次數達 {MIN_EXPECTED_COUNT} 的分組，請增加模擬次數)"
+
+    print("-" * 80)
+    print(f"平均絕對誤差: {avg_error:.2f}%")
+    if degrees_of_freedom:
+        print(f"卡方統計量: {chi_square:.4f} ({len(bins)} 個籤數分組，自由度 {degrees_of_freedom})，p 值: {p_value:.6f}")
+    print(f"檢定結果 (顯著水準 {significance}): {verdict}")
+
+    # 保存驗證結果到檔案
+    try:
+        # 準備JSON格式數據
+        fairness_data = {
+            "simulation_count": simulations,
+            "total_tickets": total_tickets,
+            "total_members": len(members),
+            "average_absolute_error": avg_error,
+            "chi_square": chi_square,
+            "degrees_of_freedom": degrees_of_freedom,
+            "bins": [{"min_tickets": low, "max_tickets": high, "expected_wins": expected, "actual_wins": observed}
+                     for low, high, expected, observed in bins],
+            "p_value": p_value,
+            "significance": significance,
+            "is_fair": is_fair,
+            "engine": engine,
+            "workers": workers,
+            "root_seed": seed,
+            "results": fairness_results
+        }
+
+        # 輸出JSON檔案
+        with atomic_output(report_file) as f:
+            json.dump(fairness_data, f, ensure_ascii=False, indent=2)
+
+        # 輸出CSV檔案
+        with atomic_output(csv_file, newline='') as f:
+            csv_writer = csv.writer(f)
+            # 寫入標題
+            csv_writer.writerow(["會員名稱", "ID", "籤數", "預期機率", "實際中獎次數", "實際機率", "誤差百分比"])
+
+            # 寫入每個會員的驗證結果
+            for result in fairness_results:
+                csv_writer.writerow([
+                    result["name"],
+                    result["id"],
+                    result["tickets"],
+                    f"{result['expected_probability']:.6f}",
+                    result["actual_wins"],
+                    f"{result['actual_probability']:.6f}",
+                    f"{result['error_percentage']:.2f}%"
+                ])
+
+            # 寫入摘要資訊
+            csv_writer.writerow([])
+            csv_writer.writerow(["模擬次數", simulations])
+            csv_writer.writerow(["總籤數", total_tickets])
+            csv_writer.writerow(["參與會員數", len(members)])
+            csv_writer.writerow(["平均絕對誤差", f"{avg_error:.2f}%"])
+            csv_writer.writerow(["卡方統計量", f"{chi_square:.4f}"])
+            csv_writer.writerow(["自由度", degrees_of_freedom])
+            csv_writer.writerow(["籤數分組數", len(bins)])
+            csv_writer.writerow(["p 值", f"{p_value:.6f}" if p_value is not None else "無法判定"])
+            csv_writer.writerow(["進程數", workers])
+            csv_writer.writerow(["根種子", seed])
+
+        print(f"公平性驗證結果已保存至 {report_file} 和 {csv_file}")
+    except Exception as e:
+        print(f"保存驗證結果時發生錯誤: {str(e)}")
+
+    return is_fair
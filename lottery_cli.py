@@ -0,0 +1,349 @@
+import argparse
+import contextlib
+import sys
+
+import draw
+import parse_data
+import profiling
+from verifiable_draw import commit_seed, parse_seed
+
+# 結束代碼
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_UNFAIR = 2
+
+class LazyArgumentParser(argparse.ArgumentParser):
+    """子指令的參數在實際解析到該子指令時才加入
+
+    歷史資料庫、服務與監看等子指令的參數定義在各自的模組中，
+    只有被選用的子指令才載入對應模組，其他指令不必負擔 sqlite3 與 asyncio 的匯入時間
+    """
+
+    def __init__(self, *args, add_arguments=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._add_arguments = add_arguments
+
+    def parse_known_args(self, args=None, namespace=None):
+        if self._add_arguments is not None:
+            add_arguments, self._add_arguments = self._add_arguments, None
+            add_arguments(self)
+        return super().parse_known_args(args, namespace)
+
+def add_parse_arguments(parser):
+    group = parser.add_argument_group("資料解析")
+    group.add_argument("--members", default="raffle_member.json", help="會員資料檔案路徑 (預設: raffle_member.json)")
+    group.add_argument("--roles", default="member_role.json", help="角色資料檔案路徑 (預設: member_role.json)")
+    group.add_argument("--output", default="lottery_data.json",
+                       help="輸出檔案路徑，副檔名為 .tickets 時輸出二進位抽獎表 (預設: lottery_data.json)")
+    group.add_argument("--csv", default="lottery_tickets.csv", help="CSV輸出檔案路徑 (預設: lottery_tickets.csv)")
+    group.add_argument("--previous", default=None,
+                       help="上一份 JSON 快照，例如 20250519_1900_lottery_data.json；指定後只計算變動並修補該快照")
+    group.add_argument("--delta", default=None, help="將快照變動保存為 JSON 的路徑 (需搭配 --previous)")
+
+def add_data_argument(parser):
+    parser.add_argument("--data", default="lottery_data.json", help="處理後的抽獎資料檔案路徑 (預設: lottery_data.json)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用也不更新編譯後的抽獎表快取")
+
+def add_verify_arguments(parser, default_simulations):
+    group = parser.add_argument_group("公平性驗證")
+    group.add_argument("--simulations", type=int, default=default_simulations,
+                       help=f"模擬次數，0 表示略過驗證 (預設: {default_simulations})")
+    group.add_argument("--workers", type=int, default=1, help="使用的進程數，0 表示全部 CPU 核心 (預設: 1)")
+    group.add_argument("--seed", type=int, default=None, help="模擬的根種子，指定後可重現結果")
+    group.add_argument("--engine", choices=["auto", "numpy", "python"], default="auto", help="模擬引擎 (預設: auto)")
+    group.add_argument("--significance", type=float, default=0.01, help="卡方檢定的顯著水準 (預設: 0.01)")
+
+def add_draw_arguments(parser):
+    import draw_history
+
+    group = parser.add_argument_group("抽獎")
+    group.add_argument("--winners", type=int, default=1, help="得主人數，多位得主不會重複 (預設: 1)")
+    group.add_argument("--plan", default=None, help="分級獎項設定檔路徑，指定後忽略 --winners")
+    group.add_argument("--duration", type=float, default=3, help="抽獎動畫持續秒數，範圍 1 ~ 10 (預設: 3)")
+    group.add_argument("--no-animate", action="store_true", help="略過抽獎動畫，直接抽出得主")
+    group.add_argument("--no-btc", action="store_true", help="不使用BTC價格作為隨機種子")
+    group.add_argument("--standard-random", action="store_true", help="使用標準隨機性而非加密級隨機性")
+    group.add_argument("--seed-file", default=None,
+                       help="事先以 commit 指令產生的種子檔，抽獎使用該種子 (承諾值應已公布)")
+    group.add_argument("--result", default="lottery_result.json", help="抽獎結果檔案路徑 (預設: lottery_result.json)")
+    group.add_argument("--info", default="lottery_info.json", help="抽籤資訊檔案路徑 (預設: lottery_info.json)")
+    group.add_argument("--tickets-csv", default="lottery_tickets.csv",
+                       help="會員籤數CSV檔案路徑 (預設: lottery_tickets.csv)")
+    group.add_argument("--quiet", action="store_true", help="不顯示參與者名單")
+    group.add_argument("--history", default=draw_history.DEFAULT_HISTORY_FILE,
+                       help=f"抽獎歷史資料庫路徑 (預設: {draw_history.DEFAULT_HISTORY_FILE})")
+    group.add_argument("--no-history", action="store_true", help="不將本次抽獎記錄到歷史資料庫")
+    group.add_argument("--cooldown-days", type=float, default=None,
+                       help="冷卻規則：最近幾天內中獎的會員降低權重 (依歷史資料庫)")
+    group.add_argument("--cooldown-percent", type=int, default=50,
+                       help="冷卻期間的權重百分比，0 表示不參加 (預設: 50)")
+
+def add_draw_command_arguments(parser):
+    add_data_argument(parser)
+    add_draw_arguments(parser)
+
+def add_run_all_arguments(parser):
+    add_parse_arguments(parser)
+    parser.add_argument("--no-cache", action="store_true", help="不使用也不更新編譯後的抽獎表快取")
+    add_verify_arguments(parser, 0)
+    add_draw_arguments(parser)
+
+def add_history_arguments(parser):
+    import draw_history
+
+    parser.add_argument("--history", default=draw_history.DEFAULT_HISTORY_FILE,
+                        help=f"抽獎歷史資料庫路徑 (預設: {draw_history.DEFAULT_HISTORY_FILE})")
+    parser.add_argument("--member", default=None, help="查詢指定會員ID的中獎與參加紀錄")
+    parser.add_argument("--top", type=int, default=None, help="列出中獎次數最多的前幾位會員")
+    parser.add_argument("--draws", type=int, default=None, help="列出最近幾次抽獎")
+    parser.add_argument("--since", default=None, help="起始時間 (含)，例如 2025-05-01")
+    parser.add_argument("--until", default=None, help="結束時間 (不含)，例如 2025-06-01")
+
+def add_replay_command_arguments(parser):
+    import audit_replay
+    audit_replay.add_replay_arguments(parser)
+
+def add_watch_command_arguments(parser):
+    import watch_exports
+    add_parse_arguments(parser)
+    watch_exports.add_watch_arguments(parser)
+
+def add_serve_arguments(parser):
+    import draw_service
+    draw_service.add_service_arguments(parser)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="喵喵抽獎命令列工具，不需互動輸入即可執行完整流程")
+    parser.add_argument("--profile", metavar="REPORT", default=None,
+                        help="量測各階段的時間與記憶體，並輸出 JSON 報告到指定路徑")
+    parser.add_argument("--profile-no-memory", action="store_true",
+                        help="量測時不追蹤記憶體配置，降低量測本身的額外負擔")
+    subparsers = parser.add_subparsers(dest="command", required=True, parser_class=LazyArgumentParser)
+
+    parse_parser = subparsers.add_parser("parse", help="解析 Discord 匯出檔並計算籤數")
+    add_parse_arguments(parse_parser)
+
+    verify_parser = subparsers.add_parser("verify", help="模擬抽獎以驗證機率公平性")
+    add_data_argument(verify_parser)
+    add_verify_arguments(verify_parser, 10000)
+
+    commit_parser = subparsers.add_parser("commit", help="事先產生抽獎種子並顯示要公布的承諾值")
+    commit_parser.add_argument("--output", default="draw_seed.txt", help="種子檔路徑 (預設: draw_seed.txt)")
+    commit_parser.add_argument("--no-btc", action="store_true", help="不使用BTC價格作為隨機種子")
+
+    # 需要額外模組的子指令在選用時才加入參數 (見 LazyArgumentParser)
+    subparsers.add_parser("draw", help="執行抽獎", add_arguments=add_draw_command_arguments)
+    subparsers.add_parser("run-all", help="依序執行解析、驗證與抽獎", add_arguments=add_run_all_arguments)
+    subparsers.add_parser("history", help="查詢抽獎歷史與會員中獎紀錄", add_arguments=add_history_arguments)
+    subparsers.add_parser("replay", help="由抽獎紀錄重現歷次抽獎並驗證得主",
+                          add_arguments=add_replay_command_arguments)
+    subparsers.add_parser("watch", help="監看匯出檔，內容變動時增量更新抽獎資料與抽獎表",
+                          add_arguments=add_watch_command_arguments)
+    subparsers.add_parser("serve", help="啟動常駐的本機抽獎服務，抽獎表保留在記憶體中",
+                          add_arguments=add_serve_arguments)
+
+    return parser
+
+def load_table(args, data_file):
+    draw_table, true_duplicates = draw.load_processed_data(data_file, use_cache=not args.no_cache)
+    if not draw_table["participants"]:
+        print("錯誤：沒有找到符合條件的參與者或檔案讀取錯誤！")
+        return None, None
+    return draw_table, true_duplicates
+
+def command_parse(args):
+    result = parse_data.run_parse(args.members, args.roles, args.output, args.csv,
+                                  args.previous, args.delta)
+    if result is None:
+        return EXIT_ERROR
+    parse_data.print_statistics(result)
+    return EXIT_OK
+
+def run_verify(args, draw_table):
+    if args.simulations <= 0:
+        return EXIT_OK
+
+    # 模擬 (與 NumPy) 只在需要時才載入，不拖慢其他指令的啟動
+    import fairness
+    is_fair = fairness.verify_fairness(draw_table, args.simulations, seed=args.seed, engine=args.engine,
+                                       significance=args.significance, workers=args.workers)
+    if is_fair is None:
+        # 模擬次數不足以判定時只提出警告，不視為不公平
+        print("警告：模擬次數不足以進行卡方檢定，未判定公平性")
+        return EXIT_OK
+    return EXIT_OK if is_fair else EXIT_UNFAIR
+
+def command_verify(args):
+    draw_table, _ = load_table(args, args.data)
+    if draw_table is None:
+        return EXIT_ERROR
+    return run_verify(args, draw_table)
+
+def load_seed_file(seed_file):
+    try:
+        with open(seed_file, 'r', encoding='utf-8') as f:
+            return parse_seed(f.read())
+    except FileNotFoundError:
+        print(f"錯誤：找不到種子檔 '{seed_file}'")
+    except ValueError as e:
+        print(f"錯誤：種子檔 '{seed_file}' 格式不正確，{str(e)}")
+    return None
+
+def command_commit(args):
+    seed = draw.create_draw_seed(use_btc=not args.no_btc)
+    try:
+        with open(args.output, 'x', encoding='utf-8') as f:
+            f.write(seed.hex() + "\n")
+    except FileExistsError:
+        print(f"錯誤：種子檔 '{args.output}' 已存在，不會覆寫")
+        return EXIT_ERROR
+    print(f"種子已保存至 {args.output}，抽獎前請勿公開")
+    print(f"請先公布種子承諾 (SHA-256): {commit_seed(seed)}")
+    return EXIT_OK
+
+def run_draw(args, draw_table, true_duplicates):
+    import sqlite3
+    import draw_history
+
+    prize_plan = None
+    if args.plan:
+        prize_plan = draw.load_prize_plan(args.plan)
+        if prize_plan is None:
+            return EXIT_ERROR
+
+    if args.seed_file:
+        seed = load_seed_file(args.seed_file)
+        if seed is None:
+            return EXIT_ERROR
+    else:
+        seed = draw.create_draw_seed(use_btc=not args.no_btc, enhanced_random=not args.standard_random)
+
+    unique_participants = draw.collect_unique_participants(draw_table)
+    draw.save_lottery_info(draw_table, unique_participants, true_duplicates, args.info, args.tickets_csv)
+    if not args.quiet:
+        draw.print_participants(draw_table, unique_participants, true_duplicates)
+
+    adjustments = None
+    if args.cooldown_days is not None:
+        try:
+            with contextlib.closing(draw_history.open_history(args.history)) as conn:
+                adjustments = draw_history.cooldown_adjustments(conn, args.cooldown_days, args.cooldown_percent)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"錯誤：無法套用冷卻規則，{str(e)}")
+            return EXIT_ERROR
+        print(f"冷卻規則：最近 {args.cooldown_days:g} 天內中獎的 {len(adjustments)} 位會員權重調整為 {args.cooldown_percent}%")
+
+    winner_count = max(1, min(args.winners, len(draw_table["participants"])))
+    duration = max(1, min(args.duration, 10))
+    winners, transcript = draw.run_draw(draw_table, winner_count, prize_plan, duration,
+                                        enhanced_random=not args.standard_random, animate=not args.no_animate,
+                                        seed=seed, adjustments=adjustments)
+
+    draw.print_winners(winners)
+    if not draw.save_lottery_result(winners, draw_table, len(unique_participants), args.result, transcript):
+        return EXIT_ERROR
+
+    if not args.no_history:
+        try:
+            with contextlib.closing(draw_history.open_history(args.history)) as conn:
+                draw_id = draw_history.record_draw(conn, draw_table, winners, transcript, args.result)
+            print(f"抽獎已記錄至歷史資料庫 {args.history} (編號 {draw_id})")
+        except (sqlite3.Error, ValueError) as e:
+            print(f"記錄抽獎歷史時發生錯誤: {str(e)}")
+            return EXIT_ERROR
+    return EXIT_OK
+
+def command_draw(args):
+    draw_table, true_duplicates = load_table(args, args.data)
+    if draw_table is None:
+        return EXIT_ERROR
+    return run_draw(args, draw_table, true_duplicates)
+
+def command_run_all(args):
+    if command_parse(args) != EXIT_OK:
+        return EXIT_ERROR
+
+    draw_table, true_duplicates = load_table(args, args.output)
+    if draw_table is None:
+        return EXIT_ERROR
+
+    status = run_verify(args, draw_table)
+    if status != EXIT_OK:
+        print("公平性驗證未通過，停止抽獎")
+        return status
+
+    return run_draw(args, draw_table, true_duplicates)
+
+def command_history(args):
+    import sqlite3
+    import draw_history
+
+    try:
+        conn = draw_history.open_history(args.history)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"錯誤：無法開啟抽獎歷史資料庫，{str(e)}")
+        return EXIT_ERROR
+
+    with contextlib.closing(conn):
+        if args.member:
+            wins = draw_history.member_wins(conn, args.member, args.since, args.until)
+            entries = draw_history.member_entries(conn, args.member, args.since, args.until)
+            print(f"會員 {args.member} 參加 {entries['draws']} 次抽獎 (籤數合計 {entries['tickets']})，中獎 {len(wins)} 次")
+            for row in wins:
+                tier = f"{row['tier']} " if row["tier"] else ""
+                print(f"  {row['drawn_at']}  抽獎 #{row['draw_id']}  {tier}第 {row['rank']} 位  {row['name']} ({row['tickets']} 張籤)")
+
+        if args.top:
+            print(f"中獎次數前 {args.top} 名:")
+            for row in draw_history.top_winners(conn, args.top, args.since, args.until):
+                print(f"  {row['wins']:>4} 次  {row['name'] or '':<24} ID: {row['member_id']}  最近一次 {row['last_won_at']}")
+
+        if args.draws or not (args.member or args.top):
+            print("最近的抽獎:")
+            for row in draw_history.recent_draws(conn, args.draws or 20):
+                print(f"  #{row['id']:<5} {row['drawn_at']}  {row['winners']} 位得主  總籤數 {row['total_tickets']}  "
+                      f"資料 {row['input_sha256'][:12]}  {row['result_file'] or ''}")
+    return EXIT_OK
+
+def command_replay(args):
+    import audit_replay
+    return EXIT_OK if audit_replay.run_replay(args) else EXIT_ERROR
+
+def command_watch(args):
+    import watch_exports
+    return EXIT_OK if watch_exports.run_watch(args) else EXIT_ERROR
+
+def command_serve(args):
+    import draw_service
+    return EXIT_OK if draw_service.run_service(args) else EXIT_ERROR
+
+COMMANDS = {
+    "parse": command_parse,
+    "commit": command_commit,
+    "verify": command_verify,
+    "draw": command_draw,
+    "run-all": command_run_all,
+    "history": command_history,
+    "replay": command_replay,
+    "watch": command_watch,
+    "serve": command_serve
+}
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable(trace_memory=not args.profile_no_memory)
+
+    try:
+        with profiling.stage(args.command):
+            return COMMANDS[args.command](args)
+    except KeyboardInterrupt:
+        print("\n\n已取消。")
+        return EXIT_ERROR
+    finally:
+        if args.profile:
+            profiling.write_report(args.profile)
+            profiling.disable()
+
+if __name__ == "__main__":
+    sys.exit(main())
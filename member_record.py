@@ -0,0 +1,167 @@
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+# NumPy 的載入時間約佔冷啟動的一半，第一次向量化查表時才載入 (見 _numpy)
+_NOT_LOADED = object()
+np = _NOT_LOADED
+
+def _numpy():
+    """回傳 NumPy 模組，未安裝時回傳 None"""
+    global np
+    if np is _NOT_LOADED:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        np = numpy
+    return np
+
+# 沒有任何抽獎角色時顯示的最高角色
+NO_ROLE = "無特殊角色"
+
+# 多個角色的籤數合併方式：max 取最高角色，sum 累加所有角色
+COMBINE_RULES = ("max", "sum")
+
+# 角色數不超過此值時，預先建立所有遮罩的籤數查找表 (2^16 筆)
+TABLE_MAX_ROLES = 16
+
+class RoleIndex:
+    """抽獎角色與位元遮罩的對應
+
+    角色依籤數由少到多排列，第 i 個角色對應第 i 個位元，
+    因此遮罩中最高的位元就是會員的最高等級角色。
+    籤數規則 (combine、cap) 在建立時編譯成以遮罩為索引的查找表
+    """
+
+    __slots__ = ("names", "tickets", "labels", "id_bits", "name_bits", "label_bits",
+                 "combine", "cap", "table", "_table_array")
+
+    def __init__(self, role_mapping: Dict[str, str], ticket_mapping: Dict[str, int],
+                 combine: str = "max", cap: Optional[int] = None):
+        names = sorted(dict.fromkeys(role_mapping.values()), key=lambda name: ticket_mapping.get(name, 0))
+        self.names: Tuple[str, ...] = tuple(names)
+        self.tickets: Tuple[int, ...] = tuple(ticket_mapping.get(name, 0) for name in names)
+        self.labels: Tuple[str, ...] = tuple(f"{name} ({tickets})" for name, tickets in zip(self.names, self.tickets))
+        self.name_bits: Dict[str, int] = {name: 1 << bit for bit, name in enumerate(names)}
+        self.id_bits: Dict[str, int] = {role_id: self.name_bits[name] for role_id, name in role_mapping.items()}
+        self.label_bits: Dict[str, int] = {label: 1 << bit for bit, label in enumerate(self.labels)}
+        if combine not in COMBINE_RULES:
+            raise ValueError(f"不支援的籤數合併方式: {combine}")
+        self.combine = combine
+        self.cap = cap
+        self.table: Optional[List[int]] = self._build_table() if len(names) <= TABLE_MAX_ROLES else None
+        self._table_array = None
+
+    def _build_table(self) -> List[int]:
+        """依序由「去掉最低位元的遮罩」推得每個遮罩的籤數，時間複雜度 O(2^n)"""
+        table = [0] * (1 << len(self.names))
+        use_sum = self.combine == "sum"
+        for mask in range(1, len(table)):
+            rest = mask & (mask - 1)
+            tickets = self.tickets[(mask ^ rest).bit_length() - 1]
+            table[mask] = table[rest] + tickets if use_sum else max(table[rest], tickets)
+        if self.cap is not None:
+            table = [min(tickets, self.cap) for tickets in table]
+        return table
+
+    def _combine_tickets(self, mask: int) -> int:
+        values = [tickets for bit, tickets in enumerate(self.tickets) if mask >> bit & 1]
+        total = (sum(values) if self.combine == "sum" else max(values)) if values else 0
+        return min(total, self.cap) if self.cap is not None else total
+
+    def mask(self, role_ids: Iterable[str]) -> int:
+        """由角色ID列表計算遮罩，未列入對應表的角色會被忽略"""
+        id_bits = self.id_bits
+        mask = 0
+        for role_id in role_ids:
+            mask |= id_bits.get(role_id, 0)
+        return mask
+
+    def mask_for_names(self, role_names: Iterable[str]) -> int:
+        mask = 0
+        for role_name in role_names:
+            mask |= self.name_bits.get(role_name, 0)
+        return mask
+
+    def mask_for_labels(self, role_labels: Iterable[str]) -> int:
+        """由「名稱 (籤數)」格式的顯示文字計算遮罩，用於讀取既有的 JSON 資料
+
+        籤數與目前設定不同的舊資料改以名稱比對
+        """
+        label_bits = self.label_bits
+        mask = 0
+        for label in role_labels:
+            bit = label_bits.get(label)
+            mask |= bit if bit is not None else self.name_bits.get(label.rsplit(" (", 1)[0], 0)
+        return mask
+
+    def tickets_for(self, mask: int) -> int:
+        if self.table is not None:
+            return self.table[mask]
+        return self._combine_tickets(mask)
+
+    def tickets_for_masks(self, masks: Sequence[int]) -> List[int]:
+        """一次查出多個遮罩的籤數；有 NumPy 時以陣列索引向量化查表"""
+        if self.table is None:
+            return [self._combine_tickets(mask) for mask in masks]
+        if _numpy() is None:
+            return list(map(self.table.__getitem__, masks))
+        if self._table_array is None:
+            self._table_array = np.asarray(self.table, dtype=np.int64)
+        return self._table_array[np.asarray(masks, dtype=np.intp)].tolist()
+
+    def max_role(self, mask: int) -> str:
+        if not mask or not self.tickets[mask.bit_length() - 1]:
+            return NO_ROLE
+        return self.names[mask.bit_length() - 1]
+
+    def role_labels(self, mask: int) -> List[str]:
+        """輸出用的角色顯示文字，依籤數由少到多排列"""
+        return [label for bit, label in enumerate(self.labels) if mask >> bit & 1]
+
+class MemberRecord:
+    """單一會員的精簡資料，角色以位元遮罩保存，顯示文字只在輸出時產生"""
+
+    __slots__ = ("id", "username", "global_name", "display_name", "tickets", "role_mask", "is_duplicate")
+
+    def __init__(self, member_id: str, username: Optional[str], global_name: Optional[str],
+                 display_name: Optional[str], tickets: int, role_mask: int, is_duplicate: bool = False):
+        self.id = member_id
+        self.username = username
+        self.global_name = global_name
+        self.display_name = display_name
+        self.tickets = tickets
+        self.role_mask = role_mask
+        self.is_duplicate = is_duplicate
+
+    @property
+    def name(self) -> str:
+        """抽獎畫面與結果使用的名稱"""
+        return self.display_name or self.global_name or self.username or ""
+
+    def to_dict(self, role_index: RoleIndex) -> Dict[str, Any]:
+        """輸出為 lottery_data.json 的會員格式"""
+        return {
+            "id": self.id,
+            "username": self.username,
+            "global_name": self.global_name,
+            "display_name": self.display_name,
+            "tickets": self.tickets,
+            "max_role": role_index.max_role(self.role_mask),
+            "roles": role_index.role_labels(self.role_mask),
+            "is_duplicate": self.is_duplicate
+        }
+
+    @classmethod
+    def from_dict(cls, member: Dict[str, Any], role_index: RoleIndex) -> "MemberRecord":
+        """由 lottery_data.json 的會員資料建立，籤數沿用檔案中的值"""
+        global_name = member.get("global_name", "")
+        display_name = member.get("display_name", "")
+        if display_name == global_name:
+            # 與 global_name 相同時共用同一個字串
+            display_name = global_name
+        return cls(member.get("id", ""), member.get("username", ""), global_name, display_name,
+                   member.get("tickets", 0), role_index.mask_for_labels(member.get("roles", [])),
+                   member.get("is_duplicate", False))
+
+    def __repr__(self) -> str:
+        return f"MemberRecord(id={self.id!r}, name={self.name!r}, tickets={self.tickets}, role_mask={self.role_mask:#x})"
@@ -0,0 +1,221 @@
+import contextlib
+import io
+import json
+import os
+import stat
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+# 壓縮輸出的副檔名
+GZIP_SUFFIX = ".gz"
+
+# 每行一筆資料的 JSON Lines 副檔名
+JSONL_SUFFIX = ".jsonl"
+
+# gzip 檔案開頭的識別碼
+GZIP_MAGIC = b"\x1f\x8b"
+
+# 寫入緩衝區大小
+WRITE_BUFFER_SIZE = 1 << 20
+
+# csv 與 gzip 只在實際輸出 CSV 或壓縮檔時才載入，不拖慢只需要讀取 JSON 的啟動路徑
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def is_jsonl(output_file: str) -> bool:
+    """依副檔名判斷是否為 JSON Lines (可再加上 .gz)"""
+    if output_file.endswith(GZIP_SUFFIX):
+        output_file = output_file[:-len(GZIP_SUFFIX)]
+    return output_file.endswith(JSONL_SUFFIX)
+
+def _current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# 新檔案的預設權限 (與 open() 建立的檔案相同)；umask 只能以設定的方式讀取，因此在載入時讀取一次
+_NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+def temp_output_file(output_file: str) -> Tuple[int, str]:
+    """在目標的目錄中以 mkstemp 建立暫存檔，回傳 (檔案描述元, 路徑)
+
+    mkstemp 建立的檔案權限固定為 0600，改名取代目標後其他使用者就無法讀取；
+    這裡改為與直接 open() 寫入目標時相同的權限：目標已存在時沿用其權限，否則依 umask
+    """
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(output_file) or ".",
+                                     prefix=os.path.basename(output_file) + ".", suffix=".tmp")
+    try:
+        try:
+            mode = stat.S_IMODE(os.stat(output_file).st_mode)
+        except FileNotFoundError:
+            mode = _NEW_FILE_MODE
+        os.chmod(temp_file, mode)
+    except BaseException:
+        os.close(fd)
+        os.remove(temp_file)
+        raise
+    return fd, temp_file
+
+@contextlib.contextmanager
+def atomic_output(output_file: str, newline: Optional[str] = None) -> Iterator[TextIO]:
+    """以暫存檔寫入文字輸出，完成後才改名取代目標檔案
+
+    寫到一半失敗時不會留下不完整的檔案；副檔名為 .gz 時以 gzip 壓縮。
+    暫存檔以 temp_output_file 建立在目標的目錄中，多個執行緒同時寫入同一個目標也不會互相覆蓋暫存檔
+    """
+    fd, temp_file = temp_output_file(output_file)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            if output_file.endswith(GZIP_SUFFIX):
+                import gzip
+                with gzip.GzipFile(filename="", mode='wb', fileobj=raw, mtime=0) as compressed:
+                    with io.TextIOWrapper(compressed, encoding='utf-8', newline=newline) as f:
+                        yield f
+            else:
+                with io.TextIOWrapper(io.BufferedWriter(raw, WRITE_BUFFER_SIZE), encoding='utf-8',
+                                      newline=newline) as f:
+                    yield f
+        os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+class JsonDocumentWriter:
+    """逐筆寫出含一個大型列表的 JSON 文件，記憶體用量與筆數無關
+
+    一般 JSON 輸出為精簡格式：header 的欄位、列表、trailer 的欄位依序寫在同一個物件中；
+    JSON Lines 第一行為 header 與 trailer 以外的摘要物件，之後每行一筆資料，
+    trailer 寫在最後一行 (以 {"trailer": ...} 標示)。
+    提供 offsets 時記錄每筆資料在輸出文字中的開始位置，結束時再加上最後一筆之後的位置
+    (含分隔符號)，第 i 筆的文字即為 offsets[i] 到 offsets[i + 1] - len(separator)
+    """
+
+    def __init__(self, f: TextIO, header: Dict[str, Any], items_key: str, jsonl: bool = False,
+                 offsets: Optional[List[int]] = None):
+        self.f = f
+        self.items_key = items_key
+        self.jsonl = jsonl
+        self.separator = "" if jsonl else ","
+        self.offsets = offsets
+        self.count = 0
+        if jsonl:
+            self.position = f.write(_dumps(dict(header, items_key=items_key)) + "\n")
+        else:
+            self.position = f.write(_dumps(header)[:-1] + ("," if header else "") + f"{_dumps(items_key)}:[")
+
+    def write(self, item: Dict[str, Any]) -> None:
+        separator = self.separator if self.count else ""
+        if self.offsets is not None:
+            self.offsets.append(self.position + len(separator))
+        if self.jsonl:
+            self.position += self.f.write(_dumps(item) + "\n")
+        else:
+            self.position += self.f.write(separator + _dumps(item))
+        self.count += 1
+
+    def write_raw(self, text: str, starts: Sequence[int]) -> None:
+        """寫出已序列化的連續多筆資料 (彼此以 separator 相接)，starts 為各筆在 text 中的開始位置"""
+        if self.count and self.separator:
+            self.position += self.f.write(self.separator)
+        if self.offsets is not None:
+            position = self.position
+            self.offsets.extend(position + start for start in starts)
+        self.position += self.f.write(text)
+        self.count += len(starts)
+
+    def close(self, trailer: Optional[Dict[str, Any]] = None) -> None:
+        if self.offsets is not None:
+            self.offsets.append(self.position + len(self.separator))
+        if self.jsonl:
+            if trailer:
+                self.f.write(_dumps({"trailer": trailer}) + "\n")
+        else:
+            self.f.write("]" + "".join(f",{_dumps(key)}:{_dumps(value)}" for key, value in (trailer or {}).items()) + "}")
+
+class CsvRowWriter:
+    """以 csv 模組寫出的表格，欄位中的逗號、引號與換行都會正確跳脫
+
+    position 為目前已寫出的字元數，可用來記錄每一列在輸出文字中的位置
+    """
+
+    def __init__(self, f: TextIO, header: Sequence[str]):
+        import csv
+        self.f = f
+        self.writer = csv.writer(f)
+        self.position = self.writer.writerow(header)
+        self.count = 0
+
+    def write(self, row: Sequence[Any]) -> None:
+        self.position += self.writer.writerow(row)
+        self.count += 1
+
+    def write_raw(self, text: str, rows: int) -> None:
+        """寫出已由 csv 模組格式化的連續多列"""
+        self.position += self.f.write(text)
+        self.count += rows
+
+def tee_outputs(items: Iterable[Any], sinks: List[Callable[[Any], None]]) -> Iterator[Any]:
+    """走訪資料時順便把每一筆交給所有輸出，供本身也要走訪資料的寫入函式使用"""
+    for item in items:
+        for sink in sinks:
+            sink(item)
+        yield item
+
+def stream_outputs(items: Iterable[Any], sinks: List[Callable[[Any], None]]) -> int:
+    """只走訪一次資料，把每一筆交給所有輸出，回傳筆數"""
+    count = 0
+    for _ in tee_outputs(items, sinks):
+        count += 1
+    return count
+
+def read_output_text(output_file: str, newline: Optional[str] = None) -> str:
+    """讀取由 atomic_output 寫出的文字 (可為 gzip 壓縮)
+
+    newline 需與寫入時相同，讀出的字元位置才會與寫入時的 position 一致
+    """
+    with open(output_file, 'rb') as f:
+        raw_data = f.read()
+    if raw_data[:2] == GZIP_MAGIC:
+        import gzip
+        raw_data = gzip.decompress(raw_data)
+    text = raw_data.decode('utf-8')
+    if newline is None and "\r" in text:
+        # 與文字模式讀取相同的換行轉換
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def read_document(raw_data: bytes) -> Dict[str, Any]:
+    """讀取由 JsonDocumentWriter 輸出的檔案 (JSON 或 JSON Lines，可為 gzip 壓縮)
+
+    JSON Lines 會還原成與一般 JSON 相同的物件；格式錯誤時拋出 json.JSONDecodeError
+    """
+    if raw_data[:2] == GZIP_MAGIC:
+        import gzip
+        raw_data = gzip.decompress(raw_data)
+    text = raw_data.decode('utf-8')
+
+    first_line, newline, rest = text.partition("\n")
+    if not newline:
+        # 精簡格式的 JSON 只有一行
+        return json.loads(text)
+    try:
+        header = json.loads(first_line)
+    except json.JSONDecodeError:
+        header = None
+    if not isinstance(header, dict) or "items_key" not in header:
+        return json.loads(text)
+
+    document = dict(header)
+    items_key = document.pop("items_key")
+    items = []
+    for line in rest.splitlines():
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, dict) and set(item) == {"trailer"}:
+            document.update(item["trailer"])
+        else:
+            items.append(item)
+    document[items_key] = items
+    return document
@@ -1,263 +1,845 @@
 import json
 import sys
 import os
-from typing import Dict, List, Any, Set, Tuple
+import re
+import collections
+import contextlib
+import functools
+from typing import TYPE_CHECKING, Dict, List, Any, Set, Tuple, Iterator, Optional, TextIO
+
+import profiling
+from member_record import MemberRecord, RoleIndex
+from role_rules import compile_role_rules, load_role_rules, role_mapping_from_rules, ticket_mapping_from_rules
+from output_writer import (CsvRowWriter, JsonDocumentWriter, atomic_output, is_jsonl, read_document,
+                           read_output_text, tee_outputs)
+from ticket_store import TICKET_STORE_SUFFIX, write_ticket_store
+
+# concurrent.futures 只在實際平行讀取時才載入，型別註記僅供型別檢查使用
+if TYPE_CHECKING:
+    import concurrent.futures
+
+# 串流解析時每次讀取的字元數
+JSON_READ_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# parse_data 輸出的會員籤數 CSV 欄位
+MEMBER_CSV_HEADER = ("會員名稱", "DC ID", "籤數", "最高等級角色")
+
+# 快照索引的副檔名：save_outputs 在 JSON 輸出檔旁記錄每位會員的欄位與所在位置，
+# 下次增量更新時直接讀取索引，不必解析整個輸出檔，未變動的會員也直接複製原本的輸出文字
+SNAPSHOT_INDEX_SUFFIX = ".index"
+SNAPSHOT_INDEX_VERSION = 1
+
+# 快照中記錄上一次輸出位置的鍵 (_SnapshotSource)，不會寫入輸出檔
+SNAPSHOT_SOURCE_KEY = "_source"
+
+class _JsonStream:
+    """以區塊方式逐步讀取 JSON 檔案，一次只解碼一個元素"""
+
+    def __init__(self, f: TextIO, chunk_size: int = JSON_READ_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """丟棄已處理的部分並讀入更多資料；讀取量隨未處理長度倍增，避免大元素反覆重試"""
+        chunk = self.f.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def peek(self) -> str:
+        """略過空白並回傳下一個字元，檔案結尾時回傳空字串"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self._error(f"預期 '{char}'")
+        self.pos += 1
+
+    def decode_value(self) -> Any:
+        """解碼下一個完整的 JSON 值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
 
-def parse_member_data(member_file: str) -> List[Dict[str, Any]]:
-    """解析會員資料檔案，提取需要的欄位"""
-    try:
-        with open(member_file, 'r', encoding='utf-8') as f:
-            members_data = json.load(f)
-
-        # 確保資料是列表格式
-        if not isinstance(members_data, list):
-            print(f"錯誤：會員資料檔案格式不正確，應為列表格式")
-            return []
-
-        # 提取需要的欄位
-        cleaned_members = []
-        for member in members_data:
-            if not isinstance(member, dict):
+            # 值剛好結束在緩衝區尾端時可能被截斷（例如數字），讀入更多資料再確認
+            if end == len(self.buffer) and self._fill():
                 continue
 
-            cleaned_member = {
-                "id": member.get("id", ""),
-                "username": member.get("username", ""),
-                "global_name": member.get("global_name", "")
-            }
-            cleaned_members.append(cleaned_member)
+            self.pos = end
+            return value
+
+    def iter_array(self) -> Iterator[Any]:
+        """逐一產生目前位置陣列中的元素"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+
+        while True:
+            yield self.decode_value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise self._error("陣列元素之間缺少 ','")
+
+    def seek_key(self, key: str) -> bool:
+        """在目前位置的物件中尋找指定鍵，找到時停在其值之前；其他鍵的值會被略過"""
+        self.expect("{")
+        if self.peek() == "}":
+            return False
+
+        while True:
+            name = self.decode_value()
+            self.expect(":")
+            if name == key:
+                return True
+
+            self.decode_value()
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return False
+            if char != ",":
+                raise self._error("物件成員之間缺少 ','")
+
+def iter_member_records(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """串流讀取會員資料，每次只保留一位會員的 id、username 與 global_name"""
+    stream = _JsonStream(f)
+    if stream.peek() != "[":
+        raise ValueError("會員資料檔案格式不正確，應為列表格式")
+
+    for member in stream.iter_array():
+        if not isinstance(member, dict):
+            continue
+
+        yield {
+            "id": member.get("id", ""),
+            "username": member.get("username", ""),
+            "global_name": member.get("global_name", "")
+        }
+
+def iter_role_records(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """串流讀取角色資料，每次只保留一位會員的 id、username、global_name 與 roles"""
+    stream = _JsonStream(f)
+    if stream.peek() != "{" or not stream.seek_key("members") or stream.peek() != "[":
+        raise ValueError("角色資料檔案格式不正確，應包含 'members' 欄位")
 
-        print(f"成功解析 {len(cleaned_members)} 名會員資料")
-        return cleaned_members
+    for member_entry in stream.iter_array():
+        if not isinstance(member_entry, dict) or "member" not in member_entry:
+            continue
 
+        member_data = member_entry.get("member", {})
+        user_data = member_data.get("user", {})
+        user_id = user_data.get("id", "")
+
+        if not user_id:
+            continue
+
+        yield {
+            "id": user_id,
+            "username": user_data.get("username", ""),
+            "global_name": user_data.get("global_name", ""),
+            "roles": member_data.get("roles", [])
+        }
+
+def _load_records(file_path: str, iter_records) -> List[Dict[str, Any]]:
+    """以串流方式讀取整個檔案的精簡紀錄"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return list(iter_records(f))
+
+def _collect_records(file_path: str, description: str,
+                     load: "concurrent.futures.Future") -> Optional[List[Dict[str, Any]]]:
+    """取得讀取結果並顯示錯誤訊息，失敗時回傳 None"""
+    try:
+        return load.result()
     except FileNotFoundError:
-        print(f"錯誤：找不到檔案 '{member_file}'")
-        return []
+        print(f"錯誤：找不到檔案 '{file_path}'")
     except json.JSONDecodeError:
-        print(f"錯誤：檔案 '{member_file}' 不是有效的JSON格式")
-        return []
+        print(f"錯誤：檔案 '{file_path}' 不是有效的JSON格式")
+    except ValueError as e:
+        print(f"錯誤：{str(e)}")
     except Exception as e:
-        print(f"錯誤：解析會員資料時發生問題 - {str(e)}")
-        return []
+        print(f"錯誤：解析{description}時發生問題 - {str(e)}")
+    return None
 
-def parse_roles_data(roles_file: str) -> List[Dict[str, Any]]:
-    """解析角色資料檔案，提取會員ID和擁有的角色"""
-    try:
-        with open(roles_file, 'r', encoding='utf-8') as f:
-            roles_data = json.load(f)
-
-        # 確保資料有正確的結構
-        if not isinstance(roles_data, dict) or "members" not in roles_data:
-            print(f"錯誤：角色資料檔案格式不正確，應包含 'members' 欄位")
-            return []
-
-        # 提取會員ID和角色資訊
-        cleaned_roles = []
-        for member_entry in roles_data.get("members", []):
-            if not isinstance(member_entry, dict) or "member" not in member_entry:
-                continue
+def _run_now(function, *args) -> "concurrent.futures.Future":
+    """在目前執行緒執行函式，並將結果包裝成 Future"""
+    import concurrent.futures
 
-            member_data = member_entry.get("member", {})
-            user_data = member_data.get("user", {})
-            user_id = user_data.get("id", "")
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
 
-            if not user_id:
-                continue
+def parse_member_data(member_file: str, load: Optional["concurrent.futures.Future"] = None) -> List[Dict[str, Any]]:
+    """解析會員資料檔案，提取需要的欄位"""
+    if load is None:
+        load = _run_now(_load_records, member_file, iter_member_records)
 
-            roles = member_data.get("roles", [])
+    cleaned_members = _collect_records(member_file, "會員資料", load)
+    if cleaned_members is None:
+        return []
 
-            cleaned_role = {
-                "id": user_id,
-                "username": user_data.get("username", ""),
-                "global_name": user_data.get("global_name", ""),
-                "roles": roles
-            }
-            cleaned_roles.append(cleaned_role)
+    print(f"成功解析 {len(cleaned_members)} 名會員資料")
+    return cleaned_members
 
-        print(f"成功解析 {len(cleaned_roles)} 名會員的角色資料")
-        return cleaned_roles
+def parse_roles_data(roles_file: str, load: Optional["concurrent.futures.Future"] = None) -> List[Dict[str, Any]]:
+    """解析角色資料檔案，提取會員ID和擁有的角色"""
+    if load is None:
+        load = _run_now(_load_records, roles_file, iter_role_records)
 
-    except FileNotFoundError:
-        print(f"錯誤：找不到檔案 '{roles_file}'")
-        return []
-    except json.JSONDecodeError:
-        print(f"錯誤：檔案 '{roles_file}' 不是有效的JSON格式")
-        return []
-    except Exception as e:
-        print(f"錯誤：解析角色資料時發生問題 - {str(e)}")
+    cleaned_roles = _collect_records(roles_file, "角色資料", load)
+    if cleaned_roles is None:
         return []
 
+    print(f"成功解析 {len(cleaned_roles)} 名會員的角色資料")
+    return cleaned_roles
+
+@profiling.profiled()
+def parse_exports(member_file: str, roles_file: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """同時讀取會員資料與角色資料兩個檔案，訊息依序顯示"""
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        members_load = executor.submit(_load_records, member_file, iter_member_records)
+        roles_load = executor.submit(_load_records, roles_file, iter_role_records)
+        return parse_member_data(member_file, members_load), parse_roles_data(roles_file, roles_load)
+
+# 角色ID、名稱與籤數的規則，由 role_rules.json (或 MURMURCAT_ROLE_RULES 指定的檔案) 載入
+ROLE_RULES = load_role_rules()
+
 def create_role_mapping() -> Dict[str, str]:
     """創建角色ID到角色名稱的映射"""
-    role_mapping = {
-        "928548848442441749": "呢喃貓",
-        "949943973022167050": "雙貓流",
-        "940239876526317609": "三隻小貓",
-        "1347041467964723230": "四貓打麻將",
-        "1347041648080584814": "五貓戰隊",
-        "1347041767144554497": "六親不認貓",
-        "1347041779500716096": "七貓亂彈琴",
-        "1347041932064460900": "八貓大逃殺",
-        "928550308731293726": "九mint怪貓",
-        "1370051375634841650": "十二金貓"
-    }
-    return role_mapping
+    return role_mapping_from_rules(ROLE_RULES)
+
+# 角色名稱對應的籤數
+TICKET_MAPPING = ticket_mapping_from_rules(ROLE_RULES)
 
 def get_tickets_for_role(role_name: str) -> int:
     """根據角色名稱取得對應的籤數"""
-    ticket_mapping = {
-        "呢喃貓": 1,
-        "雙貓流": 2,
-        "三隻小貓": 3,
-        "四貓打麻將": 4,
-        "五貓戰隊": 5,
-        "六親不認貓": 6,
-        "七貓亂彈琴": 7,
-        "八貓大逃殺": 8,
-        "九mint怪貓": 9,
-        "十二金貓": 12
-    }
-    return ticket_mapping.get(role_name, 0)
-
+    return TICKET_MAPPING.get(role_name, 0)
+
+def find_duplicate_ids(members: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """找出重複的會員ID，回傳 ID 到其在來源資料中所有位置的對應"""
+    return find_duplicate_positions([member["id"] for member in members])
+
+def find_duplicate_positions(member_ids: List[str]) -> Dict[str, List[int]]:
+    """先以 Counter 計數，只有確實有重複時才再掃描一次記錄位置"""
+    counts = collections.Counter(member_ids)
+    if len(counts) == len(member_ids):
+        return {}
+
+    duplicated = {member_id for member_id, count in counts.items() if count > 1}
+    positions: Dict[str, List[int]] = {}
+    for index, member_id in enumerate(member_ids):
+        if member_id in duplicated:
+            positions.setdefault(member_id, []).append(index)
+    return positions
+
+@functools.lru_cache(maxsize=None)
+def default_role_index() -> RoleIndex:
+    """編譯後的目前角色規則，整個程式只編譯一次"""
+    return compile_role_rules(ROLE_RULES)
+
+def role_index_for(role_mapping: Dict[str, str]) -> RoleIndex:
+    """取得指定角色對應表的角色規則，與預設對應表相同時沿用已編譯的結果"""
+    if role_mapping == create_role_mapping():
+        return default_role_index()
+    return compile_role_rules(ROLE_RULES, role_mapping)
+
+def build_member_record(member: Dict[str, Any], role_mask: int, tickets: int, is_duplicate: bool) -> MemberRecord:
+    """以角色遮罩與籤數建立單一會員的紀錄"""
+    global_name = member.get("global_name", "")
+    username = member.get("username", "")
+    display_name = global_name or username
+    if display_name == "slipknot" or display_name == "slipknot9527":
+      display_name = "Dante"
+
+    return MemberRecord(member["id"], username, global_name, display_name, tickets, role_mask, is_duplicate)
+
+def build_duplicate_groups(duplicate_groups: Dict[str, List[int]]) -> List[Dict[str, Any]]:
+    return [
+        {"id": member_id, "count": len(indexes), "positions": indexes}
+        for member_id, indexes in duplicate_groups.items()
+    ]
+
+@profiling.profiled()
 def combine_data(members: List[Dict[str, Any]], roles: List[Dict[str, Any]],
                 role_mapping: Dict[str, str]) -> Dict[str, Any]:
     """將會員資料和角色資料結合，計算籤數"""
-    # 將角色資料轉為以ID為鍵的字典，方便查詢
-    roles_dict = {role["id"]: role for role in roles}
+    # 將每位會員的角色轉為遮罩，以ID為鍵方便查詢
+    role_index = role_index_for(role_mapping)
+    role_masks = {role["id"]: role_index.mask(role.get("roles", [])) for role in roles}
 
     # 檢查重複ID
-    member_ids = [member["id"] for member in members]
-    duplicate_ids = set([id for id in member_ids if member_ids.count(id) > 1])
+    duplicate_groups = find_duplicate_ids(members)
 
-    if duplicate_ids:
-        print(f"警告：在會員資料中發現 {len(duplicate_ids)} 個重複的ID")
+    if duplicate_groups:
+        print(f"警告：在會員資料中發現 {len(duplicate_groups)} 個重複的ID")
+
+    # 先取得所有會員的遮罩，再一次查表算出籤數
+    member_masks = [role_masks.get(member["id"], 0) for member in members]
+    member_tickets = role_index.tickets_for_masks(member_masks)
 
     # 合併資料
     result = {
         "total_members": len(members),
-        "eligible_members": 0,
-        "total_tickets": 0,
-        "members": []
+        "eligible_members": len(member_tickets) - member_tickets.count(0),
+        "total_tickets": sum(member_tickets),
+        "members": [],
+        "duplicate_groups": build_duplicate_groups(duplicate_groups)
     }
 
-    for member in members:
-        member_id = member["id"]
-        roles_info = roles_dict.get(member_id, {})
+    # 依籤數分桶，最後按籤數從多到少串接，取代整體排序
+    buckets: Dict[int, List[MemberRecord]] = {}
 
-        # 獲取該會員的角色列表
-        member_roles = roles_info.get("roles", [])
+    for member, role_mask, max_tickets in zip(members, member_masks, member_tickets):
+        record = build_member_record(member, role_mask, max_tickets, member["id"] in duplicate_groups)
+        if max_tickets in buckets:
+            buckets[max_tickets].append(record)
+        else:
+            buckets[max_tickets] = [record]
 
-        # 計算該會員的籤數
-        max_tickets = 0
-        member_role_names = []
-        max_role = None
+    # 按籤數從多到少排序（同籤數維持來源順序）
+    for tickets in sorted(buckets, reverse=True):
+        result["members"].extend(buckets[tickets])
 
-        for role_id in member_roles:
-            if role_id in role_mapping:
-                role_name = role_mapping[role_id]
-                tickets = get_tickets_for_role(role_name)
-                member_role_names.append(f"{role_name} ({tickets})")
+    return result
 
-                if tickets > max_tickets:
-                    max_tickets = tickets
-                    max_role = role_name
+def _file_state(path: str) -> Optional[List[int]]:
+    """檔案的 [大小, 修改時間, inode]，用來確認輸出檔在寫出索引後沒有被改動；不存在時回傳 None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+class _SnapshotSource:
+    """上一次由 save_outputs 寫出的輸出檔，以及每位會員的輸出文字在其中的位置
+
+    members 為寫出時的會員紀錄 (與快照共用同一批物件)；快照修補後仍是同一個物件的會員即未變動，
+    再次輸出時直接複製原本的文字。輸出檔在寫出後被改動時不使用
+    """
+
+    __slots__ = ("members", "role_labels", "output_file", "output_format", "output_state", "json_offsets",
+                 "csv_file", "csv_state", "csv_offsets")
+
+    def __init__(self, members: List[MemberRecord], role_labels: List[str], output_file: str, output_format: str,
+                 output_state: Optional[List[int]], json_offsets: List[int], csv_file: Optional[str] = None,
+                 csv_state: Optional[List[int]] = None, csv_offsets: Optional[List[int]] = None):
+        self.members = members
+        self.role_labels = role_labels
+        self.output_file = output_file
+        self.output_format = output_format
+        self.output_state = output_state
+        self.json_offsets = json_offsets
+        self.csv_file = csv_file
+        self.csv_state = csv_state
+        self.csv_offsets = csv_offsets
+
+    def json_text(self, output_format: str, role_index: RoleIndex) -> Optional[str]:
+        """上一次輸出的 JSON 文字，格式或角色設定不同、檔案已被改動時回傳 None"""
+        if (output_format != self.output_format or self.role_labels != list(role_index.labels)
+                or _file_state(self.output_file) != self.output_state):
+            return None
+        try:
+            return read_output_text(self.output_file)
+        except (OSError, EOFError, UnicodeDecodeError):
+            return None
+
+    def csv_text(self, role_index: RoleIndex) -> Optional[str]:
+        """上一次輸出的 CSV 文字，沒有記錄或檔案已被改動時回傳 None"""
+        if (self.csv_file is None or self.role_labels != list(role_index.labels)
+                or _file_state(self.csv_file) != self.csv_state):
+            return None
+        try:
+            return read_output_text(self.csv_file, newline='')
+        except (OSError, EOFError, UnicodeDecodeError):
+            return None
+
+def _load_snapshot_index(snapshot_file: str, role_index: RoleIndex) -> Optional[Dict[str, Any]]:
+    """由快照旁的索引建立快照，索引不存在或與快照不符時回傳 None"""
+    try:
+        with open(snapshot_file + SNAPSHOT_INDEX_SUFFIX, 'rb') as f:
+            index = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+    if (not isinstance(index, dict) or index.get("version") != SNAPSHOT_INDEX_VERSION
+            or index.get("role_labels") != list(role_index.labels)
+            or index.get("output_state") != _file_state(snapshot_file)):
+        return None
+    try:
+        ids, usernames, global_names, display_names, tickets, role_masks, json_offsets = (
+            index[key] for key in ("ids", "usernames", "global_names", "display_names", "tickets", "role_masks",
+                                   "json_offsets"))
+        csv_offsets = index["csv"]["offsets"] if index["csv"] else None
+        if not len(ids) == len(usernames) == len(global_names) == len(display_names) == len(tickets) == len(role_masks):
+            return None
+        if len(json_offsets) != len(ids) + 1 or (csv_offsets is not None and len(csv_offsets) != len(ids) + 1):
+            return None
+        # 與 global_name 相同的 display_name 共用同一個字串
+        display_names = [global_name if display_name == global_name else display_name
+                         for display_name, global_name in zip(display_names, global_names)]
+        members = list(map(MemberRecord, ids, usernames, global_names, display_names, tickets, role_masks))
+        for position in index["duplicates"]:
+            members[position].is_duplicate = True
+        snapshot = dict(index["header"], members=members)
+        snapshot[SNAPSHOT_SOURCE_KEY] = _SnapshotSource(
+            list(members), index["role_labels"], snapshot_file, index["format"], index["output_state"], json_offsets,
+            index["csv"] and index["csv"]["file"], index["csv"] and index["csv"]["state"], csv_offsets)
+    except (KeyError, TypeError, IndexError):
+        return None
+    return snapshot
+
+def _save_snapshot_index(data: Dict[str, Any], header: Dict[str, Any], output_file: str, output_format: str,
+                         json_offsets: List[int], csv_file: Optional[str], csv_offsets: Optional[List[int]],
+                         role_index: RoleIndex) -> Optional[_SnapshotSource]:
+    """在輸出檔旁寫出快照索引，回傳對應的 _SnapshotSource；失敗時只顯示警告並回傳 None"""
+    members = data["members"]
+    csv_state = _file_state(csv_file) if csv_file else None
+    source = _SnapshotSource(list(members), list(role_index.labels), output_file, output_format,
+                             _file_state(output_file), json_offsets,
+                             os.path.abspath(csv_file) if csv_file else None, csv_state, csv_offsets)
+    index = {
+        "version": SNAPSHOT_INDEX_VERSION,
+        "format": output_format,
+        "role_labels": source.role_labels,
+        "output_state": source.output_state,
+        "csv": {"file": source.csv_file, "state": csv_state, "offsets": csv_offsets} if csv_file else None,
+        "header": header,
+        "ids": [member.id for member in members],
+        "usernames": [member.username for member in members],
+        "global_names": [member.global_name for member in members],
+        "display_names": [member.display_name for member in members],
+        "tickets": [member.tickets for member in members],
+        "role_masks": [member.role_mask for member in members],
+        "duplicates": [position for position, member in enumerate(members) if member.is_duplicate],
+        "json_offsets": json_offsets
+    }
+    try:
+        with atomic_output(output_file + SNAPSHOT_INDEX_SUFFIX) as f:
+            f.write(json.dumps(index, ensure_ascii=False, separators=(",", ":")))
+    except Exception as e:
+        print(f"無法寫入快照索引: {str(e)}")
+        return None
+    return source
 
-        # 添加會員資料
-        display_name = member.get("global_name", "") or member.get("username", "")
-        if display_name == "slipknot" or display_name == "slipknot9527":
-          display_name = "Dante"
+def load_snapshot(snapshot_file: str, role_index: Optional[RoleIndex] = None) -> Optional[Dict[str, Any]]:
+    """載入先前由 save_data 輸出的 JSON / JSON Lines 快照，會員轉為 MemberRecord，失敗時回傳 None
 
-        member_info = {
-            "id": member_id,
-            "username": member.get("username", ""),
-            "global_name": member.get("global_name", ""),
-            "display_name": display_name,
-            "tickets": max_tickets,
-            "max_role": max_role or "無特殊角色",
-            "roles": member_role_names,
-            "is_duplicate": member_id in duplicate_ids
-        }
+    快照旁有 save_outputs 寫出的索引且快照未被改動時，直接由索引建立會員紀錄，不解析快照本身
+    """
+    role_index = role_index or default_role_index()
+    snapshot = _load_snapshot_index(snapshot_file, role_index)
+    if snapshot is not None:
+        return snapshot
 
-        result["members"].append(member_info)
+    try:
+        with open(snapshot_file, 'rb') as f:
+            snapshot = read_document(f.read())
+    except FileNotFoundError:
+        print(f"錯誤：找不到快照檔案 '{snapshot_file}'")
+        return None
+    except (json.JSONDecodeError, UnicodeDecodeError, OSError, EOFError):
+        print(f"錯誤：快照檔案 '{snapshot_file}' 不是有效的JSON格式")
+        return None
+
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get("members"), list):
+        print(f"錯誤：快照檔案 '{snapshot_file}' 格式不正確，應包含 'members' 欄位")
+        return None
+
+    snapshot["members"] = [MemberRecord.from_dict(member, role_index) for member in snapshot["members"]]
+    return snapshot
+
+@profiling.profiled()
+def diff_snapshot(previous: Dict[str, Any], members: List[Dict[str, Any]], roles: List[Dict[str, Any]],
+                  role_mapping: Dict[str, str]) -> Dict[str, Any]:
+    """比對上一份快照與新的匯出資料，只回傳有變動的會員
+
+    比對只做一次線性掃描，逐一比較名稱與角色遮罩；
+    只有新加入或有變動的會員才會建立新的紀錄。
+    joined/updated 中的會員紀錄與 combine_data 的輸出相同，重複ID會出現多次；
+    previous_positions 記錄需要移除的會員在上一份快照 members 中的位置
+    """
+    previous_members = previous["members"]
+    previous_index = {member.id: position for position, member in enumerate(previous_members)}
+    previous_duplicates = {}
+    if len(previous_index) < len(previous_members):
+        previous_duplicates = find_duplicate_positions([member.id for member in previous_members])
+
+    role_index = role_index_for(role_mapping)
+    role_masks = {role["id"]: role_index.mask(role.get("roles", [])) for role in roles}
+    duplicate_groups = find_duplicate_ids(members)
+
+    delta: Dict[str, Any] = {
+        "previous_members": len(previous_members),
+        "total_members": len(members),
+        "joined": [],
+        "left": [],
+        "updated": [],
+        "ticket_changes": [],
+        "role_upgrades": [],
+        "previous_positions": {},
+        "duplicate_groups": build_duplicate_groups(duplicate_groups)
+    }
 
-        # 更新計數
-        if max_tickets > 0:
-            result["eligible_members"] += 1
-            result["total_tickets"] += max_tickets
+    handled_duplicates: Set[str] = set()
+    for member in members:
+        member_id = member["id"]
+        role_mask = role_masks.get(member_id, 0)
 
-    # 按籤數從多到少排序
-    result["members"].sort(key=lambda x: x["tickets"], reverse=True)
+        if member_id in duplicate_groups or member_id in previous_duplicates:
+            # 重複ID的每一筆來源資料都要比對，名稱可能不同
+            if member_id in handled_duplicates:
+                continue
+            handled_duplicates.add(member_id)
+            occurrences = [members[index] for index in duplicate_groups.get(member_id, [])] or [member]
+            position = previous_index.pop(member_id, None)
+            positions = previous_duplicates.get(member_id) or ([position] if position is not None else None)
+        else:
+            occurrences = [member]
+            position = previous_index.pop(member_id, None)
+            positions = [position] if position is not None else None
+
+        if positions is not None:
+            old = previous_members[positions[0]]
+            if (len(positions) == len(occurrences)
+                    and old.role_mask == role_mask
+                    and (old.username == member.get("username", "") and old.global_name == member.get("global_name", "")
+                         if len(occurrences) == 1 else
+                         all(previous_members[position].username == occurrence.get("username", "")
+                             and previous_members[position].global_name == occurrence.get("global_name", "")
+                             for position, occurrence in zip(positions, occurrences)))):
+                continue
 
-    return result
+        is_duplicate = len(occurrences) > 1
+        tickets = role_index.tickets_for(role_mask)
+        records = [build_member_record(occurrence, role_mask, tickets, is_duplicate) for occurrence in occurrences]
+        if positions is None:
+            delta["joined"].extend(records)
+            continue
+
+        record = records[0]
+        delta["updated"].extend(records)
+        delta["previous_positions"][member_id] = positions
+        if old.tickets != record.tickets:
+            delta["ticket_changes"].append({
+                "id": member_id,
+                "display_name": record.display_name,
+                "previous_tickets": old.tickets,
+                "tickets": record.tickets
+            })
+            if record.tickets > old.tickets:
+                delta["role_upgrades"].append({
+                    "id": member_id,
+                    "display_name": record.display_name,
+                    "previous_role": role_index.max_role(old.role_mask),
+                    "max_role": role_index.max_role(record.role_mask)
+                })
+
+    # 沒有在新資料中出現的會員即為離開
+    for member_id, position in previous_index.items():
+        positions = previous_duplicates.get(member_id) or [position]
+        delta["left"].extend(previous_members[index] for index in positions)
+        delta["previous_positions"][member_id] = positions
+
+    return delta
+
+def _bucket_end(members: List[MemberRecord], tickets: int) -> int:
+    """在依籤數由多到少排列的名單中，找出該籤數分組結尾的位置"""
+    low, high = 0, len(members)
+    while low < high:
+        middle = (low + high) // 2
+        if members[middle].tickets >= tickets:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+@profiling.profiled()
+def apply_snapshot_delta(previous: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """將 diff_snapshot 的結果套用到上一份快照上 (直接修改並回傳)
+
+    只移除與插入有變動的會員，其餘會員維持原位；
+    變動的會員會排在同籤數分組的最後，籤數由多到少的順序不變
+    """
+    members = previous["members"]
+    removed = sorted((position for positions in delta["previous_positions"].values() for position in positions),
+                     reverse=True)
+    added = delta["updated"] + delta["joined"]
+
+    for position in removed:
+        member = members[position]
+        if member.tickets > 0:
+            previous["eligible_members"] -= 1
+            previous["total_tickets"] -= member.tickets
+    for member in added:
+        if member.tickets > 0:
+            previous["eligible_members"] += 1
+            previous["total_tickets"] += member.tickets
+
+    if (len(removed) + len(added)) * 16 < len(members):
+        # 變動不多時逐筆刪除與插入
+        for position in removed:
+            del members[position]
+        for member in added:
+            members.insert(_bucket_end(members, member.tickets), member)
+    else:
+        # 變動很多時一次重建，穩定排序會保留未變動會員的相對順序
+        removed_positions = set(removed)
+        kept = [member for position, member in enumerate(members) if position not in removed_positions]
+        kept.extend(added)
+        kept.sort(key=lambda member: member.tickets, reverse=True)
+        members[:] = kept
+
+    previous["total_members"] = delta["total_members"]
+    previous["duplicate_groups"] = delta["duplicate_groups"]
+    return previous
+
+def print_delta(delta: Dict[str, Any]) -> None:
+    """顯示快照之間的變動摘要"""
+    joined_ids = {member.id for member in delta["joined"]}
+    left_ids = {member.id for member in delta["left"]}
+    updated_ids = {member.id for member in delta["updated"]}
+
+    print("\n===== 快照變動 =====")
+    print(f"上一份快照會員數: {delta['previous_members']}，本次會員數: {delta['total_members']}")
+    print(f"新加入: {len(joined_ids)} 人，離開: {len(left_ids)} 人，資料變動: {len(updated_ids)} 人")
+    print(f"籤數變動: {len(delta['ticket_changes'])} 人，角色升級: {len(delta['role_upgrades'])} 人")
+    for upgrade in delta["role_upgrades"][:20]:
+        print(f"  {upgrade['display_name']}: {upgrade['previous_role']} → {upgrade['max_role']}")
+    if len(delta["role_upgrades"]) > 20:
+        print(f"  ... 以及其他 {len(delta['role_upgrades']) - 20} 人")
+
+def save_delta(delta: Dict[str, Any], delta_file: str, role_index: Optional[RoleIndex] = None) -> None:
+    """保存快照變動，供稽核或後續處理使用"""
+    role_index = role_index or default_role_index()
+    rendered = dict(delta)
+    for key in ("joined", "left", "updated"):
+        rendered[key] = [member.to_dict(role_index) for member in delta[key]]
 
-def save_data(data: Dict[str, Any], output_file: str) -> None:
-    """保存處理後的資料到檔案"""
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"資料已保存至 {output_file}")
+        with atomic_output(delta_file) as f:
+            json.dump(rendered, f, ensure_ascii=False, indent=2)
+        print(f"快照變動已保存至 {delta_file}")
     except Exception as e:
-        print(f"保存資料時發生錯誤: {str(e)}")
+        print(f"保存快照變動時發生錯誤: {str(e)}")
+
+def member_csv_row(member: MemberRecord, role_index: RoleIndex) -> List[Any]:
+    return [member.global_name or member.display_name or "", member.username or "", member.tickets,
+            role_index.max_role(member.role_mask)]
+
+def _member_runs(members: List[MemberRecord], previous: Optional[List[MemberRecord]]) -> Iterator[Tuple[int, int, int]]:
+    """把名單切成 (開始, 結束, 上一次輸出中的開始位置) 的連續片段
+
+    片段內的會員在上一次輸出中也依序相連，可整段複製；有變動的會員各自成一段，上一次的位置為 -1
+    """
+    if not previous:
+        if members:
+            yield 0, len(members), -1
+        return
+    previous_positions = {id(member): position for position, member in enumerate(previous)}
+    start, previous_start = 0, -1
+    for index, member in enumerate(members):
+        position = previous_positions.get(id(member), -1)
+        if position < 0 or previous_start < 0 or position != previous_start + index - start:
+            if index > start:
+                yield start, index, previous_start
+            start, previous_start = index, position
+    if len(members) > start:
+        yield start, len(members), previous_start
+
+def _write_members(members: List[MemberRecord], json_writer: Optional[JsonDocumentWriter],
+                   csv_writer: Optional[CsvRowWriter], csv_offsets: Optional[List[int]], role_index: RoleIndex,
+                   source: Optional[_SnapshotSource], output_format: Optional[str]) -> None:
+    """依序寫出每位會員的 JSON 與 CSV (只輸出有籤數的會員)
+
+    有上一次的輸出 (source) 時，未變動的連續會員直接複製原本的輸出文字，只有變動的會員重新序列化
+    """
+    previous_json = source.json_text(output_format, role_index) if source and json_writer else None
+    previous_csv = source.csv_text(role_index) if source and csv_writer else None
+    separator = len(json_writer.separator) if json_writer else 0
+
+    for start, end, previous_start in _member_runs(members, source.members if source else None):
+        previous_end = previous_start + end - start
+        if json_writer:
+            if previous_start >= 0 and previous_json is not None:
+                offsets = source.json_offsets[previous_start:previous_end + 1]
+                base = offsets[0]
+                json_writer.write_raw(previous_json[base:offsets[-1] - separator],
+                                      [offset - base for offset in offsets[:-1]])
+            else:
+                for member in members[start:end]:
+                    json_writer.write(member.to_dict(role_index))
+        if csv_writer:
+            if previous_start >= 0 and previous_csv is not None:
+                offsets = source.csv_offsets[previous_start:previous_end + 1]
+                base = offsets[0]
+                if csv_offsets is not None:
+                    position = csv_writer.position
+                    csv_offsets.extend(position + offset - base for offset in offsets[:-1])
+                csv_writer.write_raw(previous_csv[base:offsets[-1]], end - start)
+            else:
+                for member in members[start:end]:
+                    if csv_offsets is not None:
+                        csv_offsets.append(csv_writer.position)
+                    if member.tickets > 0:
+                        csv_writer.write(member_csv_row(member, role_index))
+    if csv_writer and csv_offsets is not None:
+        csv_offsets.append(csv_writer.position)
+
+@profiling.profiled()
+def save_outputs(data: Dict[str, Any], output_file: Optional[str], csv_file: Optional[str] = None,
+                 output_format: Optional[str] = None, role_index: Optional[RoleIndex] = None) -> bool:
+    """只走訪一次會員資料，同時輸出抽獎資料檔與 CSV，成功時回傳 True
+
+    output_format 為 "json" 時輸出精簡的 JSON；為 "jsonl" 時每行一位會員；
+    為 "columnar" 時輸出可供 draw.py 以記憶體映射開啟的二進位抽獎表。
+    未指定時依副檔名判斷，檔名以 .gz 結尾時以 gzip 壓縮。
+    每位會員的輸出內容寫出後即丟棄，角色顯示文字在此才由遮罩產生；
+    所有檔案都先寫入暫存檔，完成後才取代目標檔案。
+    JSON 輸出時另在旁邊寫出快照索引 (見 load_snapshot)；data 是由索引載入或上一次輸出後修補的快照時，
+    未變動的會員直接複製上一次輸出的文字
+    """
+    role_index = role_index or default_role_index()
+    if output_format is None and output_file:
+        if output_file.endswith(TICKET_STORE_SUFFIX):
+            output_format = "columnar"
+        else:
+            output_format = "jsonl" if is_jsonl(output_file) else "json"
 
-def save_csv(data: Dict[str, Any], output_file: str) -> None:
-    """將會員資料保存為CSV檔案"""
     try:
-        with open(output_file, 'w', encoding='utf-8', newline='') as f:
-            f.write("會員名稱,DC ID,籤數,最高等級角色\n")
-            for member in data["members"]:
-                global_name = member.get("global_name", "") or member.get("display_name", "")
-                global_name = global_name.replace(",", "，") if global_name else ""
-                username = member.get("username", "").replace(",", "，") if member.get("username") else ""
-                tickets = member.get("tickets", 0)
-                max_role = member.get("max_role", "無特殊角色")
-
-                if tickets > 0:  # 只輸出有籤數的會員
-                    f.write(f"{global_name},{username},{tickets},{max_role}\n")
-        print(f"CSV資料已保存至 {output_file}")
+        source = data.get(SNAPSHOT_SOURCE_KEY)
+        header = {key: value for key, value in data.items() if key not in ("members", SNAPSHOT_SOURCE_KEY)}
+        track_offsets = output_file is not None and output_format != "columnar"
+        json_offsets: Optional[List[int]] = [] if track_offsets else None
+        csv_offsets: Optional[List[int]] = [] if track_offsets and csv_file else None
+        with contextlib.ExitStack() as stack:
+            csv_writer = None
+            if csv_file:
+                csv_writer = CsvRowWriter(stack.enter_context(atomic_output(csv_file, newline='')), MEMBER_CSV_HEADER)
+
+            if output_format == "columnar":
+                # 只輸出有籤數的會員
+                sinks = [lambda member: member.tickets > 0 and csv_writer.write(member_csv_row(member, role_index))]
+                write_ticket_store(output_file, tee_outputs(data["members"], sinks if csv_writer else []), role_index, {
+                    "total_members": data["total_members"],
+                    "eligible_members": data["eligible_members"]
+                })
+            else:
+                json_writer = None
+                if output_file:
+                    json_writer = JsonDocumentWriter(stack.enter_context(atomic_output(output_file)), header, "members",
+                                                     jsonl=output_format == "jsonl", offsets=json_offsets)
+                _write_members(data["members"], json_writer, csv_writer, csv_offsets, role_index, source,
+                               output_format)
+                if json_writer:
+                    json_writer.close()
+
+        if track_offsets:
+            data[SNAPSHOT_SOURCE_KEY] = _save_snapshot_index(data, header, output_file, output_format, json_offsets,
+                                                             csv_file, csv_offsets, role_index)
+        if output_file:
+            print(f"資料已保存至 {output_file}")
+        if csv_file:
+            print(f"CSV資料已保存至 {csv_file}")
+        return True
     except Exception as e:
-        print(f"保存CSV資料時發生錯誤: {str(e)}")
-
-def main():
-    print("===== 抽籤資料解析工具 =====")
+        print(f"保存資料時發生錯誤: {str(e)}")
+        return False
 
-    # 設定檔案路徑
-    member_file = input("請輸入會員資料檔案路徑 (預設: raffle_member.json): ") or "raffle_member.json"
-    roles_file = input("請輸入角色資料檔案路徑 (預設: member_role.json): ") or "member_role.json"
-    output_file = input("請輸入輸出檔案路徑 (預設: lottery_data.json): ") or "lottery_data.json"
-    csv_output = input("請輸入CSV輸出檔案路徑 (預設: lottery_tickets.csv): ") or "lottery_tickets.csv"
+def save_data(data: Dict[str, Any], output_file: str, output_format: Optional[str] = None,
+              role_index: Optional[RoleIndex] = None) -> None:
+    """保存處理後的資料到檔案，格式見 save_outputs"""
+    save_outputs(data, output_file, None, output_format, role_index)
 
-    # 解析會員資料
-    members = parse_member_data(member_file)
+def save_csv(data: Dict[str, Any], output_file: str, role_index: Optional[RoleIndex] = None) -> None:
+    """將會員資料保存為CSV檔案"""
+    save_outputs(data, None, output_file, role_index=role_index)
+
+def run_parse(member_file: str, roles_file: str, output_file: str, csv_output: str,
+              previous_file: Optional[str] = None, delta_file: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """解析匯出檔並保存結果，失敗時回傳 None
+
+    指定 previous_file 時只計算與上一份快照的差異，並修補上一份快照，
+    不重新建立所有會員的紀錄；快照旁有索引時不解析快照本身，未變動的會員也直接複製原本的輸出文字。
+    快照無法讀取時改為完整重建
+    """
+    # 同時解析會員資料與角色資料
+    members, roles = parse_exports(member_file, roles_file)
     if not members:
         print("無法繼續：會員資料為空")
-        return
+        return None
 
-    # 解析角色資料
-    roles = parse_roles_data(roles_file)
     if not roles:
         print("無法繼續：角色資料為空")
-        return
+        return None
 
     # 創建角色映射
     role_mapping = create_role_mapping()
 
-    # 合併資料
-    result = combine_data(members, roles, role_mapping)
+    previous = load_snapshot(previous_file) if previous_file else None
+    if previous is not None:
+        # 只計算變動並修補上一份快照
+        delta = diff_snapshot(previous, members, roles, role_mapping)
+        result = apply_snapshot_delta(previous, delta)
+        print_delta(delta)
+        if delta_file:
+            save_delta(delta, delta_file)
+    else:
+        if previous_file:
+            print("無法使用上一份快照，改為完整重建")
+        # 合併資料
+        result = combine_data(members, roles, role_mapping)
+
+    # 只走訪一次會員資料，同時保存抽獎資料與CSV
+    save_outputs(result, output_file, csv_output)
 
-    # 保存結果
-    save_data(result, output_file)
-    save_csv(result, csv_output)
+    return result
 
-    # 顯示統計資訊
+def print_statistics(result: Dict[str, Any]) -> None:
+    """顯示統計資訊"""
     print("\n===== 資料統計 =====")
     print(f"總會員數: {result['total_members']}")
     print(f"符合抽獎資格的會員數: {result['eligible_members']}")
     print(f"總籤數: {result['total_tickets']}")
 
+    # 顯示重複ID的來源位置
+    if result["duplicate_groups"]:
+        print("\n重複ID:")
+        for group in result["duplicate_groups"]:
+            positions = ", ".join(str(position) for position in group["positions"])
+            print(f"  {group['id']}: 出現 {group['count']} 次 (來源位置 {positions})")
+
     # 顯示籤數分布
     tickets_distribution = {}
     for member in result["members"]:
-        tickets = member["tickets"]
+        tickets = member.tickets
         if tickets > 0:
             tickets_distribution[tickets] = tickets_distribution.get(tickets, 0) + 1
 
@@ -265,5 +847,21 @@ def main():
     for tickets, count in sorted(tickets_distribution.items()):
         print(f"  {tickets}張籤: {count}人")
 
+def main():
+    print("===== 抽籤資料解析工具 =====")
+
+    # 設定檔案路徑
+    member_file = input("請輸入會員資料檔案路徑 (預設: raffle_member.json): ") or "raffle_member.json"
+    roles_file = input("請輸入角色資料檔案路徑 (預設: member_role.json): ") or "member_role.json"
+    output_file = input(f"請輸入輸出檔案路徑 (預設: lottery_data.json，副檔名為 {TICKET_STORE_SUFFIX} 時輸出二進位抽獎表): ") or "lottery_data.json"
+    csv_output = input("請輸入CSV輸出檔案路徑 (預設: lottery_tickets.csv): ") or "lottery_tickets.csv"
+    previous_file = input("請輸入上一份快照路徑以只計算變動 (直接按 Enter 完整重建): ") or None
+
+    result = run_parse(member_file, roles_file, output_file, csv_output, previous_file)
+    if result is None:
+        return
+
+    print_statistics(result)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,151 @@
+import functools
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# tracemalloc 與 platform 只在啟用量測或輸出報告時才載入，不影響一般執行的啟動時間
+tracemalloc: Any = None
+
+# 是否啟用效能量測；停用時各階段只多一次旗標判斷
+_enabled = False
+_trace_memory = False
+_records: List[Dict[str, Any]] = []
+_stack: List["_Stage"] = []
+
+def enable(trace_memory: bool = True) -> None:
+    """啟用效能量測，並清除先前的紀錄"""
+    global _enabled, _trace_memory, tracemalloc
+    import tracemalloc
+    _records.clear()
+    _stack.clear()
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+def disable() -> None:
+    """停用效能量測"""
+    global _enabled
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def is_enabled() -> bool:
+    return _enabled
+
+class _NullStage:
+    """停用量測時使用的空階段"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    """量測單一階段的牆上時間、CPU 時間與記憶體峰值"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.observed_peak = 0
+
+    def __enter__(self):
+        self.depth = len(_stack)
+        if _stack and _trace_memory:
+            # 重設峰值前先把目前的峰值記到外層階段
+            parent = _stack[-1]
+            parent.observed_peak = max(parent.observed_peak, tracemalloc.get_traced_memory()[1])
+        _stack.append(self)
+
+        if _trace_memory:
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        _stack.pop()
+
+        record = {
+            "stage": self.name,
+            "depth": self.depth,
+            "wall_seconds": wall,
+            "cpu_seconds": cpu
+        }
+        if _trace_memory:
+            peak = max(self.observed_peak, tracemalloc.get_traced_memory()[1])
+            record["peak_memory_bytes"] = max(0, peak - self.start_memory)
+            if _stack:
+                _stack[-1].observed_peak = max(_stack[-1].observed_peak, peak)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _records.append(record)
+        return False
+
+def stage(name: str):
+    """量測一個程式區塊，用法：with profiling.stage("名稱"): ..."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """量測整個函式的裝飾器，未指定名稱時使用函式名稱"""
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Stage(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+def records() -> List[Dict[str, Any]]:
+    """回傳依完成順序排列的量測紀錄"""
+    return list(_records)
+
+def summarize() -> Dict[str, Dict[str, Any]]:
+    """依階段名稱彙總呼叫次數、總時間與最大記憶體峰值"""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for record in _records:
+        entry = summary.setdefault(record["stage"], {
+            "calls": 0,
+            "wall_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "peak_memory_bytes": 0
+        })
+        entry["calls"] += 1
+        entry["wall_seconds"] += record["wall_seconds"]
+        entry["cpu_seconds"] += record["cpu_seconds"]
+        entry["peak_memory_bytes"] = max(entry["peak_memory_bytes"], record.get("peak_memory_bytes", 0))
+    return summary
+
+def build_report() -> Dict[str, Any]:
+    import platform
+
+    return {
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "memory_traced": _trace_memory,
+        "stages": records(),
+        "summary": summarize()
+    }
+
+def write_report(report_file: str) -> None:
+    """輸出機器可讀的 JSON 量測報告"""
+    try:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(build_report(), f, ensure_ascii=False, indent=2)
+        print(f"效能量測報告已保存至 {report_file}")
+    except Exception as e:
+        print(f"保存效能量測報告時發生錯誤: {str(e)}")
@@ -0,0 +1,63 @@
+import json
+import os
+from typing import Dict, Any, Optional
+
+from member_record import RoleIndex, COMBINE_RULES
+
+# 預設的角色規則檔，與程式放在一起
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "role_rules.json")
+
+# 指定其他角色規則檔的環境變數，方便試算不同的籤數規則而不修改程式
+RULES_FILE_ENV = "MURMURCAT_ROLE_RULES"
+
+def configured_rules_file() -> str:
+    """取得目前使用的角色規則檔，環境變數優先於預設檔案"""
+    return os.environ.get(RULES_FILE_ENV) or DEFAULT_RULES_FILE
+
+def load_role_rules(rules_file: Optional[str] = None) -> Dict[str, Any]:
+    """讀取並檢查角色規則檔，格式錯誤時拋出 ValueError
+
+    規則檔為 JSON，包含：
+    roles (角色列表，每項有 id、name、tickets；同名角色可以有多個ID)、
+    combine ("max" 取最高角色的籤數，"sum" 累加所有角色的籤數)、
+    cap (每人籤數上限，null 表示不限)
+    """
+    rules_file = rules_file or configured_rules_file()
+    try:
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"找不到角色規則檔 '{rules_file}'")
+    except json.JSONDecodeError:
+        raise ValueError(f"角色規則檔 '{rules_file}' 不是有效的JSON格式")
+
+    roles = rules.get("roles") if isinstance(rules, dict) else None
+    if not isinstance(roles, list) or not roles:
+        raise ValueError(f"角色規則檔 '{rules_file}' 格式不正確，應包含非空的 'roles' 列表")
+
+    ticket_mapping: Dict[str, int] = {}
+    for number, role in enumerate(roles, 1):
+        if (not isinstance(role, dict) or not isinstance(role.get("id"), str) or not isinstance(role.get("name"), str)
+                or not isinstance(role.get("tickets"), int) or role["tickets"] < 0):
+            raise ValueError(f"角色規則檔第 {number} 個角色必須包含字串 'id'、'name' 與不小於 0 的整數 'tickets'")
+        if ticket_mapping.setdefault(role["name"], role["tickets"]) != role["tickets"]:
+            raise ValueError(f"角色 '{role['name']}' 在規則檔中設定了不同的籤數")
+
+    rules.setdefault("combine", "max")
+    rules.setdefault("cap", None)
+    if rules["combine"] not in COMBINE_RULES:
+        raise ValueError(f"combine 只能是 {'、'.join(COMBINE_RULES)}")
+    if rules["cap"] is not None and (not isinstance(rules["cap"], int) or rules["cap"] < 0):
+        raise ValueError("cap 必須是不小於 0 的整數或 null")
+    return rules
+
+def role_mapping_from_rules(rules: Dict[str, Any]) -> Dict[str, str]:
+    return {role["id"]: role["name"] for role in rules["roles"]}
+
+def ticket_mapping_from_rules(rules: Dict[str, Any]) -> Dict[str, int]:
+    return {role["name"]: role["tickets"] for role in rules["roles"]}
+
+def compile_role_rules(rules: Dict[str, Any], role_mapping: Optional[Dict[str, str]] = None) -> RoleIndex:
+    """將規則編譯成角色遮罩索引與遮罩→籤數查找表，只需執行一次"""
+    return RoleIndex(role_mapping or role_mapping_from_rules(rules), ticket_mapping_from_rules(rules),
+                     rules["combine"], rules["cap"])
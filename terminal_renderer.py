@@ -0,0 +1,98 @@
+import os
+import sys
+from typing import List, Optional, TextIO
+
+# ANSI 控制碼
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+CLEAR_LINE = "\x1b[K"
+HIDE_CURSOR = "\x1b[?25l"
+SHOW_CURSOR = "\x1b[?25h"
+
+# Windows 主控台的標準輸出代碼與虛擬終端機處理旗標
+_STD_OUTPUT_HANDLE = -11
+_ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
+
+# enable_ansi 的結果，第一次呼叫後沿用
+_ansi_enabled: Optional[bool] = None
+
+def _move_to(row: int) -> str:
+    return f"\x1b[{row + 1};1H"
+
+def is_interactive(stream: Optional[TextIO] = None) -> bool:
+    """判斷輸出是否為終端機"""
+    stream = stream or sys.stdout
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+def enable_ansi() -> bool:
+    """確保 ANSI 控制碼可用，回傳是否可用
+
+    Windows 主控台以 SetConsoleMode 開啟虛擬終端機處理；取得或設定主控台模式失敗時
+    (例如舊版 Windows) 回傳 False，呼叫端應改為一般文字輸出
+    """
+    global _ansi_enabled
+    if _ansi_enabled is None:
+        _ansi_enabled = os.name != 'nt' or _enable_windows_vt()
+    return _ansi_enabled
+
+def _enable_windows_vt() -> bool:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(_STD_OUTPUT_HANDLE)
+        mode = wintypes.DWORD()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        if mode.value & _ENABLE_VIRTUAL_TERMINAL_PROCESSING:
+            return True
+        return bool(kernel32.SetConsoleMode(handle, mode.value | _ENABLE_VIRTUAL_TERMINAL_PROCESSING))
+    except (ImportError, AttributeError, OSError):
+        return False
+
+class TerminalRenderer:
+    """以 ANSI 游標定位就地重繪畫面的渲染器
+
+    每一幀只重寫與上一幀不同的行，不再清除整個螢幕；
+    輸出不是終端機或無法啟用 ANSI 控制碼時停用，render() 不做任何事
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+        self.enabled = is_interactive(self.stream) and enable_ansi()
+        self.previous: List[str] = []
+
+    def __enter__(self) -> "TerminalRenderer":
+        if self.enabled:
+            self.stream.write(HIDE_CURSOR + CLEAR_SCREEN)
+            self.stream.flush()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.enabled:
+            self.stream.write(CLEAR_SCREEN + SHOW_CURSOR)
+            self.stream.flush()
+        self.previous = []
+
+    def render(self, lines: List[str]) -> None:
+        """繪製一幀畫面，只更新有變動的行"""
+        if not self.enabled:
+            return
+
+        output = []
+        for row, line in enumerate(lines):
+            if row < len(self.previous) and self.previous[row] == line:
+                continue
+            output.append(_move_to(row) + line + CLEAR_LINE)
+
+        # 清除上一幀多出來的行
+        for row in range(len(lines), len(self.previous)):
+            output.append(_move_to(row) + CLEAR_LINE)
+
+        if output:
+            self.stream.write("".join(output))
+            self.stream.flush()
+        self.previous = list(lines)
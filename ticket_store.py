@@ -0,0 +1,261 @@
+import array
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from member_record import MemberRecord, RoleIndex
+from output_writer import temp_output_file
+
+# 由 parse_data 直接輸出抽獎表時使用的副檔名
+TICKET_STORE_SUFFIX = ".tickets"
+
+# 檔案開頭的識別碼與格式版本
+STORE_MAGIC = b"MCTS"
+STORE_VERSION = 2
+
+# 識別碼、版本、標頭長度
+_PREAMBLE = struct.Struct("<4sIQ")
+
+# 欄位對齊的位元組數
+_ALIGNMENT = 8
+
+# 每位會員的字串欄位，依序存放於字串區塊中
+STRING_FIELDS = ("display_name", "username", "global_name")
+
+# flags 欄位：第 0 位元為重複標記，其後依序為各字串欄位是否為 null
+FLAG_DUPLICATE = 1
+
+# 會員ID與籤數欄位的型別；自訂籤數規則的籤數 (或 sum 合併後的總和) 可能超過 65535，籤數以 32 位元保存
+ID_TYPECODE = "Q"
+TICKETS_TYPECODE = "I"
+
+def _null_flag(field_index: int) -> int:
+    return 1 << (field_index + 1)
+
+def file_sha256(file_path: str) -> str:
+    """計算檔案內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def mapping_fingerprint(role_mapping: Dict[str, str], ticket_mapping: Dict[str, int],
+                        options: Optional[Dict[str, Any]] = None) -> str:
+    """計算角色與籤數規則的指紋，規則變動時快取即失效"""
+    payload = json.dumps({"roles": role_mapping, "tickets": ticket_mapping, "options": options or {}},
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _column(typecode: str, values: Iterable[int] = ()) -> array.array:
+    return array.array(typecode, values)
+
+def _mask_typecode(role_count: int) -> str:
+    for typecode in ("B", "H", "I", "Q"):
+        if role_count <= array.array(typecode).itemsize * 8:
+            return typecode
+    raise ValueError("角色種類超過 64 種，無法以位元遮罩編碼")
+
+def write_ticket_store(store_file: str, members: Iterable[MemberRecord], role_index: RoleIndex,
+                       metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """將會員資料編譯成固定寬度欄位的二進位抽獎表
+
+    只收錄籤數大於 0 的會員；角色以遮罩欄位保存，位元順序記錄在標頭的 role_names。
+    會員ID必須是 Discord 的數字ID，ID或籤數超出欄位範圍時拋出 ValueError。
+    寫入暫存檔後再改名，避免留下寫到一半的檔案
+    """
+    ids = _column(ID_TYPECODE)
+    tickets = _column(TICKETS_TYPECODE)
+    cumulative = _column("Q")
+    flags = _column("B")
+    role_masks = _column(_mask_typecode(len(role_index.names)))
+    string_offsets = _column("Q", [0])
+    strings = bytearray()
+
+    true_duplicates: List[str] = []
+    total_tickets = 0
+
+    for member in members:
+        member_tickets = member.tickets
+        if member.is_duplicate and member.id:
+            true_duplicates.append(member.id)
+        if member_tickets <= 0:
+            continue
+
+        total_tickets += member_tickets
+        try:
+            member_id = int(member.id)
+            if str(member_id) != member.id:
+                # 讀取時以 str() 還原，開頭為 0 等寫法無法原樣還原
+                raise ValueError(member.id)
+            ids.append(member_id)
+        except (ValueError, TypeError, OverflowError):
+            raise ValueError(f"會員ID '{member.id}' 不是數字ID，無法寫入二進位抽獎表") from None
+        try:
+            tickets.append(member_tickets)
+        except OverflowError:
+            raise ValueError(f"會員 {member.id} 的籤數 {member_tickets} 超過二進位抽獎表的上限 "
+                             f"{(1 << tickets.itemsize * 8) - 1}") from None
+        cumulative.append(total_tickets)
+        role_masks.append(member.role_mask)
+
+        member_flags = FLAG_DUPLICATE if member.is_duplicate else 0
+        for field_index, field in enumerate(STRING_FIELDS):
+            value = getattr(member, field)
+            if value is None:
+                member_flags |= _null_flag(field_index)
+            else:
+                strings += value.encode("utf-8")
+            string_offsets.append(len(strings))
+        flags.append(member_flags)
+
+    columns = {
+        "ids": ids,
+        "tickets": tickets,
+        "cumulative": cumulative,
+        "flags": flags,
+        "role_masks": role_masks,
+        "string_offsets": string_offsets,
+        "strings": _column("B")
+    }
+    columns["strings"].frombytes(strings)
+
+    header = dict(metadata or {})
+    header.update({
+        "byteorder": sys.byteorder,
+        "participants": len(ids),
+        "total_tickets": total_tickets,
+        "role_names": list(role_index.names),
+        "role_tickets": list(role_index.tickets),
+        "true_duplicates": true_duplicates,
+        "columns": {}
+    })
+
+    # 先計算各欄位的位置，標頭長度改變時重新計算直到穩定
+    header_length = 0
+    while True:
+        offset = _align(_PREAMBLE.size + header_length)
+        for name, column in columns.items():
+            header["columns"][name] = {
+                "offset": offset,
+                "type": column.typecode,
+                "length": len(column)
+            }
+            offset = _align(offset + len(column) * column.itemsize)
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(header_bytes) == header_length:
+            break
+        header_length = len(header_bytes)
+
+    fd, temp_file = temp_output_file(store_file)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREAMBLE.pack(STORE_MAGIC, STORE_VERSION, header_length))
+            f.write(header_bytes)
+            for name, column in columns.items():
+                f.write(b"\0" * (header["columns"][name]["offset"] - f.tell()))
+                column.tofile(f)
+        os.replace(temp_file, store_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    return header
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+def read_store_header(data: bytes) -> Dict[str, Any]:
+    """讀取並檢查抽獎表標頭"""
+    if len(data) < _PREAMBLE.size:
+        raise ValueError("抽獎表檔案過短")
+
+    magic, version, header_length = _PREAMBLE.unpack_from(data, 0)
+    if magic != STORE_MAGIC:
+        raise ValueError("不是抽獎表檔案")
+    if version != STORE_VERSION:
+        raise ValueError(f"不支援的抽獎表版本: {version}")
+
+    header = json.loads(bytes(data[_PREAMBLE.size:_PREAMBLE.size + header_length]).decode("utf-8"))
+    if header.get("byteorder") != sys.byteorder:
+        raise ValueError("抽獎表的位元組順序與本機不同")
+    return header
+
+def is_ticket_store(file_path: str) -> bool:
+    """檢查檔案是否為二進位抽獎表"""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(STORE_MAGIC)) == STORE_MAGIC
+    except OSError:
+        return False
+
+def open_ticket_store(store_file: str) -> Tuple[Dict[str, Any], Dict[str, memoryview]]:
+    """以記憶體映射開啟抽獎表，回傳標頭與各欄位的零複製視圖
+
+    欄位內容只在被存取時才由作業系統載入對應的分頁，
+    因此開啟檔案的時間與記憶體用量幾乎與會員數無關
+    """
+    with open(store_file, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    data = memoryview(mapped)
+    header = read_store_header(data)
+    columns = {}
+    for name, column in header["columns"].items():
+        itemsize = array.array(column["type"]).itemsize
+        end = column["offset"] + column["length"] * itemsize
+        if end > len(data):
+            raise ValueError(f"抽獎表欄位 '{name}' 超出檔案範圍")
+        columns[name] = data[column["offset"]:end].cast(column["type"])
+    return header, columns
+
+class StoredParticipants:
+    """以欄位陣列為底的抽獎名單，只在存取時才組出 MemberRecord"""
+
+    def __init__(self, header: Dict[str, Any], columns: Dict[str, Any]):
+        self.header = header
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return self.header["participants"]
+
+    def _strings(self, index: int, member_flags: int) -> List[Optional[str]]:
+        offsets = self.columns["string_offsets"]
+        blob = self.columns["strings"]
+        base = index * len(STRING_FIELDS)
+        values = []
+        for field_index in range(len(STRING_FIELDS)):
+            if member_flags & _null_flag(field_index):
+                values.append(None)
+                continue
+            start = offsets[base + field_index]
+            end = offsets[base + field_index + 1]
+            values.append(bytes(blob[start:end]).decode("utf-8"))
+        return values
+
+    def member_id(self, index: int) -> str:
+        """只取會員ID，不解碼字串欄位"""
+        return str(self.columns["ids"][index])
+
+    def __getitem__(self, index: int) -> MemberRecord:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("抽獎名單索引超出範圍")
+
+        columns = self.columns
+        member_flags = columns["flags"][index]
+        display_name, username, global_name = self._strings(index, member_flags)
+        return MemberRecord(str(columns["ids"][index]), username, global_name, display_name,
+                            columns["tickets"][index], columns["role_masks"][index],
+                            bool(member_flags & FLAG_DUPLICATE))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
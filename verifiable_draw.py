@@ -0,0 +1,70 @@
+import hashlib
+import hmac
+import secrets
+from typing import Callable
+
+# 抽獎紀錄 (transcript) 的格式版本
+TRANSCRIPT_VERSION = 1
+
+# 亂數串流的演算法：HMAC-SHA256(種子, 前綴 + 8 位元組大端序計數器) 依序串接
+STREAM_ALGORITHM = "HMAC-SHA256-CTR"
+
+# 種子長度（位元組）
+SEED_BYTES = 32
+
+def new_seed(extra_entropy: bytes = b"", randbytes: Callable[[int], bytes] = secrets.token_bytes) -> bytes:
+    """產生抽獎種子：系統亂數與額外熵源 (例如BTC價格) 的 SHA-256"""
+    return hashlib.sha256(randbytes(SEED_BYTES) + extra_entropy).digest()
+
+def parse_seed(seed_hex: str) -> bytes:
+    """讀取十六進位的種子，長度不正確時拋出 ValueError"""
+    try:
+        seed = bytes.fromhex(seed_hex.strip())
+    except ValueError:
+        raise ValueError("種子必須是十六進位字串")
+    if len(seed) != SEED_BYTES:
+        raise ValueError(f"種子長度必須是 {SEED_BYTES} 位元組 ({SEED_BYTES * 2} 個十六進位字元)")
+    return seed
+
+def commit_seed(seed: bytes) -> str:
+    """種子的承諾值，抽獎前公布，抽獎後公開種子供任何人比對"""
+    return hashlib.sha256(seed).hexdigest()
+
+def stream_context(input_sha256: str) -> bytes:
+    """串流前綴綁定格式版本與輸入資料雜湊，同一個種子用在不同名單會得到不同結果"""
+    return f"murmurcat-draw/{TRANSCRIPT_VERSION}/{input_sha256}/".encode()
+
+class DrawStream:
+    """由種子決定的亂數串流，相同的 (種子, 輸入資料雜湊) 一定產生相同的序列
+
+    randbelow(n) 取 n 的位元長度 k，每次讀取 ceil(k/8) 個位元組 (大端序)
+    並保留最高的 k 個位元，不小於 n 時捨棄重抽，因此沒有取餘數造成的偏差
+    """
+
+    __slots__ = ("_key", "_context", "_counter", "_buffer")
+
+    def __init__(self, seed: bytes, input_sha256: str):
+        self._key = seed
+        self._context = stream_context(input_sha256)
+        self._counter = 0
+        self._buffer = b""
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            block = hmac.new(self._key, self._context + self._counter.to_bytes(8, "big"), hashlib.sha256).digest()
+            self._buffer += block
+            self._counter += 1
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def randbelow(self, n: int) -> int:
+        """回傳 0 ~ n-1 的均勻整數"""
+        if n <= 0:
+            raise ValueError("範圍必須大於 0")
+        bits = n.bit_length()
+        size = (bits + 7) // 8
+        shift = size * 8 - bits
+        while True:
+            value = int.from_bytes(self.read(size), "big") >> shift
+            if value < n:
+                return value
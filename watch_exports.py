@@ -0,0 +1,198 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import draw
+import parse_data
+from ticket_store import TICKET_STORE_SUFFIX, file_sha256
+
+# 預設每隔幾秒檢查一次匯出檔
+DEFAULT_INTERVAL = 2.0
+
+# 匯出檔需維持不變多少秒才開始解析，避免讀到寫到一半的檔案
+DEFAULT_DEBOUNCE = 1.0
+
+def file_state(path):
+    """檔案的 (大小, 修改時間, inode)，不存在時回傳 None；輪詢時只比較這些，不讀取內容"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+class ExportWatcher:
+    """監看會員與角色匯出檔，內容變動時增量更新快照、輸出檔與抽獎表
+
+    以輪詢檢查檔案大小與修改時間，兩個檔案都維持不變 debounce 秒後才比對內容雜湊；
+    只重新解析雜湊有變的匯出檔 (另一個沿用上次的解析結果)，
+    再以 diff_snapshot 只處理有變動的會員並修補快照，輸出檔以暫存檔寫入後取代
+    (未變動的會員直接複製上一版輸出的文字，見 parse_data.save_outputs)。
+    抽獎表由修補後的快照重新排列 (與重新載入輸出檔的順序相同，抽獎紀錄才能重現)，
+    建好後才一次替換，讀取端拿到的永遠是完整的某一版
+    """
+
+    def __init__(self, member_file, roles_file, output_file, csv_file=None, debounce=DEFAULT_DEBOUNCE,
+                 delta_file=None, previous_file=None):
+        self.member_file = member_file
+        self.roles_file = roles_file
+        self.output_file = output_file
+        self.csv_file = csv_file
+        self.debounce = debounce
+        self.delta_file = delta_file
+        self.previous_file = previous_file
+        self.snapshot = None
+        self.draw_table = None
+        self.true_duplicates = set()
+        self.version = 0
+        self._lock = threading.Lock()
+        self._states = None
+        self._changed_at = None
+        self._hashes = None
+        self._members = None
+        self._roles = None
+
+    def current(self):
+        """目前的 (抽獎表, 重複ID集合, 版本)"""
+        with self._lock:
+            return self.draw_table, self.true_duplicates, self.version
+
+    def start(self):
+        """記錄匯出檔目前的狀態並建立第一版抽獎表，成功時回傳 True"""
+        self._states = (file_state(self.member_file), file_state(self.roles_file))
+        if None in self._states:
+            print(f"錯誤：找不到匯出檔 '{self.member_file}' 或 '{self.roles_file}'")
+            return False
+        self._hashes = (file_sha256(self.member_file), file_sha256(self.roles_file))
+        return self.refresh(self._hashes)
+
+    def poll(self, now=None):
+        """檢查一次匯出檔，內容有變且已穩定 debounce 秒時更新，有更新時回傳 True"""
+        now = time.monotonic() if now is None else now
+        states = (file_state(self.member_file), file_state(self.roles_file))
+        if states != self._states:
+            self._states = states
+            self._changed_at = now
+            return False
+        if self._changed_at is None or now - self._changed_at < self.debounce or None in states:
+            return False
+        self._changed_at = None
+
+        # 只有修改時間改變 (例如重新匯出相同內容) 時不重新解析
+        hashes = (file_sha256(self.member_file), file_sha256(self.roles_file))
+        if hashes == self._hashes:
+            return False
+        self._hashes = hashes
+        return self.refresh(hashes)
+
+    def load_previous(self):
+        """取得上一份快照：優先使用指定的快照，其次是既有的 JSON 輸出檔"""
+        snapshot_file = self.previous_file or self.output_file
+        if snapshot_file.endswith(TICKET_STORE_SUFFIX) or not os.path.exists(snapshot_file):
+            return None
+        return parse_data.load_snapshot(snapshot_file)
+
+    def parse(self, hashes):
+        """取得兩個匯出檔的解析結果，只重新解析內容雜湊與上次不同的檔案"""
+        member_sha256, roles_sha256 = hashes
+        parse_members = self._members is None or self._members[0] != member_sha256
+        parse_roles = self._roles is None or self._roles[0] != roles_sha256
+        if parse_members and parse_roles:
+            members, roles = parse_data.parse_exports(self.member_file, self.roles_file)
+        elif parse_members:
+            members, roles = parse_data.parse_member_data(self.member_file), self._roles[1]
+        elif parse_roles:
+            members, roles = self._members[1], parse_data.parse_roles_data(self.roles_file)
+        else:
+            members, roles = self._members[1], self._roles[1]
+
+        self._members = (member_sha256, members) if members else None
+        self._roles = (roles_sha256, roles) if roles else None
+        return members, roles
+
+    def refresh(self, hashes=None):
+        """重新解析匯出檔並更新，失敗時保留目前的快照與抽獎表"""
+        start = time.perf_counter()
+        if hashes is None:
+            hashes = (file_sha256(self.member_file), file_sha256(self.roles_file))
+        members, roles = self.parse(hashes)
+        if not members or not roles:
+            print("匯出檔為空或無法解析，保留目前的抽獎表")
+            return False
+
+        role_mapping = parse_data.create_role_mapping()
+        snapshot = self.snapshot if self.snapshot is not None else self.load_previous()
+        if snapshot is not None:
+            delta = parse_data.diff_snapshot(snapshot, members, roles, role_mapping)
+            if self.draw_table is not None and not (delta["joined"] or delta["left"] or delta["updated"]):
+                print("匯出檔內容有變，但會員資料與籤數沒有變動")
+                return False
+            result = parse_data.apply_snapshot_delta(snapshot, delta)
+            parse_data.print_delta(delta)
+            if self.delta_file:
+                parse_data.save_delta(delta, self.delta_file)
+        else:
+            result = parse_data.combine_data(members, roles, role_mapping)
+
+        if not parse_data.save_outputs(result, self.output_file, self.csv_file):
+            # 快照可能已修補，下次由輸出檔重新比對；匯出檔沒再變動時也會在 debounce 秒後重試
+            self.snapshot = None
+            self._hashes = None
+            self._changed_at = time.monotonic()
+            return False
+
+        participants = [member for member in result["members"] if member.tickets > 0]
+        draw_table = draw.build_draw_table(participants)
+        output_sha256 = file_sha256(self.output_file)
+        draw_table.update(source_file=self.output_file, source_sha256=output_sha256)
+        true_duplicates = {member.id for member in result["members"] if member.is_duplicate and member.id}
+
+        self.snapshot = result
+        with self._lock:
+            self.draw_table = draw_table
+            self.true_duplicates = true_duplicates
+            self.version += 1
+        print(f"抽獎表已更新為第 {self.version} 版：{draw_table['total_tickets']} 張籤，"
+              f"{len(participants)} 名符合資格的會員，耗時 {time.perf_counter() - start:.2f} 秒")
+        # 抽獎表快取只供之後重新載入輸出檔時使用，在替換抽獎表之後才寫出
+        if not self.output_file.endswith(TICKET_STORE_SUFFIX):
+            draw.save_table_cache(self.output_file, output_sha256, result["members"], result["eligible_members"])
+        return True
+
+def add_watch_arguments(parser):
+    group = parser.add_argument_group("監看")
+    group.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                       help=f"檢查匯出檔的間隔秒數 (預設: {DEFAULT_INTERVAL})")
+    group.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                       help=f"匯出檔需維持不變多少秒才更新 (預設: {DEFAULT_DEBOUNCE})")
+
+def run_watch(args):
+    """持續監看匯出檔直到按下 Ctrl+C，第一次解析失敗時回傳 False"""
+    watcher = ExportWatcher(args.members, args.roles, args.output, args.csv, args.debounce,
+                            args.delta, args.previous)
+    if not watcher.start():
+        return False
+
+    print(f"監看 {args.members} 與 {args.roles} 的變動，每 {args.interval:g} 秒檢查一次 (按 Ctrl+C 結束)")
+    try:
+        while True:
+            time.sleep(args.interval)
+            watcher.poll()
+    except KeyboardInterrupt:
+        print("\n已停止監看")
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="監看 Discord 匯出檔，內容變動時增量更新抽獎資料")
+    parser.add_argument("--members", default="raffle_member.json", help="會員資料檔案路徑 (預設: raffle_member.json)")
+    parser.add_argument("--roles", default="member_role.json", help="角色資料檔案路徑 (預設: member_role.json)")
+    parser.add_argument("--output", default="lottery_data.json", help="輸出檔案路徑 (預設: lottery_data.json)")
+    parser.add_argument("--csv", default="lottery_tickets.csv", help="CSV輸出檔案路徑 (預設: lottery_tickets.csv)")
+    parser.add_argument("--previous", default=None, help="第一次比對用的上一份快照 (預設: 既有的輸出檔)")
+    parser.add_argument("--delta", default=None, help="每次更新時將快照變動保存為 JSON 的路徑")
+    add_watch_arguments(parser)
+    return 0 if run_watch(parser.parse_args(argv)) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())